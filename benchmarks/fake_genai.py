@@ -0,0 +1,7 @@
+"""
+Offline stand-in for genai.Client - moved to src.core.llm_transport so
+`python -m src.server --fake-llm` works without the benchmarks package.
+Kept here for the benchmarks and tests that import it by this name.
+"""
+from src.core.llm_transport import (DEFAULT_REPLY, FakeClient,  # noqa: F401
+                                    FakeResponse, FakeStats, ModelBehavior)
@@ -0,0 +1,235 @@
+"""
+Load test of the GeminiWorker fallback chain against a recorded cassette
+(src/core/llm_transport.py) - no network, no quota, runs on plain Linux.
+
+    SDT_LLM_TRANSPORT=record:gemini.jsonl python main.py    # record once
+    python -m benchmarks.load gemini.jsonl -n 500 -c 8
+    python -m benchmarks.load gemini.jsonl --scale 0.1 \\
+        --script "gemini-2.5-flash=429x3,ok; gemini-2.0-flash=okx20,503x5"
+
+-c workers (one GeminiWorker each, like the main window + prefetch +
+multi-style) share the model router and keep one conversion in flight
+each until -n are done. Reports throughput, latency percentiles and calls,
+errors, tokens and peak RPM per model against MODEL_QUOTAS. Router
+cooldowns (30s after a 429) run on the wall clock and are not scaled.
+"""
+import argparse
+import contextlib
+import json
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from benchmarks.run import ROOT, make_prompt
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def run_load(replay, requests: int, concurrency: int, stream: bool,
+             inputs: List[str]) -> dict:
+    from PyQt6.QtCore import QCoreApplication, Qt
+
+    from src.core import llm_client
+    from src.core.dispatcher import DEFAULT_QUOTA, MODEL_QUOTAS
+    from src.core.llm_transport import ReplayTransport
+    from src.core.llm_worker import GeminiWorker
+    from src.core.model_router import ModelRouter
+
+    app = QCoreApplication.instance() or QCoreApplication([])  # noqa: F841
+    # Fresh health state, never written to the user's router_state.json
+    llm_client.router = ModelRouter(llm_client.MODEL_PRIORITIES)
+    llm_client.use_transport(ReplayTransport(replay))
+    api_key = "load-test"
+
+    lock = threading.Lock()
+    done = threading.Event()
+    submitted = 0
+    started_at: Dict[tuple, float] = {}
+    latencies: List[float] = []
+    outcomes: Dict[str, int] = {"ok": 0, "draft": 0, "failed": 0}
+
+    def submit_next(worker: GeminiWorker) -> None:
+        nonlocal submitted
+        with lock:
+            if submitted >= requests:
+                return
+            i = submitted
+            submitted += 1
+            # Unique text: SingleFlight would otherwise merge duplicates
+            job_id = worker.submit(api_key, f"{inputs[i % len(inputs)]} #{i}",
+                                   "Load", use_cache=False, stream=stream,
+                                   use_similar=False)
+            started_at[(id(worker), job_id)] = time.perf_counter()
+
+    def finish(worker: GeminiWorker, job_id: int, outcome: str) -> None:
+        with lock:
+            began = started_at.pop((id(worker), job_id), None)
+            if began is None:
+                return
+            latencies.append(time.perf_counter() - began)
+            outcomes[outcome] += 1
+            if len(latencies) >= requests:
+                done.set()
+        worker.pop_trace(job_id)
+        submit_next(worker)
+
+    direct = Qt.ConnectionType.DirectConnection
+    workers = []
+    for _ in range(concurrency):
+        worker = GeminiWorker(trace_kind="load")
+        worker.job_finished.connect(
+            lambda job_id, _, w=worker: finish(w, job_id, "ok"), direct)
+        worker.job_draft.connect(
+            lambda job_id, *_, w=worker: finish(w, job_id, "draft"), direct)
+        worker.job_failed.connect(
+            lambda job_id, _, w=worker: finish(w, job_id, "failed"), direct)
+        worker.start()
+        workers.append(worker)
+
+    began = time.perf_counter()
+    try:
+        for worker in workers:
+            submit_next(worker)
+        done.wait()
+        elapsed = time.perf_counter() - began
+    finally:
+        for worker in workers:
+            worker.stop()
+        llm_client.use_transport(None)
+
+    ordered = sorted(latencies)
+    stats = replay.stats
+    # Quota windows follow the cassette's clock: x0.1 latency = 6s "minute"
+    window = 60.0 * replay.scale if replay.scale > 0 else None
+    models = {}
+    order = [m for m in llm_client.MODEL_PRIORITIES if m in stats.calls]
+    order += sorted(set(stats.calls) - set(order))
+    for model in order:
+        rpm_quota, tpm_quota = MODEL_QUOTAS.get(model, DEFAULT_QUOTA)
+        peak = stats.peak_per_window(model, window) if window else None
+        models[model] = {
+            "calls": len(stats.calls[model]),
+            "outcomes": dict(stats.outcomes[model]),
+            "tokens": stats.tokens[model],
+            "peak_rpm": peak,
+            "rpm_quota": rpm_quota,
+            "tpm_quota": tpm_quota,
+        }
+    return {
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "stream": stream,
+        "scale": replay.scale,
+        "seconds": elapsed,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "outcomes": outcomes,
+        "latency": {
+            "p50": percentile(ordered, 0.50),
+            "p90": percentile(ordered, 0.90),
+            "p95": percentile(ordered, 0.95),
+            "p99": percentile(ordered, 0.99),
+            "max": ordered[-1] if ordered else 0.0,
+        },
+        "models": models,
+    }
+
+
+def print_report(report: dict) -> None:
+    lat = report["latency"]
+    out = report["outcomes"]
+    print(f"{report['requests']} conversions, {report['concurrency']} "
+          f"workers, latency x{report['scale']}: {report['seconds']:.2f}s, "
+          f"{report['throughput']:.1f} req/s")
+    print(f"  ok {out['ok']}, offline draft {out['draft']}, "
+          f"failed {out['failed']}")
+    print("  latency  " + "  ".join(f"{k} {v * 1000:.0f} ms"
+                                    for k, v in lat.items()))
+    print(f"  {'model':26} {'calls':>6} {'tokens':>8} {'peak rpm':>9} "
+          f"{'quota':>6}  outcomes")
+    for model, m in report["models"].items():
+        peak = "-" if m["peak_rpm"] is None else str(m["peak_rpm"])
+        flag = " OVER" if m["peak_rpm"] and m["peak_rpm"] > m["rpm_quota"] \
+            else ""
+        outcomes = ", ".join(f"{k} {v}" for k, v in
+                             sorted(m["outcomes"].items()))
+        print(f"  {model:26} {m['calls']:6} {m['tokens']:8} {peak:>9} "
+              f"{m['rpm_quota']:6}{flag}  {outcomes}")
+
+
+def _read_inputs(path: Optional[Path], requests: int) -> List[str]:
+    if path is None:
+        rng = random.Random(0)
+        return [make_prompt(rng.randint(3, 12), rng)
+                for _ in range(min(requests, 100))]
+    texts = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('{'):
+                line = json.loads(line).get("input", "")
+            if line:
+                texts.append(line)
+    if not texts:
+        raise SystemExit(f"No inputs in {path}")
+    return texts
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.load",
+        description="Replay a Gemini cassette through GeminiWorker under "
+                    "concurrent load.")
+    parser.add_argument("cassette", type=Path,
+                        help="JSONL recorded with "
+                             "SDT_LLM_TRANSPORT=record:<path>")
+    parser.add_argument("-n", "--requests", type=int, default=200)
+    parser.add_argument("-c", "--concurrency", type=int, default=4)
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Latency multiplier (1 = as recorded, "
+                             "0 = instant)")
+    parser.add_argument("--script", default="",
+                        help="Failure pattern, e.g. "
+                             "'gemini-2.5-flash=429x3,ok; *=rec'")
+    parser.add_argument("--stream", action="store_true",
+                        help="Streaming jobs (stream_tags) instead of "
+                             "generate_tags")
+    parser.add_argument("--inputs", type=Path, default=None,
+                        help="Text or batch-style JSONL with user inputs "
+                             "(default: synthetic)")
+    parser.add_argument("-o", "--output", default=None,
+                        help="Also write the report as JSON")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, str(ROOT))
+    from src.core.llm_transport import FailureScript, ReplayClient
+
+    try:
+        script = FailureScript.parse(args.script) if args.script else None
+        replay = ReplayClient.from_file(args.cassette, args.scale, script)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    inputs = _read_inputs(args.inputs, args.requests)
+    # The app logs every fallback with print(); keep stdout for the report
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run_load(replay, max(1, args.requests),
+                          max(1, args.concurrency),
+                          args.stream, inputs)
+    print_report(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), 'utf-8')
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
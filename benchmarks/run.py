@@ -0,0 +1,384 @@
+"""
+Benchmark suite: config loading, prompt compilation and the LLM fallback
+path, fully offline (synthetic style library + FakeClient, no Windows bits).
+
+    python -m benchmarks.run -o bench.json
+    python -m benchmarks.run --save-baseline          # after a known-good run
+    python -m benchmarks.run --threshold 0.25         # exit 1 on regressions,
+                                                      # 2 if there is no baseline
+
+Every result is a median over `--repeat` runs, in seconds. A benchmark
+regresses when it is slower than the baseline by more than --threshold
+(fraction). Baselines are machine-specific: record one per box/CI runner.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.fake_genai import FakeClient, ModelBehavior
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_BASELINE = Path(__file__).resolve().parent / 'baseline.json'
+
+# Vocabulary for synthetic payloads and prompts
+_WORDS = ("girl boy cat dog forest city night day rain snow light shadow "
+          "red blue green gold silver long short hair eyes dress armor sword "
+          "castle ocean sky cloud smile cinematic detailed soft sharp focus "
+          "portrait landscape neon vintage film grain bokeh").split()
+
+
+# --- Synthetic data ---
+def _tag(rng: random.Random) -> str:
+    tag = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(1, 3)))
+    if rng.random() < 0.1:
+        tag = f"({tag}:{rng.uniform(0.8, 1.5):.1f})"
+    return tag
+
+
+def make_prompt(n_tags: int, rng: random.Random) -> str:
+    return ", ".join(_tag(rng) for _ in range(n_tags))
+
+
+def make_library(config_dir: Path, n_styles: int, seed: int = 0) -> None:
+    """styles.json with n_styles random styles + the shipped quality_tags."""
+    rng = random.Random(seed)
+    presets = json.loads(
+        (ROOT / 'src' / 'data' / 'quality_tags.json').read_text('utf-8'))
+    modes = [(base, mode) for base, by_mode in presets["presets"].items()
+             for mode in by_mode]
+
+    styles = {}
+    for i in range(n_styles):
+        base_model, mode = rng.choice(modes)
+        name = f"Style {i:05d} ({base_model})"
+        styles[name] = {
+            "name": name,
+            "base_model": base_model,
+            "quality_mode": mode,
+            "prompt_payload": make_prompt(rng.randint(5, 25), rng),
+            "negative_payload": make_prompt(rng.randint(5, 15), rng),
+            "loras": [{"name": f"lora_{rng.randint(0, 999)}",
+                       "weight": round(rng.uniform(0.2, 1.0), 2)}
+                      for _ in range(rng.randint(0, 3))],
+            "settings": {"steps": rng.choice((20, 25, 28, 30)),
+                         "cfg": rng.choice((5.0, 6.5, 7.0))},
+        }
+
+    config_dir.mkdir(parents=True, exist_ok=True)
+    (config_dir / 'styles.json').write_text(
+        json.dumps({"styles": styles}, ensure_ascii=False), 'utf-8')
+    (config_dir / 'quality_tags.json').write_text(
+        json.dumps(presets, ensure_ascii=False), 'utf-8')
+
+
+# --- Timing ---
+def measure(fn: Callable[[], None], repeat: int, warmup: int = 1
+            ) -> List[float]:
+    for _ in range(warmup):
+        fn()
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def summarize(durations: List[float], **extra) -> Dict[str, float]:
+    ordered = sorted(durations)
+    return {
+        "seconds": statistics.median(ordered),
+        "min": ordered[0],
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "runs": len(ordered),
+        **extra,
+    }
+
+
+@contextlib.contextmanager
+def _env(name: str, value: str):
+    """Sets an environment variable for the block, then puts it back."""
+    old = os.environ.get(name)
+    os.environ[name] = value
+    try:
+        yield
+    finally:
+        if old is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = old
+
+
+def _wait_for_snapshot_writer() -> None:
+    for thread in threading.enumerate():
+        if thread.name == "style-snapshot":
+            thread.join()
+
+
+# --- Benchmarks ---
+def bench_engine(n_styles: int, repeat: int, calls: int,
+                 results: Dict[str, dict]) -> None:
+    from src.core.generator import TranspilerEngine
+    from src.core.style_snapshot import SNAPSHOT_NAME
+
+    # The engine resolves its config dir from APPDATA
+    with tempfile.TemporaryDirectory(prefix="sdt-bench-") as tmp, \
+            _env('APPDATA', tmp):
+        config_dir = Path(tmp) / 'SD-Transpiler'
+        make_library(config_dir, n_styles)
+        snapshot = config_dir / SNAPSHOT_NAME
+
+        def cold():
+            _wait_for_snapshot_writer()
+            snapshot.unlink(missing_ok=True)
+            TranspilerEngine()
+
+        results[f"load_cold[{n_styles}]"] = summarize(
+            measure(cold, repeat))
+
+        _wait_for_snapshot_writer()
+        results[f"load_snapshot[{n_styles}]"] = summarize(
+            measure(TranspilerEngine, repeat))
+
+        engine = TranspilerEngine()
+        names = engine.get_style_names()
+        styles_path = config_dir / 'styles.json'
+        raw = json.loads(styles_path.read_text('utf-8'))
+        edited = raw["styles"][names[0]]
+
+        def reload_one():
+            edited["prompt_payload"] += ", edited"
+            styles_path.write_text(json.dumps(raw, ensure_ascii=False),
+                                   'utf-8')
+            engine.reload()
+
+        results[f"reload_one_changed[{n_styles}]"] = summarize(
+            measure(reload_one, repeat))
+
+        rng = random.Random(1)
+        short = [(make_prompt(rng.randint(5, 30), rng), rng.choice(names),
+                  rng.random() < 0.5) for _ in range(calls)]
+        results[f"process_short[{n_styles}]"] = summarize(
+            measure(lambda: engine.process_many(short), repeat),
+            calls=calls)
+
+        long_prompts = [(make_prompt(1200, rng), rng.choice(names),
+                         rng.random() < 0.5) for _ in range(20)]
+        results[f"process_1k_tags[{n_styles}]"] = summarize(
+            measure(lambda: engine.process_many(long_prompts), repeat),
+            calls=len(long_prompts))
+
+
+def _flaky_client(latency: float, seed: int) -> FakeClient:
+    from src.core.llm_client import MODEL_PRIORITIES
+
+    # Top model mostly 429s, second one is overloaded now and then
+    behaviors = {
+        MODEL_PRIORITIES[0]: ModelBehavior(latency=latency, rate_limit=0.7),
+        MODEL_PRIORITIES[1]: ModelBehavior(latency=latency, overload=0.3),
+    }
+    return FakeClient(behaviors, default=ModelBehavior(latency=latency),
+                      seed=seed)
+
+
+def _reset_router() -> None:
+    from src.core import llm_client
+    from src.core.model_router import ModelRouter
+
+    # No state_path: nothing is written to the user's router_state.json
+    llm_client.router = ModelRouter(llm_client.MODEL_PRIORITIES)
+
+
+def bench_fallback(requests: int, latency: float,
+                   results: Dict[str, dict]) -> None:
+    """generate_tags through the router with 429/503 injection."""
+    from src.core.llm_client import generate_tags
+
+    _reset_router()
+    client = _flaky_client(latency, seed=2)
+    durations = []
+    for i in range(requests):
+        start = time.perf_counter()
+        generate_tags(client, f"request {i}", "Bench", cache=None)
+        durations.append(time.perf_counter() - start)
+    results["llm_fallback"] = summarize(
+        durations, fake_latency=latency,
+        errors=sum(client.stats.errors.values()))
+
+    # Worst case: a fresh router every time, so each request walks
+    # 429 -> 503 -> answer instead of learning to skip the first two
+    from src.core.llm_client import MODEL_PRIORITIES
+    client = FakeClient({
+        MODEL_PRIORITIES[0]: ModelBehavior(latency=latency, rate_limit=1.0),
+        MODEL_PRIORITIES[1]: ModelBehavior(latency=latency, overload=1.0),
+    }, default=ModelBehavior(latency=latency))
+    durations = []
+    for i in range(requests):
+        _reset_router()
+        start = time.perf_counter()
+        generate_tags(client, f"request {i}", "Bench", cache=None)
+        durations.append(time.perf_counter() - start)
+    results["llm_fallback_chain"] = summarize(durations,
+                                              fake_latency=latency)
+
+
+def bench_worker(requests: int, latency: float,
+                 results: Dict[str, dict]) -> None:
+    """Same flaky backend, but end to end through GeminiWorker (QThread)."""
+    try:
+        from PyQt6.QtCore import QCoreApplication, Qt
+    except ImportError as e:
+        print(f"worker_e2e skipped: {e}", file=sys.stderr)
+        return
+
+    from src.core import llm_client
+    from src.core.llm_worker import GeminiWorker
+
+    app = QCoreApplication.instance() or QCoreApplication([])  # noqa: F841
+    _reset_router()
+    api_key = "bench-key"
+    client = _flaky_client(latency, seed=3)
+    # get_client() hands out pooled clients - pre-seed it with the fake one
+    llm_client._clients[api_key] = client
+
+    done = threading.Event()
+    outcome: Dict[int, str] = {}
+
+    def finished(job_id, text):
+        outcome[job_id] = text
+        done.set()
+
+    direct = Qt.ConnectionType.DirectConnection
+    worker = GeminiWorker()
+    worker.job_finished.connect(finished, direct)
+    worker.job_failed.connect(finished, direct)
+    worker.start()
+    try:
+        durations = []
+        for i in range(requests):
+            done.clear()
+            start = time.perf_counter()
+            worker.submit(api_key, f"request {i}", "Bench", use_cache=False,
+                          stream=bool(i % 2))
+            done.wait()
+            durations.append(time.perf_counter() - start)
+    finally:
+        worker.stop()
+        llm_client._clients.pop(api_key, None)
+
+    results["worker_e2e"] = summarize(
+        durations, fake_latency=latency,
+        errors=sum(client.stats.errors.values()))
+
+
+# --- Baseline ---
+def compare(results: Dict[str, dict], baseline: Dict[str, dict],
+            threshold: float) -> List[str]:
+    """Names of benchmarks slower than baseline * (1 + threshold)."""
+    regressions = []
+    print(f"{'benchmark':32} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base or not base.get("seconds"):
+            print(f"{name:32} {'-':>10} {current['seconds']:10.4f}")
+            continue
+        change = current["seconds"] / base["seconds"] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:32} {base['seconds']:10.4f} "
+              f"{current['seconds']:10.4f} {change:+8.1%}{flag}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.run",
+        description="Offline benchmarks for SD-Transpiler.")
+    parser.add_argument("--styles", type=int, nargs="+",
+                        default=[10000, 50000],
+                        help="Synthetic library sizes (default: 10000 50000)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--calls", type=int, default=2000,
+                        help="process() calls per short-prompt run")
+    parser.add_argument("--requests", type=int, default=40,
+                        help="LLM requests for fallback/worker benchmarks")
+    parser.add_argument("--latency", type=float, default=0.02,
+                        help="Fake model latency in seconds")
+    parser.add_argument("--only", choices=("engine", "llm"), default=None)
+    parser.add_argument("-o", "--output", default=None,
+                        help="Write results JSON here (default: stdout)")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Store this run as the new baseline")
+    parser.add_argument("--threshold", type=float, default=None,
+                        help="Allowed slowdown vs baseline (default 0.25 = "
+                             "+25%%); given explicitly, a missing baseline "
+                             "is an error")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, str(ROOT))
+    results: Dict[str, dict] = {}
+
+    # The app logs with print(); keep stdout clean for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        if args.only in (None, "engine"):
+            for n_styles in args.styles:
+                print(f"Engine benchmarks, {n_styles} styles...")
+                bench_engine(n_styles, args.repeat, args.calls, results)
+
+        if args.only in (None, "llm"):
+            print("LLM fallback benchmarks...")
+            bench_fallback(args.requests, args.latency, results)
+            bench_worker(args.requests, args.latency, results)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, 'utf-8')
+    else:
+        print(text)
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        baseline_path.write_text(text, 'utf-8')
+        print(f"Baseline saved to {baseline_path}", file=sys.stderr)
+        return 0
+
+    if not baseline_path.exists():
+        print("No baseline yet - run with --save-baseline to record one.",
+              file=sys.stderr)
+        # A CI gate asking for a threshold must not pass by comparing nothing
+        return 2 if args.threshold is not None else 0
+
+    threshold = 0.25 if args.threshold is None else args.threshold
+    baseline = json.loads(baseline_path.read_text('utf-8'))["results"]
+    regressions = compare(results, baseline, threshold)
+    if regressions:
+        print(f"Regressions over {threshold:.0%}: "
+              f"{', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
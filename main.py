@@ -1,33 +1,70 @@
+import argparse
 import os
 import sys
 
-from PyQt6.QtWidgets import QApplication
-
 if getattr(sys, 'frozen', False):
     BASE_DIR = sys._MEIPASS
 else:
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, BASE_DIR)
 
+from src.core import startup_profiler  # noqa: E402 (needs BASE_DIR on path)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="SD-Transpiler")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Report import/init times and exit when ready")
+    parser.add_argument("--startup-budget-ms", type=float, default=None,
+                        help="With --profile-startup: exit code 1 if "
+                             "time-to-ready exceeds this budget")
+    parser.add_argument("--profile-output", default=None,
+                        help="With --profile-startup: also write JSON here")
+    # Anything else (e.g. Qt's own -style) is left for QApplication
+    return parser.parse_known_args(argv)
+
 
 def main():
-    app = QApplication(sys.argv)
+    args, qt_argv = parse_args(sys.argv[1:])
+
+    profiler = None
+    if args.profile_startup:
+        profiler = startup_profiler.profiler = \
+            startup_profiler.StartupProfiler()
+        profiler.install_import_hook()
+
+    span = startup_profiler.span
+
+    with span("PyQt6"):
+        from PyQt6.QtWidgets import QApplication
+        app = QApplication([sys.argv[0]] + qt_argv)
 
     app.setApplicationName("SD-Transpiler")
     app.setOrganizationName("KazeKaze93")
 
     try:
-        from qt_material import apply_stylesheet
+        with span("qt_material"):
+            from qt_material import apply_stylesheet
         from src.ui.interface import TranspilerUI
 
         extra = {
             'density_scale': '-1',
             'font_family': 'Segoe UI',
         }
-        apply_stylesheet(app, theme='dark_blue.xml', extra=extra)
+        with span("apply_stylesheet"):
+            apply_stylesheet(app, theme='dark_blue.xml', extra=extra)
 
-        window = TranspilerUI()
+        with span("TranspilerUI()"):
+            window = TranspilerUI()
         window.show()
+        startup_profiler.mark("window shown")
+
+        if profiler is not None:
+            from PyQt6.QtCore import QTimer
+            # First event loop turn after show() = first paint
+            QTimer.singleShot(0, lambda: profiler.mark("first paint"))
+            window.ready.connect(
+                lambda: _finish_profile(app, profiler, args))
 
         sys.exit(app.exec())
 
@@ -43,5 +80,25 @@ def main():
         input("Press Enter to exit...")
 
 
+def _finish_profile(app, profiler, args):
+    ready_at = profiler.mark("ready")
+    profiler.uninstall_import_hook()
+    print(profiler.report())
+    if args.profile_output:
+        profiler.dump(args.profile_output)
+
+    code = 0
+    if args.startup_budget_ms is not None:
+        budget = args.startup_budget_ms / 1000
+        verdict = "OK" if ready_at <= budget else "OVER BUDGET"
+        print(f"Time to ready: {ready_at * 1000:.0f} ms "
+              f"(budget {args.startup_budget_ms:.0f} ms) - {verdict}")
+        code = 0 if ready_at <= budget else 1
+    app.exit(code)
+
+
 if __name__ == "__main__":
+    # Frozen exe: multi-style fan-out starts worker processes from it
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
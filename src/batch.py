@@ -0,0 +1,330 @@
+"""
+Headless batch runner.
+
+    python -m src.batch prompts.jsonl -o results.jsonl --concurrency 8
+
+Input: JSONL ({"input": ..., "style": ..., "nsfw": ...}) or CSV with the same
+header. Rows are streamed, so memory stays flat on 100k-row files. Every
+finished row is appended to the output immediately; re-running with the same
+output file skips rows that are already there (crash resume). Rows that
+ended with an "error" are tried again and get a new line - for a row that
+appears twice, the later line wins.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Set, TextIO, Tuple
+
+from src.core.config_watcher import ConfigPoller
+from src.core.dispatcher import AsyncDispatcher
+from src.core.generator import TranspilerEngine
+from src.core.llm_client import LLMError, create_client, router
+from src.core.metrics import metrics
+from src.core.response_cache import ResponseCache
+from src.core.security import security
+
+Row = Dict[str, object]
+
+
+# --- Input ---
+def _parse_bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes", "y", "on")
+
+
+def iter_rows(path: Path, fmt: str, default_style: str,
+              default_nsfw: bool) -> Iterator[Tuple[int, Row]]:
+    """Yields (row_index, row) lazily. Broken rows are reported and skipped."""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if fmt == "csv":
+            source = enumerate(csv.DictReader(f))
+        else:
+            source = enumerate(f)
+
+        for idx, raw in source:
+            if fmt != "csv":
+                if not raw.strip():
+                    continue
+                try:
+                    raw = json.loads(raw)
+                except json.JSONDecodeError as e:
+                    print(f"Row {idx}: invalid JSON ({e}), skipped",
+                          file=sys.stderr)
+                    continue
+
+            text = str(raw.get("input") or "").strip()
+            if not text:
+                continue
+
+            # An empty CSV cell (or JSON null) means "not set", not False
+            nsfw = raw.get("nsfw")
+            yield idx, {
+                "input": text,
+                "style": raw.get("style") or default_style,
+                "nsfw": default_nsfw if nsfw in (None, "")
+                else _parse_bool(nsfw),
+            }
+
+
+# --- Resume ---
+def load_done_rows(path: Path) -> Set[int]:
+    """Rows with a successful record; failed ones ("error") are retried."""
+    done: Set[int] = set()
+    if not path.exists():
+        return done
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                if "error" not in record:
+                    done.add(int(record["row"]))
+            except (ValueError, KeyError, TypeError):
+                # Torn line from a crash - row will be redone
+                continue
+    return done
+
+
+def _open_output(path: Path) -> TextIO:
+    # Make sure a torn last line does not glue onto the next record
+    if path.exists() and path.stat().st_size:
+        with open(path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+        out = open(path, 'a', encoding='utf-8')
+        if needs_newline:
+            out.write("\n")
+        return out
+    return open(path, 'w', encoding='utf-8')
+
+
+# --- Runner ---
+class BatchRunner:
+    def __init__(self, engine: TranspilerEngine, api_key: str = "",
+                 concurrency: int = 4, use_llm: bool = True,
+                 report_every: float = 5.0,
+                 cache: Optional[ResponseCache] = None,
+                 batch_size: int = 1):
+        self.engine = engine
+        self.cache = cache
+        self.concurrency = max(1, concurrency)
+        self.use_llm = use_llm
+        self.report_every = report_every
+        self.batch_size = max(1, batch_size)
+        self.client = create_client(api_key) if use_llm else None
+
+        self.processed = 0
+        self.failed = 0
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self.dispatcher: Optional[AsyncDispatcher] = None
+
+    # --- LLM stage: AsyncDispatcher on a background event loop ---
+    def _start_llm(self) -> None:
+        if not self.use_llm:
+            return
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(
+            target=self._loop.run_forever, name="llm-loop", daemon=True)
+        self._loop_thread.start()
+        self.dispatcher = AsyncDispatcher(
+            self.client, concurrency=self.concurrency, cache=self.cache,
+            batch_size=self.batch_size)
+
+    def _stop_llm(self) -> None:
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(
+            self.dispatcher.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop_thread.join()
+        self._loop.close()
+        self._loop = None
+
+    def _llm_stage(self, row: Row) -> Future:
+        if not self.use_llm:
+            fut: Future = Future()
+            fut.set_result(str(row["input"]))
+            return fut
+        return asyncio.run_coroutine_threadsafe(
+            self.dispatcher.generate(str(row["input"]), str(row["style"])),
+            self._loop)
+
+    def _compile_stage(self, idx: int, row: Row, future: Future) -> Row:
+        record: Row = {"row": idx, **row}
+        try:
+            tags = future.result()
+        except LLMError as e:
+            record["error"] = str(e)
+            return record
+        except Exception as e:
+            record["error"] = f"Unexpected: {e}"
+            return record
+
+        result = self.engine.process(tags, str(row["style"]),
+                                     bool(row["nsfw"]))
+        record.update(result.model_dump())
+        return record
+
+    def run(self, rows: Iterator[Tuple[int, Row]], out: TextIO,
+            skip: Optional[Set[int]] = None) -> None:
+        skip = skip or set()
+        # Bounded window: never read more rows than we can keep in flight
+        # (with packing, enough to fill every worker's batch)
+        max_pending = self.concurrency * self.batch_size * 2
+        pending: Dict[Future, Tuple[int, Row]] = {}
+
+        started = time.perf_counter()
+        last_report = started
+
+        def drain(block_until_one: bool):
+            nonlocal last_report
+            if not pending:
+                return
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED,
+                           timeout=None if block_until_one else 0)
+            for fut in done:
+                idx, row = pending.pop(fut)
+                record = self._compile_stage(idx, row, fut)
+                if "error" in record:
+                    self.failed += 1
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                self.processed += 1
+
+            now = time.perf_counter()
+            if now - last_report >= self.report_every:
+                last_report = now
+                self._report(now - started)
+
+        self._start_llm()
+        try:
+            for idx, row in rows:
+                if idx in skip:
+                    continue
+                while len(pending) >= max_pending:
+                    drain(block_until_one=True)
+                pending[self._llm_stage(row)] = (idx, row)
+                drain(block_until_one=False)
+
+            while pending:
+                drain(block_until_one=True)
+        finally:
+            self._stop_llm()
+
+        self._report(time.perf_counter() - started, final=True)
+
+    def _report(self, elapsed: float, final: bool = False):
+        rate = self.processed / elapsed if elapsed > 0 else 0.0
+        prefix = "Done" if final else "Progress"
+        print(f"{prefix}: {self.processed} rows ({self.failed} failed) "
+              f"in {elapsed:.1f}s - {rate:.2f} rows/s", file=sys.stderr)
+
+
+def _detect_format(path: Path, fmt: Optional[str]) -> str:
+    if fmt:
+        return fmt
+    return "csv" if path.suffix.lower() == ".csv" else "jsonl"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.batch",
+        description="Stream prompts through the LLM and the prompt compiler.")
+    parser.add_argument("input", type=Path, help="JSONL or CSV file")
+    parser.add_argument("-o", "--output", type=Path, required=True,
+                        help="JSONL results (appended, used for resume)")
+    parser.add_argument("--format", choices=["jsonl", "csv"])
+    parser.add_argument("--style", default="",
+                        help="Style for rows without one")
+    parser.add_argument("--nsfw", action="store_true",
+                        help="NSFW for rows without the column")
+    parser.add_argument("-j", "--concurrency", type=int, default=4,
+                        help="LLM requests in flight (per-model RPM/TPM "
+                             "limits still apply)")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="Pack up to N rows into one Gemini call "
+                             "(JSON reply; default 1 = one call per row)")
+    parser.add_argument("--no-llm", action="store_true",
+                        help="Treat input as ready tags, compile only")
+    parser.add_argument("--api-key", default="",
+                        help="Defaults to $GEMINI_API_KEY, then the stored "
+                             "key (python -m src.core.security)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Do not use the persistent response cache")
+    parser.add_argument("--watch-config", action="store_true",
+                        help="Pick up styles.json edits during the run")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Overwrite output instead of resuming")
+    parser.add_argument("--report-every", type=float, default=5.0,
+                        help="Progress interval, seconds")
+    parser.add_argument("--metrics-out", type=Path, default=None,
+                        help="Write per-model latency/outcome metrics here "
+                             "(.prom = Prometheus text, else JSON)")
+    args = parser.parse_args(argv)
+
+    if not args.input.exists():
+        parser.error(f"Input not found: {args.input}")
+
+    if args.no_resume and args.output.exists():
+        args.output.unlink()
+
+    engine = TranspilerEngine()
+    default_style = args.style or next(iter(engine.get_style_names()), "")
+
+    router.load(engine.user_data_dir / 'router_state.json')
+
+    cache = None
+    if not args.no_cache and not args.no_llm:
+        cache = ResponseCache(engine.user_data_dir / 'response_cache.sqlite3')
+
+    # Compile-only runs never touch the key store (keyring may prompt)
+    api_key = "" if args.no_llm else args.api_key or security.get_api_key()
+    try:
+        runner = BatchRunner(engine, api_key=api_key,
+                             concurrency=args.concurrency,
+                             use_llm=not args.no_llm,
+                             report_every=args.report_every,
+                             cache=cache, batch_size=args.batch_size)
+    except LLMError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    done = load_done_rows(args.output)
+    if done:
+        print(f"Resuming: {len(done)} rows already done", file=sys.stderr)
+
+    rows = iter_rows(args.input, _detect_format(args.input, args.format),
+                     default_style, args.nsfw)
+    poller = ConfigPoller(engine) if args.watch_config else None
+    if poller:
+        poller.start()
+    try:
+        with _open_output(args.output) as out:
+            runner.run(rows, out, skip=done)
+    finally:
+        if poller:
+            poller.stop()
+        router.save(force=True)
+
+    if cache is not None:
+        stats = cache.stats()
+        print(f"Cache: {stats['hits']} hits, {stats['misses']} misses",
+              file=sys.stderr)
+
+    if args.metrics_out:
+        metrics.dump(args.metrics_out)
+
+    return 1 if runner.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
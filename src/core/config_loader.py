@@ -13,5 +13,36 @@ class ConfigManager:
     def save_api_key(self, key: str):
         security.save_api_key(key)
 
+    def get_prefetch_enabled(self) -> bool:
+        return str(self.settings.value("prefetch", "false")).lower() == "true"
+
+    def set_prefetch_enabled(self, enabled: bool):
+        self.settings.setValue("prefetch", "true" if enabled else "false")
+
+    def get_prefetch_per_minute(self) -> float:
+        """
+        Speculative call budget; explicit requests are not limited.
+        0 (or anything below) switches prefetch off.
+        """
+        try:
+            value = float(self.settings.value("prefetch_per_minute", 4.0))
+        except (TypeError, ValueError):
+            return 4.0
+        return value if value > 0 else 0.0  # NaN counts as off too
+
+    def get_similarity_threshold(self) -> float:
+        """Near-duplicate cache threshold (MinHash similarity), 0 = off."""
+        from src.core.similar_cache import DEFAULT_THRESHOLD
+        try:
+            return float(self.settings.value("similar_threshold",
+                                             DEFAULT_THRESHOLD))
+        except (TypeError, ValueError):
+            return DEFAULT_THRESHOLD
+
+    def get_vocab_autocorrect(self) -> bool:
+        """Replace one-letter typos in LLM output with known tags."""
+        return str(self.settings.value("vocab_autocorrect",
+                                       "false")).lower() == "true"
+
 # Singleton
 config_manager = ConfigManager()
\ No newline at end of file
@@ -0,0 +1,66 @@
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.core.generator import TranspilerEngine
+
+
+class ConfigPoller:
+    """
+    Headless hot reload: polls mtime/size of styles.json and
+    quality_tags.json and calls engine.reload() when they change.
+    The desktop app uses QFileSystemWatcher instead (see TranspilerUI).
+    """
+
+    def __init__(self, engine: TranspilerEngine, interval: float = 2.0,
+                 on_reload: Optional[Callable[[], None]] = None):
+        self.engine = engine
+        self.interval = interval
+        self.on_reload = on_reload
+        self._stamps = self._snapshot()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _paths(self) -> List[Path]:
+        # Re-resolved every time: a user copy may appear after startup
+        return list(self.engine.config_paths())
+
+    def _snapshot(self) -> Dict[Path, Tuple[float, int]]:
+        stamps = {}
+        for path in self._paths():
+            try:
+                st = path.stat()
+                stamps[path] = (st.st_mtime, st.st_size)
+            except OSError:
+                continue
+        return stamps
+
+    def check(self) -> bool:
+        """One poll step; returns True if the engine reloaded."""
+        stamps = self._snapshot()
+        if stamps == self._stamps:
+            return False
+        self._stamps = stamps
+        if not self.engine.reload():
+            return False
+        print("Config reloaded.")
+        if self.on_reload:
+            self.on_reload()
+        return True
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name="config-poll",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.check()
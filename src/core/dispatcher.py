@@ -0,0 +1,436 @@
+import asyncio
+import itertools
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from google import genai
+
+from src.core.llm_client import (BATCH_INSTRUCTION, FAILED, MODEL_PRIORITIES,
+                                 NOT_FOUND, RATE_LIMITED, SYSTEM_INSTRUCTION,
+                                 LLMError, batch_generation_config,
+                                 build_batch_prompt, build_prompt,
+                                 classify_error, generation_config,
+                                 parse_batch_reply, router)
+from src.core.metrics import ERROR, OK, RequestTrace, metrics
+from src.core.model_router import ModelRouter
+from src.core.response_cache import ResponseCache
+
+# Free-tier quotas per model: (requests per minute, tokens per minute)
+MODEL_QUOTAS: Dict[str, Tuple[int, int]] = {
+    "gemini-2.5-flash": (10, 250_000),
+    "gemini-2.0-flash": (15, 1_000_000),
+    "gemini-2.0-flash-lite": (30, 1_000_000),
+    "gemini-3-flash-preview": (10, 250_000),
+}
+DEFAULT_QUOTA = (10, 250_000)
+
+# Rough answer size, used to reserve TPM before the real count is known
+EXPECTED_OUTPUT_TOKENS = 200
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens/s, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available (0 = right now)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        if self.rate <= 0:
+            return float("inf")  # never refills
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def drain(self) -> None:
+        """Server said 429 - our estimate was optimistic, start from zero."""
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+
+
+class ModelLimiter:
+    def __init__(self, rpm: int, tpm: int):
+        self.requests = TokenBucket(rpm / 60.0, max(1, rpm))
+        self.tokens = TokenBucket(tpm / 60.0, tpm)
+
+    def wait_time(self, tokens: int) -> float:
+        return max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+
+    def consume(self, tokens: int) -> None:
+        self.requests.consume(1)
+        self.tokens.consume(tokens)
+
+    def drain(self) -> None:
+        self.requests.drain()
+
+
+@dataclass(order=True)
+class _Job:
+    not_before: float
+    seq: int
+    user_input: str = field(compare=False)
+    style: str = field(compare=False)
+    future: Optional[asyncio.Future] = field(compare=False)
+    trace: Optional[RequestTrace] = field(compare=False)
+    attempts: int = field(default=0, compare=False)
+    last_error: str = field(default="", compare=False)
+    # Models that answered 404 to this job - never tried for it again
+    not_found: Set[str] = field(default_factory=set, compare=False)
+    # Set for a packed request: the member jobs (future/trace are None then)
+    items: Optional[List["_Job"]] = field(default=None, compare=False)
+
+    def abandoned(self) -> bool:
+        if self.items is not None:
+            return all(item.future.done() for item in self.items)
+        return self.future.done()
+
+
+class AsyncDispatcher:
+    """
+    Keeps up to `concurrency` Gemini requests in flight. Every model has its
+    own RPM/TPM token bucket; a job goes to the best model in the router's
+    order that has budget right now. 429/503 put the job back in
+    the queue with jittered exponential backoff instead of blocking a worker.
+
+    With batch_size > 1 pending requests are packed into one call (JSON
+    reply, one tag list per item id): the batch goes out when it is full or
+    batch_window seconds after its first item. Items missing from the reply
+    are retried one by one.
+
+        async with AsyncDispatcher(client, concurrency=8) as d:
+            tags = await d.generate("рыжая девушка", "Anime (SDXL)")
+    """
+
+    def __init__(self, client: genai.Client, concurrency: int = 4,
+                 quotas: Optional[Dict[str, Tuple[int, int]]] = None,
+                 cache: Optional[ResponseCache] = None,
+                 model_router: Optional[ModelRouter] = None,
+                 max_attempts: int = 8, base_backoff: float = 1.0,
+                 max_backoff: float = 30.0, trace_kind: str = "batch",
+                 batch_size: int = 1, batch_window: float = 0.05):
+        self.client = client
+        self.trace_kind = trace_kind
+        self.batch_size = max(1, batch_size)
+        self.batch_window = batch_window
+        self.concurrency = max(1, concurrency)
+        self.cache = cache
+        self.router = model_router or router
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        quotas = quotas or MODEL_QUOTAS
+        self.models = list(MODEL_PRIORITIES)
+        self.limiters = {m: ModelLimiter(*quotas.get(m, DEFAULT_QUOTA))
+                         for m in self.models}
+
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._workers = []
+        self._seq = itertools.count()
+        self._pending: List[_Job] = []  # collecting the next batch
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        # Backoff timers: a job goes back to the queue only when it is due
+        self._timers: Set[asyncio.TimerHandle] = set()
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def start(self) -> None:
+        if self._queue is not None:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [asyncio.create_task(self._worker())
+                         for _ in range(self.concurrency)]
+
+    async def close(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self._pending = []
+        for handle in self._timers:
+            handle.cancel()
+        self._timers.clear()
+        self.router.save(force=True)
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+    async def generate(self, user_input: str, style: str,
+                       use_cache: bool = True) -> str:
+        """use_cache=False skips the lookup; the answer is still stored."""
+        trace = metrics.trace(self.trace_kind, log=False)
+        if self.cache is not None and use_cache:
+            started = time.perf_counter()
+            cached = self.cache.get_any([
+                ResponseCache.make_key(user_input, style, m,
+                                       SYSTEM_INSTRUCTION)
+                for m in self.models])
+            trace.add_span("cache", time.perf_counter() - started,
+                           "hit" if cached else "miss")
+            if cached:
+                trace.finish(OK)
+                return cached
+
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        job = _Job(time.monotonic(), next(self._seq), user_input, style,
+                   future, trace)
+        if self.batch_size > 1:
+            self._collect(job)
+        else:
+            self._queue.put_nowait(job)
+        try:
+            text = await future
+        except Exception:
+            trace.finish(ERROR)
+            raise
+        trace.finish(OK)
+        return text
+
+    # --- Batching ---
+    def _collect(self, job: _Job) -> None:
+        self._pending.append(job)
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(
+                self.batch_window, self._flush)
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        items, self._pending = self._pending, []
+        if self._queue is None or not items:
+            return
+        if len(items) == 1:
+            self._queue.put_nowait(items[0])
+            return
+        self._queue.put_nowait(_Job(time.monotonic(), next(self._seq), "", "",
+                                    None, None, items=items))
+
+    def _unpack(self, job: _Job, answers: Dict[int, str], model: str) -> None:
+        """Hand out a batch reply; whoever got no answer goes solo."""
+        for item_id, item in enumerate(job.items):
+            if item.future.done():
+                continue
+            text = answers.get(item_id)
+            if text is None:
+                item.last_error = f"{model} skipped the item in a batch"
+                self._requeue(item, 0.0)
+                continue
+            self._store(item, model, text)
+
+    def _split(self, job: _Job) -> None:
+        """No usable JSON at all: every member goes solo."""
+        for item in job.items:
+            if not item.future.done():
+                self._requeue(item, 0.0)
+
+    def _store(self, job: _Job, model: str, text: str) -> None:
+        # Stored under the single-request key: batch answers follow the same
+        # rules, so later single lookups may reuse them
+        if self.cache is not None:
+            self.cache.put(ResponseCache.make_key(
+                job.user_input, job.style, model, SYSTEM_INSTRUCTION), text)
+        if not job.future.done():
+            job.future.set_result(text)
+
+    def _record_attempt(self, job: _Job, model: str, outcome: str,
+                        elapsed: float) -> None:
+        if job.items is None:
+            job.trace.attempt(model, outcome, elapsed)
+            return
+        # One call for the metrics, a span on every member's timeline
+        metrics.observe_attempt(model, outcome, elapsed)
+        for item in job.items:
+            item.trace.add_span(f"batch:{model}", elapsed, outcome)
+
+    # --- Scheduling ---
+    def _pick_model(self, models: List[str],
+                    tokens: int) -> Tuple[Optional[str], float]:
+        """Best available model, or (None, seconds until one frees up)."""
+        best_wait = float("inf")
+        for model in models:
+            wait = self.limiters[model].wait_time(tokens)
+            if wait == 0:
+                return model, 0.0
+            best_wait = min(best_wait, wait)
+        return None, best_wait
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1))
+        # Full jitter - keeps N workers from retrying in lockstep
+        return random.uniform(delay / 2, delay)
+
+    def _requeue(self, job: _Job, delay: float) -> None:
+        job.not_before = time.monotonic() + delay
+        job.seq = next(self._seq)
+        if delay > 0:
+            self._schedule(job, delay)
+        else:
+            self._queue.put_nowait(job)
+
+    def _schedule(self, job: _Job, delay: float) -> None:
+        """Back to the queue in `delay` seconds; workers stay free till then."""
+        def due() -> None:
+            self._timers.discard(handle)
+            if self._queue is not None:
+                self._queue.put_nowait(job)
+
+        handle = asyncio.get_running_loop().call_later(delay, due)
+        self._timers.add(handle)
+
+    async def _worker(self) -> None:
+        while True:
+            job: _Job = await self._queue.get()
+            try:
+                await self._handle(job)
+            except Exception as e:
+                # A bug in one job must not take the worker down with it:
+                # the caller gets an error (generate() closes the trace)
+                print(f"Warning: dispatcher job failed: {e!r}")
+                self._fail(job, LLMError(f"Internal error: {e}"))
+            finally:
+                self._queue.task_done()
+
+    async def _handle(self, job: _Job) -> None:
+        if job.abandoned():
+            return  # caller gave up
+
+        delay = job.not_before - time.monotonic()
+        if delay > 0:
+            # Not due yet: park it and let the worker take something else
+            self._schedule(job, delay)
+            return
+
+        models = [m for m in self.router.order() if m not in job.not_found]
+        if not models:
+            self._fail(job, LLMError(
+                "No AI model available: all of them returned 404 "
+                f"({', '.join(sorted(job.not_found))})."))
+            return
+
+        if job.items is None:
+            prompt = build_prompt(job.user_input, job.style)
+            config = generation_config()
+            tokens = estimate_tokens(SYSTEM_INSTRUCTION + prompt) \
+                + EXPECTED_OUTPUT_TOKENS
+        else:
+            prompt = build_batch_prompt(
+                [(i, item.user_input, item.style)
+                 for i, item in enumerate(job.items)
+                 if not item.future.done()])
+            config = batch_generation_config()
+            tokens = estimate_tokens(BATCH_INSTRUCTION + prompt) \
+                + EXPECTED_OUTPUT_TOKENS * len(job.items)
+
+        model, wait = self._pick_model(models, tokens)
+        if model is None:
+            self._requeue(job, wait)
+            return
+
+        self.limiters[model].consume(tokens)
+        self.router.begin(model)
+        job.attempts += 1
+        started = time.perf_counter()
+        try:
+            response = await self.client.aio.models.generate_content(
+                model=model, contents=prompt, config=config)
+        except asyncio.CancelledError:
+            self.router.release(model)
+            raise
+        except Exception as e:
+            self._on_error(job, model, e, time.perf_counter() - started)
+            return
+
+        elapsed = time.perf_counter() - started
+        text = (response.text or "").strip()
+        answers = parse_batch_reply(text) if job.items is not None else None
+        if not text or answers == {}:
+            self.router.record_failure(model, FAILED, elapsed)
+            self._record_attempt(job, model, FAILED, elapsed)
+            if job.items is not None:
+                self._split(job)
+                return
+            job.last_error = f"{model} returned an empty answer"
+            self._retry_or_fail(job, 0.0)
+            return
+
+        self.router.record_success(model, elapsed)
+        self._record_attempt(job, model, OK, elapsed)
+
+        if job.items is not None:
+            self._unpack(job, answers, model)
+        else:
+            self._store(job, model, text)
+
+    def _on_error(self, job: _Job, model: str, e: Exception,
+                  latency: float) -> None:
+        kind = classify_error(e)
+        self.router.record_failure(model, kind, latency)
+        self._record_attempt(job, model, kind, latency)
+        if kind == NOT_FOUND:
+            print(f"Model {model} not found (deprecated?). Switching...")
+            job.not_found.add(model)
+            for item in job.items or []:
+                item.not_found.add(model)  # carried over if they go solo
+            job.last_error = f"Model {model} not found (404)"
+            self._retry_or_fail(job, 0.0)
+            return
+
+        if kind == RATE_LIMITED:
+            print(f"Model {model} hit Rate Limit (429). Requeued.")
+            self.limiters[model].drain()
+            job.last_error = "Rate Limit Exceeded. Please wait a bit."
+        elif kind == FAILED:
+            print(f"Model {model} failed: {e}")
+            job.last_error = str(e)
+        else:
+            print(f"Model {model} is Overloaded (503). Requeued.")
+            job.last_error = "Google Servers are overloaded."
+
+        self._retry_or_fail(job, self._backoff(job.attempts))
+
+    def _retry_or_fail(self, job: _Job, delay: float) -> None:
+        if job.attempts >= self.max_attempts:
+            if "Rate Limit" in job.last_error:
+                err = LLMError("Quota Exceeded (429). Google asks to wait ~30s.")
+            else:
+                err = LLMError(
+                    f"All AI models failed. Last error: {job.last_error}")
+            self._fail(job, err)
+            return
+        self._requeue(job, delay)
+
+    def _fail(self, job: _Job, err: LLMError) -> None:
+        for item in job.items or [job]:
+            if not item.future.done():
+                item.future.set_exception(err)
@@ -1,12 +1,20 @@
+import gc
 import json
 import os
 import shutil
 import sys
+import threading
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, FrozenSet, Iterable, Optional, Tuple
 
 from pydantic import BaseModel, ValidationError, Field
 
+from src.core.prompt_tokens import (ChunkPacker, ParsedTag, TokenCounter,
+                                    fit_budget, merged_tags,
+                                    open_token_counter, parse_prompt)
+from src.core.style_snapshot import (SNAPSHOT_NAME, load_snapshot,
+                                     save_snapshot_async, source_key)
+
 
 # --- Models ---
 class LoraConfig(BaseModel):
@@ -27,6 +35,9 @@ class StyleConfig(BaseModel):
     negative_payload: str
     loras: List[LoraConfig] = []
     settings: GenSettings = Field(default_factory=GenSettings)
+    # Positive prompt limit in 75-token CLIP chunks; quality and style tags
+    # are always kept, user tags are trimmed to fit. None = no limit
+    max_chunks: Optional[int] = Field(default=None, ge=1)
 
 
 class GenerationResult(BaseModel):
@@ -35,6 +46,49 @@ class GenerationResult(BaseModel):
     style_used: str
     loras: List[Dict[str, Any]]
     settings: Dict[str, Any]
+    # User tags left out to fit StyleConfig.max_chunks
+    trimmed: List[str] = []
+
+
+NSFW_NEGATIVE = "nsfw, nude, naked, sex, pornography, 18+, censored"
+
+# Fan-out below this many styles stays in-process: starting worker
+# processes (each loads the style library) costs more than it saves
+PARALLEL_MIN_STYLES = 5000
+
+
+class CompiledStyle:
+    """
+    Everything process() needs for one (style, nsfw) pair, tokenized once
+    (on first use) and kept. Only the user segment is split per call.
+    """
+    __slots__ = ("style_name", "positive", "positive_rated", "seen",
+                 "seen_rated", "needs_rating", "negative", "loras",
+                 "settings", "max_chunks", "packed", "packed_rated")
+
+    def __init__(self, style_name: str, positive: "PromptCompiler",
+                 positive_rated: "PromptCompiler", needs_rating: bool,
+                 negative: str, loras: List[Dict[str, Any]],
+                 settings: Dict[str, Any], max_chunks: Optional[int] = None,
+                 counter: Optional[TokenCounter] = None):
+        self.style_name = style_name
+        # Fixed tags without / with the auto-inserted pony rating tag
+        self.positive = tuple(positive.tags)
+        self.positive_rated = tuple(positive_rated.tags)
+        # Normalized keys (weights and _ vs space don't count)
+        self.seen: FrozenSet[str] = frozenset(positive.index)
+        self.seen_rated: FrozenSet[str] = frozenset(positive_rated.index)
+        self.needs_rating = needs_rating
+        self.negative = negative
+        self.loras = loras
+        self.settings = settings
+        # Chunk layout after the fixed tags, for the per-call budget
+        self.max_chunks = max_chunks
+        self.packed: Optional[ChunkPacker] = None
+        self.packed_rated: Optional[ChunkPacker] = None
+        if max_chunks and counter is not None:
+            self.packed = positive.packer(counter)
+            self.packed_rated = positive_rated.packer(counter)
 
 
 # --- Engine ---
@@ -42,11 +96,17 @@ class TranspilerEngine:
     def __init__(self):
         self.app_name = "SD-Transpiler"
         self.internal_data_dir = self._get_internal_data_path()
-        self.user_data_dir = Path(os.getenv('APPDATA')) / self.app_name
+        self.user_data_dir = self._get_user_data_path()
 
         self.styles: Dict[str, StyleConfig] = {}
         # Structure: presets[base_model][mode] -> {positive: str, negative: str}
         self.quality_presets: Dict[str, Dict[str, Dict[str, str]]] = {}
+        # (style key, nsfw) -> pre-tokenized fixed segments
+        self._compiled: Dict[Tuple[str, bool], CompiledStyle] = {}
+        # style key -> canonical JSON it was built from (for reload diffs)
+        self._raw_styles: Dict[str, str] = {}
+        # CLIP token counts, loaded with the first budgeted style
+        self._token_counter: Optional[TokenCounter] = None
 
         self._ensure_user_config()
         self._load_data()
@@ -56,6 +116,13 @@ class TranspilerEngine:
             return Path(sys._MEIPASS) / 'data'
         return Path(__file__).parent.parent / 'data'
 
+    def _get_user_data_path(self) -> Path:
+        # Windows: %APPDATA%, headless Linux boxes: $XDG_CONFIG_HOME or ~/.config
+        base = os.getenv('APPDATA') or os.getenv('XDG_CONFIG_HOME')
+        if not base:
+            base = Path.home() / '.config'
+        return Path(base) / self.app_name
+
     def _ensure_user_config(self):
         if not self.user_data_dir.exists():
             try:
@@ -63,7 +130,7 @@ class TranspilerEngine:
             except OSError:
                 return
 
-        files_to_copy = ['styles.json', 'quality_tags.json']
+        files_to_copy = ['styles.json', 'quality_tags.json', 'phrase_table.json']
         for filename in files_to_copy:
             target = self.user_data_dir / filename
             source = self.internal_data_dir / filename
@@ -74,68 +141,254 @@ class TranspilerEngine:
                     print(
                         f"Warning: Could not copy default config {filename}: {e}")
 
-    def _load_data(self) -> None:
+    def data_file(self, filename: str) -> Path:
+        """User copy of a data file if there is one, else the shipped one."""
+        path = self.user_data_dir / filename
+        return path if path.exists() else self.internal_data_dir / filename
+
+    def config_paths(self) -> Tuple[Path, Path]:
+        """(styles.json, quality_tags.json) actually in use: user copy first."""
         styles_path = self.user_data_dir / 'styles.json'
         quality_path = self.user_data_dir / 'quality_tags.json'
 
         if not styles_path.exists(): styles_path = self.internal_data_dir / 'styles.json'
         if not quality_path.exists(): quality_path = self.internal_data_dir / 'quality_tags.json'
+        return styles_path, quality_path
+
+    def _load_data(self) -> None:
+        # Tens of thousands of small objects in one go: cyclic GC passes over
+        # them would cost more than the load itself
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self._load_data_inner()
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+    def _load_data_inner(self) -> None:
+        styles_path, quality_path = self.config_paths()
+
+        # Fast path: validated + compiled library from the last run
+        key = source_key(styles_path, quality_path)
+        snapshot = load_snapshot(self.user_data_dir / SNAPSHOT_NAME, key)
+        if snapshot is not None:
+            try:
+                self._apply_snapshot(snapshot)
+                return
+            except Exception as e:
+                print(f"Warning: Style snapshot ignored: {e}")
 
         try:
             # 1. Load Styles
             if styles_path.exists():
-                with open(styles_path, 'r', encoding='utf-8') as f:
-                    raw_styles = json.load(f).get("styles", {})
-                    for key, data in raw_styles.items():
-                        try:
-                            if "quality_mode" not in data: data[
-                                "quality_mode"] = "default"
-                            if "loras" in data and data[
-                                "loras"] and isinstance(data["loras"][0], str):
-                                data[
-                                    "loras"] = []
-
-                            self.styles[key] = StyleConfig(**data)
-                        except ValidationError as e:
-                            print(f"Style validation error for {key}: {e}")
-                            continue
+                self.styles, self._raw_styles = self._read_styles(
+                    styles_path, {}, {})
 
             # 2. Load Quality Presets
             if quality_path.exists():
-                with open(quality_path, 'r', encoding='utf-8') as f:
-                    q_data = json.load(f)
-                    self.quality_presets = q_data.get("presets", {})
+                self.quality_presets = self._read_presets(quality_path)
 
         except Exception as e:
             print(f"Config Load Error: {e}")
             self.styles = {
                 "Error": StyleConfig(name="Error", base_model="standard",
                                      prompt_payload="", negative_payload="")}
+            self._build_index()
+            return
+
+        self._build_index()
+        self._save_snapshot(key)
+
+    def _apply_snapshot(self, snapshot: Dict[str, Any]) -> None:
+        # Dumps of already validated models: rebuild without validation
+        styles = {}
+        for key, data in snapshot["styles"]:
+            styles[key] = StyleConfig.model_construct(**dict(
+                data,
+                loras=[LoraConfig.model_construct(**l) for l in data["loras"]],
+                settings=GenSettings.model_construct(**data["settings"])))
+        (self.styles, self._raw_styles, self.quality_presets) = (
+            styles, snapshot["raw_styles"], snapshot["quality_presets"])
+        self._build_index()
+
+    def _save_snapshot(self, key: Tuple) -> None:
+        if not self.user_data_dir.exists():
+            return
+        # Plain dicts pickle ~10x smaller/faster than pydantic instances
+        save_snapshot_async(self.user_data_dir / SNAPSHOT_NAME, key, {
+            "styles": [(k, v.model_dump()) for k, v in self.styles.items()],
+            "raw_styles": self._raw_styles,
+            "quality_presets": self.quality_presets,
+        })
+
+    def _read_styles(self, path: Path, previous: Dict[str, StyleConfig],
+                     previous_raw: Dict[str, str]
+                     ) -> Tuple[Dict[str, StyleConfig], Dict[str, str]]:
+        """
+        Parses styles.json. Styles whose JSON is byte-for-byte the same as in
+        previous_raw are reused instead of being validated again.
+        """
+        styles: Dict[str, StyleConfig] = {}
+        raw: Dict[str, str] = {}
+        with open(path, 'r', encoding='utf-8') as f:
+            raw_styles = json.load(f).get("styles", {})
+
+        for key, data in raw_styles.items():
+            fingerprint = json.dumps(data, sort_keys=True, ensure_ascii=False)
+            raw[key] = fingerprint
+            if previous_raw.get(key) == fingerprint and key in previous:
+                styles[key] = previous[key]
+                continue
+            try:
+                if "quality_mode" not in data: data[
+                    "quality_mode"] = "default"
+                if "loras" in data and data[
+                    "loras"] and isinstance(data["loras"][0], str):
+                    data[
+                        "loras"] = []
+
+                styles[key] = StyleConfig(**data)
+            except ValidationError as e:
+                print(f"Style validation error for {key}: {e}")
+                continue
+        return styles, raw
+
+    def _read_presets(self, path: Path) -> Dict[str, Dict[str, Dict[str, str]]]:
+        with open(path, 'r', encoding='utf-8') as f:
+            q_data = json.load(f)
+            return q_data.get("presets", {})
+
+    def reload(self) -> bool:
+        """
+        Re-reads both config files. Only changed styles are revalidated and
+        recompiled; the new maps replace the old ones in one step, so
+        process() calls already running keep their snapshot. A broken file
+        (e.g. saved halfway) leaves the current library untouched.
+        Returns True if anything changed.
+        """
+        styles_path, quality_path = self.config_paths()
+        # Key first: a save landing mid-read must leave the snapshot stale
+        key = source_key(styles_path, quality_path)
+        try:
+            styles, raw = self.styles, self._raw_styles
+            if styles_path.exists():
+                styles, raw = self._read_styles(styles_path, self.styles,
+                                                self._raw_styles)
+            presets = self.quality_presets
+            if quality_path.exists():
+                presets = self._read_presets(quality_path)
+        except Exception as e:
+            print(f"Config Reload Error (keeping current styles): {e}")
+            return False
+
+        if raw == self._raw_styles and presets == self.quality_presets:
+            return False
+
+        # Presets of these base models changed -> their styles need recompiling
+        changed_models = {
+            model for model in set(presets) | set(self.quality_presets)
+            if presets.get(model) != self.quality_presets.get(model)}
+
+        # Keep compiled entries of untouched styles, the rest compile lazily
+        compiled: Dict[Tuple[str, bool], CompiledStyle] = {}
+        for (key, nsfw), entry in list(self._compiled.items()):
+            style = styles.get(key)
+            if (style is not None and style is self.styles.get(key)
+                    and style.base_model not in changed_models):
+                compiled[(key, nsfw)] = entry
+
+        (self.styles, self._raw_styles, self.quality_presets,
+         self._compiled) = styles, raw, presets, compiled
+        self._save_snapshot(key)
+        return True
+
+    def _build_index(self) -> None:
+        # Filled lazily by _get_compiled: a 50k-style library should not pay
+        # for compiling styles nobody picks in this session
+        self._compiled = {}
+
+    def _compile_style(self, style: StyleConfig, nsfw_enabled: bool,
+                       presets: Optional[Dict] = None) -> CompiledStyle:
+        q_tags = self._resolve_quality(style, presets)
+        q_positive = q_tags.get("positive", "")
+
+        plain = PromptCompiler()
+        plain.add(q_positive)
+        plain.add(style.prompt_payload)
+
+        # Same rule as _positive_segments, minus the user part (checked per call)
+        needs_rating = (
+                style.base_model == "pony"
+                and "rating_" not in (q_positive + style.prompt_payload).lower()
+                and "score_" in q_positive)
+        rated = PromptCompiler()
+        rated.add(q_positive)
+        if needs_rating:
+            rated.add("rating_explicit" if nsfw_enabled else "rating_safe")
+        rated.add(style.prompt_payload)
+
+        return CompiledStyle(
+            style_name=style.name,
+            positive=plain,
+            positive_rated=rated,
+            needs_rating=needs_rating,
+            negative=self._compile_prompt(
+                self._negative_segments(style, q_tags, nsfw_enabled)),
+            loras=[l.model_dump() for l in style.loras],
+            settings=style.settings.model_dump(),
+            max_chunks=style.max_chunks,
+            counter=self.token_counter if style.max_chunks else None)
+
+    @property
+    def token_counter(self) -> TokenCounter:
+        if self._token_counter is None:
+            self._token_counter = open_token_counter(self.user_data_dir)
+        return self._token_counter
+
+    def _get_compiled(self, style_name: str,
+                      nsfw_enabled: bool) -> CompiledStyle:
+        # One read of the map: a concurrent reload() cannot mix snapshots
+        compiled_map = self._compiled
+        compiled = compiled_map.get((style_name, nsfw_enabled))
+        if compiled is None:
+            style = self.styles.get(style_name)
+            if style is None:
+                # Unknown name -> same fallback as _resolve_style, not cached
+                return self._compile_style(self._resolve_style(style_name),
+                                           nsfw_enabled)
+            compiled = compiled_map[(style_name, nsfw_enabled)] = \
+                self._compile_style(style, nsfw_enabled)
+        return compiled
 
     def get_style_names(self) -> List[str]:
         return list(self.styles.keys())
 
-    def process(self, user_input: str, style_name: str,
-                nsfw_enabled: bool) -> GenerationResult:
+    def _resolve_style(self, style_name: str) -> StyleConfig:
         style = self.styles.get(style_name)
         if not style:
             style = list(self.styles.values())[
                 0] if self.styles else StyleConfig(
                 name="Fallback", base_model="standard", prompt_payload="",
                 negative_payload="")
+        return style
 
-        # 1. Resolve Quality Preset
+    def _resolve_quality(self, style: StyleConfig,
+                         presets: Optional[Dict] = None) -> Dict[str, str]:
         # Logic: base_model -> quality_mode. If mode none, Fallback on default
-        model_presets = self.quality_presets.get(style.base_model, {})
+        if presets is None:
+            presets = self.quality_presets
+        model_presets = presets.get(style.base_model, {})
 
         target_mode = style.quality_mode
         if target_mode not in model_presets:
             target_mode = "default"
 
-        q_tags = model_presets.get(target_mode,
-                                   {"positive": "", "negative": ""})
+        return model_presets.get(target_mode,
+                                 {"positive": "", "negative": ""})
 
-        # 2. Construct Positive Prompt
+    def _positive_segments(self, style: StyleConfig, q_tags: Dict[str, str],
+                           user_input: str, nsfw_enabled: bool) -> List[str]:
         # Order: Quality -> Style Payload -> User Input -> Rating (if pony)
         pos_segments = [
             q_tags.get("positive", ""),
@@ -151,50 +404,221 @@ class TranspilerEngine:
                     "positive", ""):
                 pos_segments.insert(1, rating_tag)
 
-        final_positive = self._compile_prompt(pos_segments)
+        return pos_segments
 
-        # 3. Construct Negative Prompt
+    def _negative_segments(self, style: StyleConfig, q_tags: Dict[str, str],
+                           nsfw_enabled: bool) -> List[str]:
         neg_segments = [q_tags.get("negative", ""), style.negative_payload]
 
         if not nsfw_enabled and style.base_model != "pony":
-            neg_segments.append(
-                "nsfw, nude, naked, sex, pornography, 18+, censored")
+            neg_segments.append(NSFW_NEGATIVE)
 
-        final_negative = self._compile_prompt(neg_segments)
+        return neg_segments
 
-        return GenerationResult(
-            positive_prompt=final_positive,
-            negative_prompt=final_negative,
-            style_used=style.name,
-            loras=[l.model_dump() for l in style.loras],
-            settings=style.settings.model_dump()
+    def process(self, user_input: str, style_name: str,
+                nsfw_enabled: bool) -> GenerationResult:
+        compiled = self._get_compiled(style_name, nsfw_enabled)
+        user_segment = self._sanitize_input(user_input)
+
+        # Pony rating goes in only if nobody (including the user) set one
+        if compiled.needs_rating and "rating_" not in user_segment.lower():
+            fixed, seen = compiled.positive_rated, compiled.seen_rated
+            packed = compiled.packed_rated
+        else:
+            fixed, seen = compiled.positive, compiled.seen
+            packed = compiled.packed
+
+        # Only the user segment is parsed here, once per text (multi-style
+        # reuses it); style tags win over user variants of them
+        user_tags = [tag for tag in merged_tags(user_segment)
+                     if tag.key not in seen]
+
+        trimmed: List[ParsedTag] = []
+        if packed is not None:
+            user_tags, trimmed = fit_budget(self.token_counter, packed,
+                                            user_tags, compiled.max_chunks)
+
+        final_tags = list(fixed)
+        final_tags.extend([tag.text for tag in user_tags])
+
+        # Fields are already validated - skip pydantic validation on the hot path
+        return GenerationResult.model_construct(
+            positive_prompt=", ".join(final_tags),
+            negative_prompt=compiled.negative,
+            style_used=compiled.style_name,
+            loras=[dict(l) for l in compiled.loras],
+            settings=dict(compiled.settings),
+            trimmed=[tag.text for tag in trimmed]
         )
 
+    def process_many(self, items: Iterable[Tuple[str, str, bool]]
+                     ) -> List[GenerationResult]:
+        """Batch process(): items are (user_input, style_name, nsfw)."""
+        return [self.process(text, style_name, nsfw)
+                for text, style_name, nsfw in items]
+
+    def process_styles(self, user_input: str, style_names: Iterable[str],
+                       nsfw_enabled: bool,
+                       workers: Optional[int] = None
+                       ) -> List[GenerationResult]:
+        """
+        One tag list through many styles (multi-style mode). Big libraries
+        are split across worker processes - process() is pure Python, so
+        threads would just take turns on the GIL.
+        """
+        names = list(style_names)
+        workers = workers if workers is not None else min(os.cpu_count() or 1, 8)
+        if workers <= 1 or len(names) < PARALLEL_MIN_STYLES:
+            return [self.process(user_input, name, nsfw_enabled)
+                    for name in names]
+
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        size = -(-len(names) // (workers * 4))
+        chunks = [(user_input, names[i:i + size], nsfw_enabled)
+                  for i in range(0, len(names), size)]
+        # spawn everywhere: forking a process that runs Qt threads is unsafe
+        with ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context("spawn")
+        ) as pool:
+            parts = pool.map(_process_chunk, chunks)
+            return [GenerationResult.model_construct(**fields)
+                    for part in parts for fields in part]
+
+    def stream(self, style_name: str, nsfw_enabled: bool) -> "PromptStream":
+        """Incremental counterpart of process() for streamed LLM output."""
+        return PromptStream(self, style_name, nsfw_enabled)
+
     def _sanitize_input(self, text: str) -> str:
         if not text: return ""
         return " ".join(text.split())
 
     def _compile_prompt(self, segments: List[str]) -> str:
         """
-        Deduplicates tags, removes empty strings, preserves order.
+        Deduplicates tags (weights and _ vs space aside), removes empty
+        strings, preserves order.
         """
-        seen = set()
-        final_tags = []
-
+        compiler = PromptCompiler()
         for seg in segments:
-            if not seg: continue
-            # Split by comma, strip whitespace
-            tags = [t.strip() for t in seg.split(',')]
-            for tag in tags:
-                tag_lower = tag.lower()
-                if not tag_lower: continue
+            compiler.add(seg)
+        return compiler.text()
 
-                # Simple deduplication
-                if tag_lower not in seen:
-                    seen.add(tag_lower)
-                    final_tags.append(tag)
 
-        return ", ".join(final_tags)
+class PromptCompiler:
+    """
+    Incremental _compile_prompt: `index` survives between add() calls, so
+    segments can be fed as they arrive. Duplicates are found by normalized
+    key: "orange_hair", "Orange hair" and "(orange hair:1.2)" are one tag.
+    The first one keeps its place; a weighted variant replaces a plain one.
+    """
 
-
-engine = TranspilerEngine()
\ No newline at end of file
+    def __init__(self):
+        self.index: Dict[str, int] = {}  # key -> position in tags
+        self.parsed: List[ParsedTag] = []
+        self.tags: List[str] = []
+
+    def add(self, segment: str) -> List[str]:
+        """Adds a comma-separated segment, returns the tags that were new."""
+        added = []
+        if not segment:
+            return added
+        for tag in parse_prompt(segment):
+            i = self.index.get(tag.key)
+            if i is None:
+                self.index[tag.key] = len(self.tags)
+                self.parsed.append(tag)
+                self.tags.append(tag.text)
+                added.append(tag.text)
+            elif self.parsed[i].weight == 1.0 and tag.weight != 1.0:
+                self.parsed[i] = tag
+                self.tags[i] = tag.text
+        return added
+
+    def packer(self, counter: TokenCounter) -> ChunkPacker:
+        """Chunk layout of the tags so far."""
+        packer = ChunkPacker()
+        for tag in self.parsed:
+            packer.add(counter.count(tag.content), tag.is_break)
+        return packer
+
+    def text(self) -> str:
+        return ", ".join(self.tags)
+
+
+class PromptStream:
+    """
+    Feeds LLM chunks into the positive prompt as soon as a tag is complete
+    (i.e. its trailing comma has arrived). The preview assumes the LLM does
+    not emit its own rating_ tag; finish() runs the full process() so the
+    final result is always identical to the non-streamed path.
+    """
+
+    def __init__(self, engine: TranspilerEngine, style_name: str,
+                 nsfw_enabled: bool):
+        self.engine = engine
+        self.style_name = style_name
+        self.nsfw_enabled = nsfw_enabled
+
+        style = engine._resolve_style(style_name)
+        q_tags = engine._resolve_quality(style)
+
+        self.positive = PromptCompiler()
+        for seg in engine._positive_segments(style, q_tags, "",
+                                             nsfw_enabled):
+            self.positive.add(seg)
+        self.negative_prompt = engine._compile_prompt(
+            engine._negative_segments(style, q_tags, nsfw_enabled))
+
+        self._raw: List[str] = []
+        self._pending = ""
+
+    @property
+    def positive_prompt(self) -> str:
+        return self.positive.text()
+
+    def feed(self, chunk: str) -> bool:
+        """Returns True when the preview changed."""
+        self._raw.append(chunk)
+        self._pending += chunk
+        head, sep, tail = self._pending.rpartition(',')
+        if not sep:
+            return False
+        self._pending = tail
+        return bool(self.positive.add(self.engine._sanitize_input(head)))
+
+    def text(self) -> str:
+        return "".join(self._raw)
+
+    def finish(self) -> GenerationResult:
+        return self.engine.process(self.text(), self.style_name,
+                                   self.nsfw_enabled)
+
+
+_engine: Optional[TranspilerEngine] = None
+_engine_lock = threading.Lock()
+
+
+def _process_chunk(args: Tuple[str, List[str], bool]) -> List[Dict[str, Any]]:
+    # Runs in a worker process, which loads its own engine from the same
+    # config files (the style snapshot makes that quick)
+    user_input, names, nsfw_enabled = args
+    engine = get_engine()
+    return [dict(engine.process(user_input, name, nsfw_enabled))
+            for name in names]
+
+
+def get_engine() -> TranspilerEngine:
+    """Process-wide engine, built on first use (reads + validates styles)."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = TranspilerEngine()
+    return _engine
+
+
+def __getattr__(name):
+    # `from src.core.generator import engine` keeps working, but lazily
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
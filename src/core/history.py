@@ -0,0 +1,209 @@
+import json
+import queue
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Union
+
+from src.core.generator import GenerationResult
+
+HISTORY_NAME = 'history.sqlite3'
+
+_STOP = object()
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+class HistoryEntry:
+    __slots__ = ("id", "created", "user_input", "nsfw", "source", "result",
+                 "style_key")
+
+    def __init__(self, id: int, created: float, user_input: str, nsfw: bool,
+                 source: str, result: GenerationResult, style_key: str = ""):
+        self.id = id
+        self.created = created
+        self.user_input = user_input
+        self.nsfw = nsfw
+        self.source = source  # 'gemini' / 'draft' / 'offline'
+        self.result = result
+        # Selector key ("Quantum Surrealism (Experimental)"); result.style_used
+        # is the display name. "" in rows written before the column existed
+        self.style_key = style_key
+
+
+def fts_query(text: str) -> str:
+    """User search text -> FTS5 MATCH: every word as a prefix, all required."""
+    return " ".join(f'"{token}"*' for token in _TOKEN.findall(text.lower()))
+
+
+class GenerationHistory:
+    """
+    Every finished result in SQLite (WAL), searchable through an FTS5 index
+    over the input and the positive prompt. Writes go through a queue to a
+    background thread, so add() never waits for the disk; searches use
+    their own connection (WAL readers don't block on the writer).
+    Bounded to the newest max_entries rows.
+    """
+
+    def __init__(self, path: Union[str, Path], max_entries: int = 5000):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._conn = self._connect()
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS history ("
+            " id INTEGER PRIMARY KEY,"
+            " created REAL NOT NULL,"
+            " user_input TEXT NOT NULL,"
+            " style TEXT NOT NULL,"
+            " nsfw INTEGER NOT NULL,"
+            " source TEXT NOT NULL,"
+            " positive TEXT NOT NULL,"
+            " negative TEXT NOT NULL,"
+            " loras TEXT NOT NULL,"
+            " settings TEXT NOT NULL,"
+            " style_key TEXT NOT NULL DEFAULT '');"
+            "CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5("
+            " user_input, positive, content='history', content_rowid='id',"
+            " tokenize='unicode61 remove_diacritics 2');"
+            # External-content FTS: kept in sync by triggers
+            "CREATE TRIGGER IF NOT EXISTS history_ai AFTER INSERT ON history"
+            " BEGIN INSERT INTO history_fts(rowid, user_input, positive)"
+            " VALUES (new.id, new.user_input, new.positive); END;"
+            "CREATE TRIGGER IF NOT EXISTS history_ad AFTER DELETE ON history"
+            " BEGIN INSERT INTO history_fts(history_fts, rowid, user_input,"
+            " positive) VALUES ('delete', old.id, old.user_input,"
+            " old.positive); END;")
+        columns = {row[1] for row in
+                   self._conn.execute("PRAGMA table_info(history)")}
+        if "style_key" not in columns:
+            self._conn.execute("ALTER TABLE history ADD COLUMN"
+                               " style_key TEXT NOT NULL DEFAULT ''")
+        self._conn.commit()
+
+        self._read_lock = threading.Lock()
+        self._writes: "queue.Queue" = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop,
+                                        name="history-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # --- Writer thread ---
+    def _write_loop(self) -> None:
+        conn = self._connect()
+        try:
+            while True:
+                item = self._writes.get()
+                # Whatever piled up meanwhile goes in the same transaction
+                batch = [item]
+                while True:
+                    try:
+                        batch.append(self._writes.get_nowait())
+                    except queue.Empty:
+                        break
+                rows = [i for i in batch
+                        if i is not _STOP and not isinstance(i, threading.Event)]
+                if rows:
+                    try:
+                        self._insert(conn, rows)
+                    except sqlite3.Error as e:
+                        print(f"Warning: History not saved: {e}")
+                for i in batch:
+                    if isinstance(i, threading.Event):
+                        i.set()
+                if any(i is _STOP for i in batch):
+                    return
+        finally:
+            conn.close()
+
+    def _insert(self, conn: sqlite3.Connection, rows: List[tuple]) -> None:
+        with conn:
+            conn.executemany(
+                "INSERT INTO history (created, user_input, style, nsfw,"
+                " source, positive, negative, loras, settings, style_key)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.execute(
+                "DELETE FROM history WHERE id <= (SELECT id FROM history"
+                " ORDER BY id DESC LIMIT 1 OFFSET ?)", (self.max_entries,))
+
+    # --- API ---
+    def add(self, user_input: str, nsfw: bool, result: GenerationResult,
+            source: str = "gemini", style_key: str = "") -> None:
+        """Queued; returns immediately."""
+        self._writes.put((
+            time.time(), user_input, result.style_used, int(nsfw), source,
+            result.positive_prompt, result.negative_prompt,
+            json.dumps(result.loras, ensure_ascii=False),
+            json.dumps(result.settings, ensure_ascii=False), style_key))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Waits until everything queued so far is on disk."""
+        done = threading.Event()
+        self._writes.put(done)
+        return done.wait(timeout)
+
+    def search(self, text: str = "", limit: int = 50) -> List[HistoryEntry]:
+        """Newest first; with text, best FTS matches first."""
+        query = fts_query(text)
+        columns = ("h.id, h.created, h.user_input, h.style, h.nsfw, h.source,"
+                   " h.positive, h.negative, h.loras, h.settings, h.style_key")
+        with self._read_lock:
+            if query:
+                rows = self._conn.execute(
+                    f"SELECT {columns} FROM history_fts f"
+                    f" JOIN history h ON h.id = f.rowid"
+                    f" WHERE history_fts MATCH ?"
+                    f" ORDER BY f.rank, h.id DESC LIMIT ?",
+                    (query, limit)).fetchall()
+            else:
+                rows = self._conn.execute(
+                    f"SELECT {columns} FROM history h"
+                    f" ORDER BY h.id DESC LIMIT ?", (limit,)).fetchall()
+        return [_entry(row) for row in rows]
+
+    def get(self, entry_id: int) -> Optional[HistoryEntry]:
+        with self._read_lock:
+            row = self._conn.execute(
+                "SELECT id, created, user_input, style, nsfw, source,"
+                " positive, negative, loras, settings, style_key FROM history"
+                " WHERE id = ?", (entry_id,)).fetchone()
+        return _entry(row) if row else None
+
+    def count(self) -> int:
+        with self._read_lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM history").fetchone()[0]
+
+    def clear(self) -> None:
+        self.flush()
+        with self._read_lock:
+            self._conn.execute("DELETE FROM history")
+            self._conn.execute(
+                "INSERT INTO history_fts(history_fts) VALUES ('rebuild')")
+            self._conn.commit()
+
+    def close(self) -> None:
+        self._writes.put(_STOP)
+        self._writer.join(timeout=5)
+        with self._read_lock:
+            self._conn.close()
+
+
+def _entry(row) -> HistoryEntry:
+    (entry_id, created, user_input, style, nsfw, source, positive, negative,
+     loras, settings, style_key) = row
+    return HistoryEntry(entry_id, created, user_input, bool(nsfw), source,
+                        GenerationResult.model_construct(
+                            positive_prompt=positive,
+                            negative_prompt=negative,
+                            style_used=style,
+                            loras=json.loads(loras),
+                            settings=json.loads(settings)),
+                        style_key)
@@ -0,0 +1,425 @@
+import json
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+from google import genai
+from google.api_core import exceptions as google_exceptions
+from pydantic import BaseModel, ValidationError
+
+from src.core.llm_transport import Transport, transport_from_env
+from src.core.metrics import CANCELLED, OK, RequestTrace, metrics
+from src.core.model_router import (FAILED, NOT_FOUND, OVERLOADED,
+                                    RATE_LIMITED, ModelRouter)
+from src.core.response_cache import ResponseCache, SingleFlight, normalize_input
+from src.core.similar_cache import SimilarIndex
+
+MODEL_PRIORITIES = [
+    "gemini-2.5-flash",
+    "gemini-2.0-flash",
+    "gemini-2.0-flash-lite",
+    "gemini-3-flash-preview"
+]
+
+SYSTEM_INSTRUCTION = (
+    "Role: Expert Stable Diffusion Prompt Engineer (Danbooru/e621 format).\n"
+    "Task: Translate and expand user input into a detailed, comma-separated list of English tags.\n"
+    "Rules:\n"
+    "1. TRANSLATE everything to English.\n"
+    "2. OUTPUT FORMAT: tag1, tag2, tag3. NO markdown, NO explanations, NO dictionaries.\n"
+    "3. STRUCTURE: Subject -> Appearance/Clothing -> Pose/Action -> Environment -> Lighting/Camera.\n"
+    "4. IMPORTANT: DO NOT add quality score tags (e.g. 'masterpiece', 'best quality', 'score_9') - system adds them automatically.\n"
+    "5. CREATIVITY: If input is simple, logically fill in missing visual details (texture, background, mood).\n"
+    "\n"
+    "Example Input: 'рыжая девушка в лесу'\n"
+    "Example Output: 1girl, solo, orange hair, long hair, detailed eyes, casual clothes, standing, forest, trees, nature, sunlight, dappled lighting, depth of field, soft focus"
+)
+
+
+# Several requests in one call: same rules, answer is JSON keyed by item id
+BATCH_INSTRUCTION = SYSTEM_INSTRUCTION + (
+    "\n\nBATCH MODE: the request contains several numbered items. Apply the "
+    "rules above to each item independently and return one entry per item: "
+    "{\"id\": <item id>, \"tags\": \"tag1, tag2, ...\"}."
+)
+
+
+class BatchItem(BaseModel):
+    id: int
+    tags: str
+
+
+class LLMError(Exception):
+    """Ошибка, которую можно показать пользователю как есть."""
+
+
+# google.api_core and google.genai.errors both show up here
+def classify_error(e: Exception) -> str:
+    if isinstance(e, google_exceptions.ResourceExhausted):
+        return RATE_LIMITED
+    if isinstance(e, google_exceptions.ServiceUnavailable):
+        return OVERLOADED
+    if isinstance(e, google_exceptions.NotFound):
+        return NOT_FOUND
+    code = getattr(e, "code", None)
+    if code == 429:
+        return RATE_LIMITED
+    if code in (500, 503):
+        return OVERLOADED
+    if code == 404:
+        return NOT_FOUND
+    return FAILED
+
+
+def generation_config() -> genai.types.GenerateContentConfig:
+    return genai.types.GenerateContentConfig(
+        system_instruction=SYSTEM_INSTRUCTION,
+        temperature=0.4
+    )
+
+
+# Shared health state for every caller in this process
+router = ModelRouter(MODEL_PRIORITIES)
+
+# Identical (input, style) requests running at the same time share one call
+_inflight = SingleFlight()
+
+
+# httpx drops idle connections after 5s by default - that means a fresh
+# TLS handshake on almost every interactive click
+_POOL_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=16,
+                            keepalive_expiry=300.0)
+
+_clients: Dict[str, genai.Client] = {}
+_clients_lock = threading.Lock()
+
+
+# Record/replay layer (llm_transport.py): from $SDT_LLM_TRANSPORT on first
+# use, or set with use_transport()
+_transport: Optional[Transport] = None
+_transport_checked = False
+
+
+def use_transport(transport: Optional[Transport]) -> None:
+    """Swap the transport (load tests); drops pooled clients."""
+    global _transport, _transport_checked
+    with _clients_lock:
+        _transport, _transport_checked = transport, True
+        _clients.clear()
+
+
+def create_client(api_key: str) -> genai.Client:
+    global _transport, _transport_checked
+    if not _transport_checked:
+        _transport_checked = True
+        _transport = transport_from_env()
+    if _transport is not None:
+        return _transport.client(lambda: _new_client(api_key))
+    return _new_client(api_key)
+
+
+def _new_client(api_key: str) -> genai.Client:
+    if not api_key:
+        raise LLMError("API Key is missing.")
+    try:
+        return genai.Client(
+            api_key=api_key,
+            http_options=genai.types.HttpOptions(
+                client_args={"limits": _POOL_LIMITS},
+                async_client_args={"limits": _POOL_LIMITS}))
+    except Exception as e:
+        raise LLMError(f"Init Error: {str(e)}")
+
+
+def get_client(api_key: str) -> genai.Client:
+    """Process-wide client per key, so its connection pool is reused."""
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = _clients[api_key] = create_client(api_key)
+        return client
+
+
+def warm_up(client: genai.Client) -> None:
+    """Cheap metadata call: opens the TLS connection before the user needs it."""
+    try:
+        client.models.get(model=router.order()[0])
+    except Exception as e:
+        print(f"Warm-up skipped: {e}")
+
+
+def build_prompt(user_input: str, style: str) -> str:
+    if not style:
+        # Multi-style mode: one neutral expansion, styles are applied locally
+        return f"User Request: {user_input}"
+    return f"Style Context: {style}. \nUser Request: {user_input}"
+
+
+def batch_generation_config() -> genai.types.GenerateContentConfig:
+    return genai.types.GenerateContentConfig(
+        system_instruction=BATCH_INSTRUCTION,
+        temperature=0.4,
+        response_mime_type="application/json",
+        response_schema=list[BatchItem]
+    )
+
+
+def build_batch_prompt(items: Sequence[Tuple[int, str, str]]) -> str:
+    """items: (id, user_input, style)."""
+    return "\n\n".join(f"Item {item_id}:\n{build_prompt(text, style)}"
+                       for item_id, text, style in items)
+
+
+def parse_batch_reply(text: str) -> Dict[int, str]:
+    """id -> tags. Malformed entries are dropped (retried one by one)."""
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return {}
+    if isinstance(data, dict):
+        data = data.get("items", [])
+    if not isinstance(data, list):
+        return {}
+
+    tags = {}
+    for entry in data:
+        try:
+            item = BatchItem.model_validate(entry)
+        except ValidationError:
+            continue
+        if item.tags.strip():
+            tags[item.id] = item.tags.strip()
+    return tags
+
+
+def _lookup(cache: ResponseCache, user_input: str, style: str,
+            trace: RequestTrace) -> Optional[str]:
+    started = time.perf_counter()
+    cached = cache.get_any([
+        ResponseCache.make_key(user_input, style, model_name,
+                               SYSTEM_INSTRUCTION)
+        for model_name in MODEL_PRIORITIES])
+    trace.add_span("cache", time.perf_counter() - started,
+                   "hit" if cached else "miss")
+    return cached
+
+
+def is_cached(cache: Optional[ResponseCache], user_input: str,
+              style: str) -> bool:
+    """Would generate_tags answer from the cache? (prefetch decisions)"""
+    return cache is not None and cache.contains_any([
+        ResponseCache.make_key(user_input, style, model_name,
+                               SYSTEM_INSTRUCTION)
+        for model_name in MODEL_PRIORITIES])
+
+
+def _cached_answer(cache: Optional[ResponseCache],
+                   similar: Optional[SimilarIndex], user_input: str,
+                   style: str, trace: RequestTrace,
+                   on_near_hit: Optional[Callable[[float], None]]
+                   ) -> Optional[str]:
+    """Exact cache first, then a near-duplicate of an earlier request."""
+    if cache is not None:
+        cached = _lookup(cache, user_input, style, trace)
+        if cached:
+            return cached
+    if similar is None:
+        return None
+
+    started = time.perf_counter()
+    near = similar.lookup(user_input, style)
+    trace.add_span("similar", time.perf_counter() - started,
+                   f"hit {near[1]:.2f}" if near else "miss")
+    if near is None:
+        return None
+    if on_near_hit is not None:
+        on_near_hit(near[1])
+    return near[0]
+
+
+def _remember(cache: Optional[ResponseCache],
+              similar: Optional[SimilarIndex], user_input: str, style: str,
+              model_name: str, text: str) -> None:
+    if cache is not None:
+        cache.put(ResponseCache.make_key(
+            user_input, style, model_name, SYSTEM_INSTRUCTION), text)
+    if similar is not None:
+        similar.add(user_input, style, text)
+
+
+def generate_tags(client: genai.Client, user_input: str, style: str,
+                  cache: Optional[ResponseCache] = None,
+                  use_cache: bool = True,
+                  trace: Optional[RequestTrace] = None,
+                  similar: Optional[SimilarIndex] = None,
+                  on_near_hit: Optional[Callable[[float], None]] = None
+                  ) -> str:
+    """
+    Qt-free fallback chain: tries models in the router's order until one
+    answers. Used by GeminiWorker and by the headless batch runner.
+    use_cache=False skips the lookups but still stores the fresh answer.
+    With `similar`, a near-duplicate of an earlier request is answered from
+    it and on_near_hit(similarity) is called.
+    Cache lookup and every model attempt are recorded on `trace`.
+    """
+    trace = trace or metrics.trace()
+    if use_cache:
+        cached = _cached_answer(cache, similar, user_input, style, trace,
+                                on_near_hit)
+        if cached:
+            return cached
+
+    return _inflight.do(
+        (normalize_input(user_input), style),
+        lambda: _call_models(client, user_input, style, cache, trace,
+                             similar))
+
+
+def _log_failure(model_name: str, kind: str, e: Exception,
+                 last_error: str) -> str:
+    """Prints why we switch models, returns the user-facing last error."""
+    if kind == RATE_LIMITED:
+        print(f"Model {model_name} hit Rate Limit (429). Switching...")
+        return "Rate Limit Exceeded. Please wait a bit."
+    if kind == OVERLOADED:
+        print(f"Model {model_name} is Overloaded (503). Switching...")
+        return "Google Servers are overloaded."
+    if kind == NOT_FOUND:
+        print(f"Model {model_name} not found (deprecated?). Switching...")
+        return last_error
+    print(f"Model {model_name} failed: {e}")
+    return str(e)
+
+
+def _final_error(last_error: str) -> LLMError:
+    if "Rate Limit" in last_error:
+        return LLMError("Quota Exceeded (429). Google asks to wait ~30s.")
+    return LLMError(f"All AI models failed. Last error: {last_error}")
+
+
+def stream_tags(client: genai.Client, user_input: str, style: str,
+                on_chunk: Callable[[str], None],
+                cache: Optional[ResponseCache] = None,
+                use_cache: bool = True,
+                is_cancelled: Callable[[], bool] = lambda: False,
+                trace: Optional[RequestTrace] = None,
+                similar: Optional[SimilarIndex] = None,
+                on_near_hit: Optional[Callable[[float], None]] = None
+                ) -> str:
+    """
+    Streaming variant of generate_tags: on_chunk gets text as it arrives.
+    Falls back to the next model only while nothing has been emitted yet -
+    after the first chunk a failure is final (no duplicated output).
+    Returns the full text ("" if cancelled).
+    """
+    trace = trace or metrics.trace()
+    if use_cache:
+        cached = _cached_answer(cache, similar, user_input, style, trace,
+                                on_near_hit)
+        if cached:
+            on_chunk(cached)
+            return cached
+
+    prompt = build_prompt(user_input, style)
+
+    last_error = ""
+
+    for model_name in router.order():
+        router.begin(model_name)
+        started = time.perf_counter()
+        parts = []
+        try:
+            for chunk in client.models.generate_content_stream(
+                    model=model_name,
+                    contents=prompt,
+                    config=generation_config()):
+                if is_cancelled():
+                    trace.attempt(model_name, CANCELLED,
+                                  time.perf_counter() - started)
+                    return ""
+                if chunk.text:
+                    parts.append(chunk.text)
+                    on_chunk(chunk.text)
+
+            text = "".join(parts).strip()
+            elapsed = time.perf_counter() - started
+            if text:
+                router.record_success(model_name, elapsed)
+                trace.attempt(model_name, OK, elapsed)
+                _remember(cache, similar, user_input, style, model_name,
+                          text)
+                return text
+
+            router.record_failure(model_name, FAILED, elapsed)
+            trace.attempt(model_name, FAILED, elapsed)
+
+        except Exception as e:
+            kind = classify_error(e)
+            elapsed = time.perf_counter() - started
+            router.record_failure(model_name, kind, elapsed)
+            trace.attempt(model_name, kind, elapsed)
+            if parts:
+                raise LLMError(f"Stream interrupted: {e}")
+
+            last_error = _log_failure(model_name, kind, e, last_error)
+            continue
+
+        finally:
+            # Cancelled or interrupted: don't leave a half-open model
+            # marked as probed forever
+            router.release(model_name)
+            router.save()
+
+    raise _final_error(last_error)
+
+
+def _call_models(client: genai.Client, user_input: str, style: str,
+                 cache: Optional[ResponseCache],
+                 trace: RequestTrace,
+                 similar: Optional[SimilarIndex] = None) -> str:
+    prompt = build_prompt(user_input, style)
+
+    last_error = ""
+
+    # No sleeps between models: the router already keeps 429'd and
+    # deprecated models out of the order until their cooldown passes
+    for model_name in router.order():
+        router.begin(model_name)
+        started = time.perf_counter()
+        try:
+
+            response = client.models.generate_content(
+                model=model_name,
+                contents=prompt,
+                config=generation_config()
+            )
+
+            elapsed = time.perf_counter() - started
+            if response.text:
+                router.record_success(model_name, elapsed)
+                trace.attempt(model_name, OK, elapsed)
+                text = response.text.strip()
+                _remember(cache, similar, user_input, style, model_name,
+                          text)
+                return text
+
+            router.record_failure(model_name, FAILED, elapsed)
+            trace.attempt(model_name, FAILED, elapsed)
+
+        except Exception as e:
+            kind = classify_error(e)
+            elapsed = time.perf_counter() - started
+            router.record_failure(model_name, kind, elapsed)
+            trace.attempt(model_name, kind, elapsed)
+
+            last_error = _log_failure(model_name, kind, e, last_error)
+            continue
+
+        finally:
+            # Cancelled or interrupted: don't leave a half-open model
+            # marked as probed forever
+            router.release(model_name)
+            router.save()
+
+    raise _final_error(last_error)
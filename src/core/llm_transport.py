@@ -0,0 +1,642 @@
+"""
+Record/replay layer under genai.Client, for load tests without quota.
+
+    SDT_LLM_TRANSPORT=record:gemini.jsonl python main.py   # real traffic
+    SDT_LLM_TRANSPORT=replay:gemini.jsonl python -m src.server
+    python -m benchmarks.load gemini.jsonl -n 500 -c 8 --script "..."
+
+A cassette is JSONL, one model call per line: model, call type, prompt
+hash, outcome (text / chunk timings / API error) and latency. Prompts are
+stored only as a hash - cassettes can be shared without the user's text.
+
+FakeClient needs no cassette at all: fixed reply, synthetic latency and
+429/503/404 injection per model.
+"""
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from google.genai import errors
+
+TRANSPORT_ENV_VAR = "SDT_LLM_TRANSPORT"
+SCALE_ENV_VAR = "SDT_LLM_REPLAY_SCALE"
+SCRIPT_ENV_VAR = "SDT_LLM_REPLAY_SCRIPT"
+
+CASSETTE_VERSION = 1
+
+# Scripted failures have no recorded timing; a real 429 comes back fast
+DEFAULT_ERROR_LATENCY = 0.05
+
+_STATUS = {400: "INVALID_ARGUMENT", 404: "NOT_FOUND",
+           429: "RESOURCE_EXHAUSTED", 500: "INTERNAL", 503: "UNAVAILABLE",
+           504: "DEADLINE_EXCEEDED"}
+_ITEM_ID = re.compile(r"^Item (\d+):", re.MULTILINE)
+
+
+def prompt_hash(contents, config=None) -> str:
+    """Same request text + same reply format -> same hash."""
+    mime = getattr(config, "response_mime_type", None) or ""
+    system = getattr(config, "system_instruction", None) or ""
+    raw = f"{mime}\0{system}\0{contents}".encode('utf-8')
+    return hashlib.sha1(raw).hexdigest()[:16]
+
+
+def api_error(code: int, message: str = "",
+              status: Optional[str] = None) -> errors.APIError:
+    """The exception google-genai would raise for this HTTP code."""
+    body = {"error": {"code": code, "status": status or _STATUS.get(code, ""),
+                      "message": message or f"Replayed HTTP {code}"}}
+    if code >= 500:
+        return errors.ServerError(code, body)
+    return errors.ClientError(code, body)
+
+
+class ReplayResponse:
+    """What the app reads off a genai response: .text and usage."""
+
+    def __init__(self, text: str, usage: Optional[dict] = None):
+        self.text = text
+        self.usage = usage or {}
+
+
+# --- Recording ---
+def _usage(response) -> dict:
+    meta = getattr(response, "usage_metadata", None)
+    if meta is None:
+        return {}
+    return {"prompt": getattr(meta, "prompt_token_count", None) or 0,
+            "output": getattr(meta, "candidates_token_count", None) or 0}
+
+
+def _error_fields(e: Exception) -> dict:
+    code = getattr(e, "code", None)
+    return {"code": code if isinstance(code, int) else None,
+            "status": getattr(e, "status", None) or type(e).__name__,
+            "message": str(getattr(e, "message", None) or e)[:300]}
+
+
+class CassetteWriter:
+    """Appends interactions as they finish; safe from any thread."""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self.count = 0
+
+    def write(self, entry: dict) -> None:
+        entry = {"v": CASSETTE_VERSION,
+                 "at": round(time.time() - self._started, 3), **entry}
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+            self.count += 1
+
+
+class _RecordingModels:
+    def __init__(self, inner, cassette: CassetteWriter):
+        self._inner = inner
+        self._cassette = cassette
+
+    def _entry(self, call: str, model: str, contents, config) -> dict:
+        return {"call": call, "model": model,
+                "prompt": prompt_hash(contents, config),
+                "json": getattr(config, "response_mime_type", None)
+                == "application/json"}
+
+    def generate_content(self, model: str, contents, config=None):
+        entry = self._entry("generate", model, contents, config)
+        started = time.perf_counter()
+        try:
+            response = self._inner.generate_content(
+                model=model, contents=contents, config=config)
+        except Exception as e:
+            entry.update(latency=round(time.perf_counter() - started, 4),
+                         error=_error_fields(e))
+            self._cassette.write(entry)
+            raise
+        entry.update(latency=round(time.perf_counter() - started, 4),
+                     text=response.text or "", usage=_usage(response))
+        self._cassette.write(entry)
+        return response
+
+    def generate_content_stream(self, model: str, contents, config=None):
+        entry = self._entry("stream", model, contents, config)
+        started = time.perf_counter()
+        chunks = []
+        usage = {}
+        try:
+            for chunk in self._inner.generate_content_stream(
+                    model=model, contents=contents, config=config):
+                chunks.append([round(time.perf_counter() - started, 4),
+                               chunk.text or ""])
+                usage = _usage(chunk) or usage
+                yield chunk
+        except GeneratorExit:
+            return  # cancelled by the caller: not a complete interaction
+        except Exception as e:
+            entry.update(latency=round(time.perf_counter() - started, 4),
+                         chunks=chunks, error=_error_fields(e))
+            self._cassette.write(entry)
+            raise
+        entry.update(latency=round(time.perf_counter() - started, 4),
+                     chunks=chunks, usage=usage,
+                     text="".join(text for _, text in chunks))
+        self._cassette.write(entry)
+
+    def get(self, model: str):
+        return self._inner.get(model=model)
+
+    def __getattr__(self, name):
+        return getattr(self._inner, name)
+
+
+class _RecordingAsyncModels(_RecordingModels):
+    async def generate_content(self, model: str, contents, config=None):
+        entry = self._entry("async", model, contents, config)
+        started = time.perf_counter()
+        try:
+            response = await self._inner.generate_content(
+                model=model, contents=contents, config=config)
+        except Exception as e:
+            entry.update(latency=round(time.perf_counter() - started, 4),
+                         error=_error_fields(e))
+            self._cassette.write(entry)
+            raise
+        entry.update(latency=round(time.perf_counter() - started, 4),
+                     text=response.text or "", usage=_usage(response))
+        self._cassette.write(entry)
+        return response
+
+
+class _RecordingAio:
+    def __init__(self, inner, cassette: CassetteWriter):
+        self._inner = inner
+        self.models = _RecordingAsyncModels(inner.models, cassette)
+
+    def __getattr__(self, name):
+        return getattr(self._inner, name)
+
+
+class RecordingClient:
+    """Real client, every generate call also written to the cassette."""
+
+    def __init__(self, inner, cassette: CassetteWriter):
+        self._inner = inner
+        self.cassette = cassette
+        self.models = _RecordingModels(inner.models, cassette)
+        self.aio = _RecordingAio(inner.aio, cassette)
+
+    def __getattr__(self, name):
+        return getattr(self._inner, name)
+
+
+# --- Failure scripts ---
+class FailureScript:
+    """
+    Per-model outcome sequences, replayed in a loop:
+
+        gemini-2.5-flash=429x3,ok; gemini-2.0-flash=okx20,503x5; *=rec
+
+    ok - a recorded success, rec - whatever the cassette has next,
+    a number - that HTTP error (429, 503, 404...). Models without a line
+    use "*", and without "*" the cassette as recorded.
+    """
+
+    def __init__(self, steps: Dict[str, List[str]]):
+        self.steps = steps
+        self._cursors: Dict[str, Iterator[str]] = {
+            model: itertools.cycle(seq) for model, seq in steps.items()}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse(cls, text: str) -> "FailureScript":
+        steps: Dict[str, List[str]] = {}
+        for part in filter(None, (p.strip() for p in text.split(';'))):
+            model, sep, seq = part.partition('=')
+            if not sep or not model.strip():
+                raise ValueError(f"Bad script entry '{part}' "
+                                 f"(expected model=step,step,...)")
+            expanded = []
+            for step in filter(None, (s.strip().lower()
+                                      for s in seq.split(','))):
+                name, _, times = step.partition('x')
+                if name not in ("ok", "rec") and not name.isdigit():
+                    raise ValueError(f"Bad script step '{step}'")
+                expanded += [name] * (int(times) if times else 1)
+            if not expanded:
+                raise ValueError(f"Empty script for '{model.strip()}'")
+            steps[model.strip()] = expanded
+        return cls(steps)
+
+    def next(self, model: str) -> str:
+        cursor = self._cursors.get(model, self._cursors.get("*"))
+        if cursor is None:
+            return "rec"
+        with self._lock:
+            return next(cursor)
+
+
+# --- Replay ---
+class ReplayStats:
+    """Calls, outcomes and tokens per model, plus call times for RPM."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.calls: Dict[str, List[float]] = defaultdict(list)
+        self.outcomes: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: defaultdict(int))
+        self.tokens: Dict[str, int] = defaultdict(int)
+
+    def record(self, model: str, outcome: str, tokens: int) -> None:
+        with self._lock:
+            self.calls[model].append(time.perf_counter() - self.started)
+            self.outcomes[model][outcome] += 1
+            self.tokens[model] += tokens
+
+    def peak_per_window(self, model: str, window: float) -> int:
+        """Most calls to `model` inside any `window` seconds."""
+        times = self.calls.get(model, [])
+        best, lo = 0, 0
+        for hi, t in enumerate(times):
+            while t - times[lo] > window:
+                lo += 1
+            best = max(best, hi - lo + 1)
+        return best
+
+
+def load_cassette(path: Union[str, Path]) -> List[dict]:
+    entries = []
+    with open(path, encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                print(f"Warning: {path}:{line_no} is not JSON, skipped")
+                continue
+            if entry.get("v") == CASSETTE_VERSION and entry.get("model"):
+                entries.append(entry)
+    return entries
+
+
+def _rebatch(text: str, contents) -> str:
+    """Recorded JSON batch reply reshaped to the item ids asked for now."""
+    ids = [int(i) for i in _ITEM_ID.findall(str(contents))]
+    try:
+        items = [i for i in json.loads(text) if isinstance(i, dict)]
+    except (ValueError, TypeError):
+        items = []
+    tags = [i.get("tags", "") for i in items] or [""]
+    return json.dumps([{"id": item_id, "tags": tags[n % len(tags)]}
+                       for n, item_id in enumerate(ids)], ensure_ascii=False)
+
+
+class ReplayClient:
+    """
+    Serves a cassette instead of Gemini. A request with a recorded prompt
+    hash gets its own answers in recorded order; anything else gets the
+    model's recorded calls in a loop (so a short cassette can drive a long
+    load test, failures included). `scale` multiplies all latencies
+    (0 = instant), `script` overrides outcomes per model.
+    """
+
+    def __init__(self, entries: List[dict], scale: float = 1.0,
+                 script: Optional[FailureScript] = None):
+        if not entries:
+            raise ValueError("Cassette is empty")
+        self.scale = max(0.0, scale)
+        self.script = script
+        self.stats = ReplayStats()
+        self._lock = threading.Lock()
+        self._by_prompt: Dict[Tuple[str, str], deque] = defaultdict(deque)
+        self._by_model: Dict[str, List[dict]] = defaultdict(list)
+        self._ok: Dict[str, List[dict]] = defaultdict(list)
+        self._error_latency: Dict[int, float] = {}
+        for entry in entries:
+            self._by_prompt[(entry["model"], entry["prompt"])].append(entry)
+            self._by_model[entry["model"]].append(entry)
+            if "error" not in entry:
+                self._ok[entry["model"]].append(entry)
+                self._ok["*"].append(entry)
+            elif entry["error"].get("code"):
+                self._error_latency.setdefault(entry["error"]["code"],
+                                               entry.get("latency", 0.0))
+        if not self._ok["*"]:
+            raise ValueError("Cassette has no successful calls to replay")
+        self._model_pos: Dict[str, int] = defaultdict(int)
+        self._ok_pos: Dict[str, int] = defaultdict(int)
+        self.models = _ReplayModels(self)
+        self.aio = _ReplayAio(self)
+
+    @classmethod
+    def from_file(cls, path: Union[str, Path], scale: float = 1.0,
+                  script: Optional[FailureScript] = None) -> "ReplayClient":
+        return cls(load_cassette(path), scale, script)
+
+    def _cycle(self, pool: List[dict], positions: Dict[str, int],
+               key: str) -> dict:
+        with self._lock:
+            entry = pool[positions[key] % len(pool)]
+            positions[key] += 1
+            return entry
+
+    def _recorded(self, model: str, prompt: str) -> dict:
+        with self._lock:
+            exact = self._by_prompt.get((model, prompt))
+            if exact:
+                entry = exact.popleft()
+                exact.append(entry)  # repeats keep cycling
+                return entry
+        if self._by_model.get(model):
+            return self._cycle(self._by_model[model], self._model_pos, model)
+        # Model never recorded (the top one always answered): borrow
+        return self._cycle(self._ok["*"], self._ok_pos, "*")
+
+    def _success(self, model: str) -> dict:
+        pool_key = model if self._ok.get(model) else "*"
+        return self._cycle(self._ok[pool_key], self._ok_pos, pool_key)
+
+    def _pick(self, model: str, contents, config) -> dict:
+        """Recorded entry or {"error": {...}} for this call."""
+        step = self.script.next(model) if self.script else "rec"
+        if step.isdigit():
+            code = int(step)
+            entry = {"error": {"code": code},
+                     "latency": self._error_latency.get(
+                         code, DEFAULT_ERROR_LATENCY)}
+        elif step == "ok":
+            entry = self._success(model)
+        else:
+            entry = self._recorded(model, prompt_hash(contents, config))
+
+        error = entry.get("error")
+        if error:
+            outcome, tokens = str(error.get("code") or "error"), 0
+        else:
+            usage = entry.get("usage") or {}
+            outcome = "ok"
+            tokens = (usage.get("prompt", 0) + usage.get("output", 0)) or \
+                len(str(contents)) // 4 + len(entry.get("text", "")) // 4 + 1
+        self.stats.record(model, outcome, tokens)
+        return entry
+
+    def _raise(self, entry: dict) -> None:
+        error = entry["error"]
+        if error.get("code"):
+            raise api_error(error["code"], error.get("message", ""),
+                            error.get("status"))
+        raise RuntimeError(error.get("message") or "Replayed failure")
+
+    def _text(self, entry: dict, contents, config) -> str:
+        text = entry.get("text", "")
+        if getattr(config, "response_mime_type", None) == "application/json":
+            text = _rebatch(text, contents)
+        return text
+
+
+class _ReplayModels:
+    def __init__(self, client: ReplayClient):
+        self._client = client
+
+    def generate_content(self, model: str, contents, config=None):
+        client = self._client
+        entry = client._pick(model, contents, config)
+        time.sleep(entry.get("latency", 0.0) * client.scale)
+        if "error" in entry:
+            client._raise(entry)
+        return ReplayResponse(client._text(entry, contents, config),
+                              entry.get("usage"))
+
+    def generate_content_stream(self, model: str, contents,
+                                config=None) -> Iterator[ReplayResponse]:
+        client = self._client
+        entry = client._pick(model, contents, config)
+        chunks = entry.get("chunks")
+        if not chunks and "error" not in entry:
+            # Recorded without streaming: one chunk at the end
+            chunks = [[entry.get("latency", 0.0),
+                       client._text(entry, contents, config)]]
+        elapsed = 0.0
+        for offset, text in chunks or []:
+            time.sleep(max(0.0, offset - elapsed) * client.scale)
+            elapsed = offset
+            yield ReplayResponse(text)
+        if "error" in entry:
+            time.sleep(max(0.0, entry.get("latency", 0.0) - elapsed)
+                       * client.scale)
+            client._raise(entry)
+
+    def get(self, model: str):
+        return {"name": model}
+
+
+class _ReplayAsyncModels:
+    def __init__(self, client: ReplayClient):
+        self._client = client
+
+    async def generate_content(self, model: str, contents, config=None):
+        client = self._client
+        entry = client._pick(model, contents, config)
+        await asyncio.sleep(entry.get("latency", 0.0) * client.scale)
+        if "error" in entry:
+            client._raise(entry)
+        return ReplayResponse(client._text(entry, contents, config),
+                              entry.get("usage"))
+
+
+class _ReplayAio:
+    def __init__(self, client: ReplayClient):
+        self.models = _ReplayAsyncModels(client)
+
+
+# --- Synthetic client (no cassette): benchmarks, tests, server --fake-llm ---
+DEFAULT_REPLY = ("1girl, solo, orange hair, long hair, detailed eyes, "
+                 "casual clothes, standing, forest, trees, nature, sunlight, "
+                 "dappled lighting, depth of field, soft focus")
+
+
+@dataclass
+class ModelBehavior:
+    latency: float = 0.05  # seconds until the full answer
+    jitter: float = 0.0  # +- uniform jitter on latency
+    rate_limit: float = 0.0  # probability of a 429
+    overload: float = 0.0  # probability of a 503
+    missing: bool = False  # 404, like a retired model
+    # Failures are reported after this long (a 429 is usually fast)
+    error_latency: float = 0.01
+    # Packed (JSON) requests: probability that an item is left out
+    batch_drop: float = 0.0
+
+
+@dataclass
+class FakeResponse:
+    text: str
+
+
+@dataclass
+class FakeStats:
+    calls: Dict[str, int] = field(default_factory=dict)
+    errors: Dict[str, int] = field(default_factory=dict)
+
+
+class _FakeModels:
+    def __init__(self, client: "FakeClient"):
+        self._client = client
+
+    def generate_content(self, model: str, contents, config=None):
+        delay, failure = self._client._roll(model)
+        time.sleep(delay)
+        if failure is not None:
+            raise failure
+        return FakeResponse(self._client._answer(model, contents, config))
+
+    def generate_content_stream(self, model: str, contents,
+                                config=None) -> Iterator[FakeResponse]:
+        delay, failure = self._client._roll(model)
+        if failure is not None:
+            time.sleep(delay)
+            raise failure
+        words = self._client.reply.split(" ")
+        step = max(1, len(words) // self._client.chunks)
+        pieces = [" ".join(words[i:i + step]) + " "
+                  for i in range(0, len(words), step)]
+        for piece in pieces:
+            time.sleep(delay / len(pieces))
+            yield FakeResponse(piece)
+
+    def get(self, model: str):
+        return {"name": model}
+
+
+class _FakeAsyncModels:
+    def __init__(self, client: "FakeClient"):
+        self._client = client
+
+    async def generate_content(self, model: str, contents, config=None):
+        delay, failure = self._client._roll(model)
+        await asyncio.sleep(delay)
+        if failure is not None:
+            raise failure
+        return FakeResponse(self._client._answer(model, contents, config))
+
+
+class _FakeAio:
+    def __init__(self, client: "FakeClient"):
+        self.models = _FakeAsyncModels(client)
+
+
+class FakeClient:
+    """
+    behaviors: model name -> ModelBehavior, unknown models use `default`.
+    seed makes the failure pattern reproducible between benchmark runs.
+    """
+
+    def __init__(self, behaviors: Optional[Dict[str, ModelBehavior]] = None,
+                 default: Optional[ModelBehavior] = None,
+                 reply: str = DEFAULT_REPLY, chunks: int = 4,
+                 seed: int = 0):
+        self.behaviors = behaviors or {}
+        self.default = default or ModelBehavior()
+        self.reply = reply
+        self.chunks = chunks
+        self.stats = FakeStats()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.models = _FakeModels(self)
+        self.aio = _FakeAio(self)
+
+    def _answer(self, model: str, contents, config) -> str:
+        """Plain tags, or the JSON list a packed request asks for."""
+        if getattr(config, "response_mime_type", None) != "application/json":
+            return self.reply
+        behavior = self.behaviors.get(model, self.default)
+        ids = [int(i) for i in _ITEM_ID.findall(str(contents))]
+        with self._lock:
+            kept = [i for i in ids if self._rng.random() >= behavior.batch_drop]
+        return json.dumps([{"id": i, "tags": self.reply} for i in kept])
+
+    def _roll(self, model: str):
+        """(delay, exception or None) for one call."""
+        behavior = self.behaviors.get(model, self.default)
+        with self._lock:
+            self.stats.calls[model] = self.stats.calls.get(model, 0) + 1
+            roll = self._rng.random()
+            jitter = self._rng.uniform(-behavior.jitter, behavior.jitter)
+
+        failure = None
+        if behavior.missing:
+            failure = api_error(404, f"models/{model} is not found")
+        elif roll < behavior.rate_limit:
+            failure = api_error(429, "Quota exceeded")
+        elif roll < behavior.rate_limit + behavior.overload:
+            failure = api_error(503, "The model is overloaded")
+
+        if failure is not None:
+            with self._lock:
+                self.stats.errors[model] = self.stats.errors.get(model, 0) + 1
+            return behavior.error_latency, failure
+        return max(0.0, behavior.latency + jitter), None
+
+
+# --- Transports (plugged into llm_client.create_client) ---
+class Transport:
+    """Decides what create_client() hands out instead of a plain client."""
+
+    def client(self, make_real: Callable[[], object]):
+        return make_real()
+
+
+class RecordTransport(Transport):
+    def __init__(self, path: Union[str, Path]):
+        self.cassette = CassetteWriter(path)
+
+    def client(self, make_real):
+        return RecordingClient(make_real(), self.cassette)
+
+
+class ReplayTransport(Transport):
+    """One ReplayClient for every key: shared stats and cursors."""
+
+    def __init__(self, replay: ReplayClient):
+        self.replay = replay
+
+    def client(self, make_real):
+        return self.replay
+
+
+def transport_from_env() -> Optional[Transport]:
+    """$SDT_LLM_TRANSPORT = record:<cassette> | replay:<cassette>."""
+    spec = os.getenv(TRANSPORT_ENV_VAR, "").strip()
+    if not spec:
+        return None
+    mode, _, path = spec.partition(':')
+    mode = mode.strip().lower()
+    if not path:
+        print(f"Warning: {TRANSPORT_ENV_VAR} needs a cassette path, ignored")
+        return None
+    if mode == "record":
+        print(f"Recording Gemini calls to {path}")
+        return RecordTransport(path)
+    if mode == "replay":
+        scale = float(os.getenv(SCALE_ENV_VAR, "") or 1.0)
+        script_text = os.getenv(SCRIPT_ENV_VAR, "")
+        script = FailureScript.parse(script_text) if script_text else None
+        print(f"Replaying Gemini calls from {path} (latency x{scale})")
+        return ReplayTransport(ReplayClient.from_file(path, scale, script))
+    print(f"Warning: unknown {TRANSPORT_ENV_VAR} mode '{mode}', ignored")
+    return None
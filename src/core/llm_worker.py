@@ -1,96 +1,233 @@
-import time
+import itertools
+import queue
+import threading
+from typing import Dict, Optional, Set
 
 from PyQt6.QtCore import QThread, pyqtSignal
-from google import genai
-from google.api_core import exceptions as google_exceptions
 
-MODEL_PRIORITIES = [
-    "gemini-2.5-flash",
-    "gemini-2.0-flash",
-    "gemini-2.0-flash-lite",
-    "gemini-3-flash-preview"
-]
+from src.core.llm_client import (MODEL_PRIORITIES, LLMError, generate_tags,
+                                 get_client, stream_tags, warm_up)
+from src.core.metrics import CANCELLED, ERROR, RequestTrace, metrics
+from src.core.phrase_expander import PhraseExpander
+from src.core.response_cache import ResponseCache
+from src.core.similar_cache import SimilarIndex
+from src.core.tag_vocab import TagVocab
 
+__all__ = ["GeminiWorker", "MODEL_PRIORITIES"]
 
-class GeminiWorker(QThread):
-    finished = pyqtSignal(str)
-    error = pyqtSignal(str)
+_STOP = object()
 
-    def __init__(self, api_key: str, user_input: str, style: str):
-        super().__init__()
+
+class _Job:
+    __slots__ = ("job_id", "api_key", "user_input", "style", "use_cache",
+                 "stream", "use_similar", "refresh")
+
+    def __init__(self, job_id: int, api_key: str, user_input: str = "",
+                 style: str = "", use_cache: bool = True,
+                 stream: bool = False, use_similar: bool = True,
+                 refresh: bool = False):
+        self.job_id = job_id
         self.api_key = api_key
         self.user_input = user_input
         self.style = style
+        self.use_cache = use_cache
+        self.stream = stream
+        self.use_similar = use_similar
+        # Background re-ask after a near-duplicate answer: result not emitted
+        self.refresh = refresh
 
-    def run(self):
-        if not self.api_key:
-            self.error.emit("API Key is missing.")
-            return
 
-        client = None
+class GeminiWorker(QThread):
+    """
+    One long-lived thread for the whole session. Jobs go through a queue,
+    the genai.Client (and its keep-alive connection pool) is reused between
+    them. Results of cancelled jobs are dropped. Streaming jobs emit
+    job_chunk as text arrives, then job_finished with the full text.
+    Every job is traced; for finished jobs the receiver takes the trace
+    with pop_trace() and finishes it (after engine.process).
+    A near-duplicate answer (SimilarIndex) is emitted at once; with
+    refresh_similar the request is then re-asked in the background so the
+    caches get the exact answer.
+    When every model fails and an expander is set, the job ends with
+    job_draft (tags from the local phrase table + the error) instead of
+    job_failed.
+    With a tag vocabulary, model output is checked before job_finished:
+    aliases become canonical tags, and with autocorrect one-letter typos
+    too.
+    """
+    job_chunk = pyqtSignal(int, str)
+    job_finished = pyqtSignal(int, str)
+    job_failed = pyqtSignal(int, str)
+    job_draft = pyqtSignal(int, str, str)
+
+    WARM_UP = 0  # job id reserved for the background warm-up
+
+    def __init__(self, cache: Optional[ResponseCache] = None,
+                 similar: Optional[SimilarIndex] = None,
+                 refresh_similar: bool = True,
+                 expander: Optional[PhraseExpander] = None,
+                 vocab: Optional[TagVocab] = None,
+                 trace_kind: str = "interactive",
+                 autocorrect: bool = False):
+        super().__init__()
+        self.cache = cache
+        self.similar = similar
+        self.refresh_similar = refresh_similar
+        self.expander = expander
+        self.vocab = vocab
+        self.autocorrect = autocorrect
+        self.trace_kind = trace_kind
+        self._jobs: "queue.Queue" = queue.Queue()
+        self._ids = itertools.count(1)
+        self._cancelled: Set[int] = set()
+        self._traces: Dict[int, RequestTrace] = {}
+        self._lock = threading.Lock()
+
+    # --- Called from the UI thread ---
+    def submit(self, api_key: str, user_input: str, style: str,
+               use_cache: bool = True, stream: bool = False,
+               use_similar: bool = True) -> int:
+        job_id = next(self._ids)
+        self._jobs.put(_Job(job_id, api_key, user_input, style, use_cache,
+                            stream, use_similar))
+        return job_id
+
+    def cancel(self, job_id: int) -> None:
+        with self._lock:
+            self._cancelled.add(job_id)
+
+    def pop_trace(self, job_id: int) -> Optional[RequestTrace]:
+        with self._lock:
+            return self._traces.pop(job_id, None)
+
+    def warm_up(self, api_key: str) -> None:
+        if api_key:
+            self._jobs.put(_Job(self.WARM_UP, api_key))
+
+    def stop(self) -> None:
+        self._jobs.put(_STOP)
+        self.wait()
+
+    # --- Worker thread ---
+    def _is_cancelled(self, job_id: int, consume: bool = True) -> bool:
+        with self._lock:
+            if job_id in self._cancelled:
+                if consume:
+                    self._cancelled.discard(job_id)
+                return True
+            return False
+
+    def _schedule_refresh(self, job: _Job, score: float) -> None:
+        if self.refresh_similar:
+            print(f"Near-duplicate answer (similarity {score:.2f}), "
+                  f"refreshing in background")
+            self._jobs.put(_Job(next(self._ids), job.api_key, job.user_input,
+                                job.style, use_cache=False, refresh=True))
+
+    def _generate(self, job: _Job, trace: RequestTrace) -> str:
+        with trace.span("client"):
+            client = get_client(job.api_key)
+        similar = self.similar if job.use_similar else None
+        on_near_hit = lambda score: self._schedule_refresh(job, score)
+        if not job.stream:
+            return generate_tags(client, job.user_input, job.style,
+                                 cache=self.cache, use_cache=job.use_cache,
+                                 trace=trace, similar=similar,
+                                 on_near_hit=on_near_hit)
+        return stream_tags(
+            client, job.user_input, job.style,
+            on_chunk=lambda text: self.job_chunk.emit(job.job_id, text),
+            cache=self.cache, use_cache=job.use_cache,
+            is_cancelled=lambda: self._is_cancelled(job.job_id,
+                                                    consume=False),
+            trace=trace, similar=similar, on_near_hit=on_near_hit)
+
+    def _check_vocab(self, tags: str, trace: RequestTrace) -> str:
+        with trace.span("vocab"):
+            try:
+                fixed, changes, unknown = self.vocab.fix_tags(
+                    tags, autocorrect=self.autocorrect)
+            except Exception as e:
+                # The answer is still good without the check
+                print(f"Vocab check skipped: {type(e).__name__}: {e}")
+                return tags
+        if changes:
+            print("Vocab: " + ", ".join(f"{old} -> {new}"
+                                        for old, new in changes))
+        if unknown:
+            print(f"Vocab: unknown tags kept: {', '.join(unknown)}")
+        return fixed
+
+    def _emit_draft(self, job: _Job, trace: RequestTrace,
+                    error: str) -> bool:
+        if self.expander is None:
+            return False
+        with trace.span("phrase_table"):
+            tags = self.expander.expand(job.user_input)
+        if not tags:
+            return False
+        print(f"LLM unavailable, offline draft from phrase table: {error}")
+        with self._lock:
+            self._traces[job.job_id] = trace
+        self.job_draft.emit(job.job_id, tags, error)
+        return True
+
+    def _refresh(self, job: _Job) -> None:
+        trace = metrics.trace("refresh")
         try:
-            client = genai.Client(api_key=self.api_key)
+            self._generate(job, trace)
+            trace.finish()
         except Exception as e:
-            self.error.emit(f"Init Error: {str(e)}")
-            return
-
-        sys_instr = (
-            "Role: Expert Stable Diffusion Prompt Engineer (Danbooru/e621 format).\n"
-            "Task: Translate and expand user input into a detailed, comma-separated list of English tags.\n"
-            "Rules:\n"
-            "1. TRANSLATE everything to English.\n"
-            "2. OUTPUT FORMAT: tag1, tag2, tag3. NO markdown, NO explanations, NO dictionaries.\n"
-            "3. STRUCTURE: Subject -> Appearance/Clothing -> Pose/Action -> Environment -> Lighting/Camera.\n"
-            "4. IMPORTANT: DO NOT add quality score tags (e.g. 'masterpiece', 'best quality', 'score_9') - system adds them automatically.\n"
-            "5. CREATIVITY: If input is simple, logically fill in missing visual details (texture, background, mood).\n"
-            "\n"
-            "Example Input: 'рыжая девушка в лесу'\n"
-            "Example Output: 1girl, solo, orange hair, long hair, detailed eyes, casual clothes, standing, forest, trees, nature, sunlight, dappled lighting, depth of field, soft focus"
-        )
-
-        prompt = f"Style Context: {self.style}. \nUser Request: {self.user_input}"
-
-        last_error = ""
-
-        for model_name in MODEL_PRIORITIES:
-            try:
+            trace.finish(ERROR)
+            print(f"Background refresh failed: {e}")
 
-                response = client.models.generate_content(
-                    model=model_name,
-                    contents=prompt,
-                    config=genai.types.GenerateContentConfig(
-                        system_instruction=sys_instr,
-                        temperature=0.4
-                    )
-                )
-
-                if response.text:
-                    self.finished.emit(response.text.strip())
-                    return
-
-            except google_exceptions.ResourceExhausted:
-                print(f"Model {model_name} hit Rate Limit (429). Switching...")
-                last_error = "Rate Limit Exceeded. Please wait a bit."
-                time.sleep(2)
+    def run(self):
+        while True:
+            job = self._jobs.get()
+            if job is _STOP:
+                return
+
+            if job.job_id == self.WARM_UP:
+                try:
+                    warm_up(get_client(job.api_key))
+                except Exception as e:
+                    print(f"Warm-up skipped: {e}")
                 continue
 
-            except google_exceptions.ServiceUnavailable:
-                print(f"Model {model_name} is Overloaded (503). Switching...")
-                last_error = "Google Servers are overloaded."
-                time.sleep(1)
+            if job.refresh:
+                self._refresh(job)
                 continue
 
-            except google_exceptions.NotFound:
-                print(
-                    f"Model {model_name} not found (deprecated?). Switching...")
+            if self._is_cancelled(job.job_id):
                 continue
 
+            trace = metrics.trace(self.trace_kind)
+            try:
+                tags = self._generate(job, trace)
+            except LLMError as e:
+                if self._is_cancelled(job.job_id):
+                    trace.finish(CANCELLED)
+                elif not self._emit_draft(job, trace, str(e)):
+                    trace.finish(ERROR)
+                    self.job_failed.emit(job.job_id, str(e))
+                continue
             except Exception as e:
-                print(f"Model {model_name} failed: {e}")
-                last_error = str(e)
+                # Not an API failure (SDK or our bug): fail this job only,
+                # the thread keeps serving the queue
+                print(f"Worker error: {type(e).__name__}: {e}")
+                if self._is_cancelled(job.job_id):
+                    trace.finish(CANCELLED)
+                else:
+                    trace.finish(ERROR)
+                    self.job_failed.emit(job.job_id,
+                                         f"{type(e).__name__}: {e}")
                 continue
 
-        if "Rate Limit" in last_error:
-            self.error.emit("Quota Exceeded (429). Google asks to wait ~30s.")
-        else:
-            self.error.emit(f"All AI models failed. Last error: {last_error}")
+            if self._is_cancelled(job.job_id):
+                trace.finish(CANCELLED)
+                continue
+            if self.vocab is not None:
+                tags = self._check_vocab(tags, trace)
+            with self._lock:
+                self._traces[job.job_id] = trace
+            self.job_finished.emit(job.job_id, tags)
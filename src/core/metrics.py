@@ -0,0 +1,233 @@
+import json
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Tuple
+
+OK = "ok"
+CANCELLED = "cancelled"
+ERROR = "error"
+DRAFT = "draft"  # models failed, answered from the local phrase table
+
+WINDOW = 500  # rolling samples per series for p50/p95
+# Prometheus histogram buckets, seconds
+BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    Nearest-rank percentile: the smallest sample with at least q of all
+    samples at or below it (q in 0..1). Always an observed value, never
+    interpolated; 0.0 for no samples.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    # The epsilon keeps 0.07 * 100 = 7.000000000000001 at rank 7
+    rank = math.ceil(q * len(ordered) - 1e-9)
+    return ordered[min(len(ordered), max(rank, 1)) - 1]
+
+
+class Histogram:
+    """Cumulative buckets for Prometheus + a rolling window for percentiles."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # last one is +Inf
+        self.total = 0.0
+        self.count = 0
+        self.recent: Deque[float] = deque(maxlen=WINDOW)
+
+    def observe(self, seconds: float) -> None:
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += seconds
+        self.count += 1
+        self.recent.append(seconds)
+
+    def percentile(self, q: float) -> float:
+        return percentile(list(self.recent), q)
+
+    def to_dict(self) -> dict:
+        return {"count": self.count, "sum": self.total,
+                "p50": self.percentile(0.5), "p95": self.percentile(0.95)}
+
+
+class RequestTrace:
+    """
+    Timeline of one conversion: client init, cache lookup, every model
+    attempt with its outcome (ok / rate_limited / overloaded / ...) and
+    engine.process. finish() hands it to the metrics registry.
+    """
+
+    def __init__(self, registry: "Metrics", kind: str = "interactive",
+                 log: bool = True):
+        self.registry = registry
+        self.kind = kind
+        self.log = log
+        self.started = time.perf_counter()
+        # (name, offset from start, seconds, outcome)
+        self.spans: List[Tuple[str, float, float, str]] = []
+        self.outcome: Optional[str] = None
+        self.total: Optional[float] = None
+
+    def add_span(self, name: str, seconds: float, outcome: str = OK,
+                 offset: Optional[float] = None) -> None:
+        if offset is None:
+            offset = time.perf_counter() - self.started - seconds
+        self.spans.append((name, offset, seconds, outcome))
+
+    @contextmanager
+    def span(self, name: str):
+        start = time.perf_counter()
+        outcome = ERROR
+        try:
+            yield
+            outcome = OK
+        finally:
+            self.add_span(name, time.perf_counter() - start, outcome,
+                          start - self.started)
+
+    def attempt(self, model: str, outcome: str, seconds: float) -> None:
+        self.add_span(f"model:{model}", seconds, outcome)
+        self.registry.observe_attempt(model, outcome, seconds)
+
+    def finish(self, outcome: str = OK) -> float:
+        if self.total is None:
+            self.total = time.perf_counter() - self.started
+            self.outcome = outcome
+            self.registry.observe_request(self)
+            if self.log:
+                print(f"Trace: {self.summary()}")
+        return self.total
+
+    def summary(self) -> str:
+        parts = [f"{name} {outcome} {seconds:.2f}s"
+                 for name, _, seconds, outcome in self.spans]
+        total = self.total if self.total is not None else \
+            time.perf_counter() - self.started
+        return f"{total:.2f}s {self.outcome or '...'}: " + " | ".join(parts)
+
+    def to_dict(self) -> dict:
+        return {
+            "kind": self.kind,
+            "outcome": self.outcome,
+            "seconds": self.total,
+            "spans": [{"name": n, "offset": o, "seconds": s, "outcome": out}
+                      for n, o, s, out in self.spans],
+        }
+
+
+class Metrics:
+    """
+    Process-wide counters and latency histograms: per model attempt and per
+    whole request. Exported as JSON or Prometheus text (by file suffix).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.attempts: Dict[Tuple[str, str], int] = {}  # (model, outcome)
+        self.model_latency: Dict[str, Histogram] = {}
+        self.requests: Dict[Tuple[str, str], int] = {}  # (kind, outcome)
+        self.request_latency: Dict[str, Histogram] = {}
+        self.recent_traces: Deque[RequestTrace] = deque(maxlen=50)
+        self.last: Dict[str, RequestTrace] = {}  # kind -> latest
+
+    def trace(self, kind: str = "interactive",
+              log: bool = True) -> RequestTrace:
+        return RequestTrace(self, kind, log)
+
+    def observe_attempt(self, model: str, outcome: str,
+                        seconds: float) -> None:
+        with self._lock:
+            key = (model, outcome)
+            self.attempts[key] = self.attempts.get(key, 0) + 1
+            self.model_latency.setdefault(model, Histogram()).observe(seconds)
+
+    def observe_request(self, trace: RequestTrace) -> None:
+        with self._lock:
+            key = (trace.kind, trace.outcome)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            if trace.outcome != CANCELLED:
+                self.request_latency.setdefault(
+                    trace.kind, Histogram()).observe(trace.total)
+            self.recent_traces.append(trace)
+            self.last[trace.kind] = trace
+
+    def latency(self, kind: str = "interactive") -> Tuple[Optional[float],
+                                                          float]:
+        """(last request seconds, rolling p95) for the status readout."""
+        with self._lock:
+            hist = self.request_latency.get(kind)
+            last = self.last.get(kind)
+            return (last.total if last is not None else None,
+                    hist.percentile(0.95) if hist else 0.0)
+
+    # --- Export ---
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "models": {
+                    model: dict(hist.to_dict(), outcomes={
+                        out: n for (m, out), n in self.attempts.items()
+                        if m == model})
+                    for model, hist in self.model_latency.items()},
+                "requests": {
+                    kind: dict(hist.to_dict(), outcomes={
+                        out: n for (k, out), n in self.requests.items()
+                        if k == kind})
+                    for kind, hist in self.request_latency.items()},
+                "recent": [t.to_dict() for t in self.recent_traces],
+            }
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            lines.append("# TYPE sdt_model_attempts_total counter")
+            for (model, outcome), n in sorted(self.attempts.items()):
+                lines.append(f'sdt_model_attempts_total{{model="{model}",'
+                             f'outcome="{outcome}"}} {n}')
+            lines.append("# TYPE sdt_requests_total counter")
+            for (kind, outcome), n in sorted(self.requests.items()):
+                lines.append(f'sdt_requests_total{{kind="{kind}",'
+                             f'outcome="{outcome}"}} {n}')
+            lines += _prom_histogram("sdt_model_latency_seconds", "model",
+                                     self.model_latency)
+            lines += _prom_histogram("sdt_request_latency_seconds", "kind",
+                                     self.request_latency)
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path) -> None:
+        """*.prom / *.txt -> Prometheus text format, anything else -> JSON."""
+        path = Path(path)
+        if path.suffix in (".prom", ".txt"):
+            text = self.to_prometheus()
+        else:
+            text = json.dumps(self.to_dict(), indent=2)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_text(text, encoding='utf-8')
+        tmp.replace(path)
+
+
+def _prom_histogram(name: str, label: str,
+                    series: Dict[str, Histogram]) -> List[str]:
+    lines = [f"# TYPE {name} histogram"]
+    for value, hist in sorted(series.items()):
+        cumulative = 0
+        for bound, n in zip(BUCKETS + ("+Inf",), hist.counts):
+            cumulative += n
+            lines.append(f'{name}_bucket{{{label}="{value}",le="{bound}"}} '
+                         f'{cumulative}')
+        lines.append(f'{name}_sum{{{label}="{value}"}} {hist.total}')
+        lines.append(f'{name}_count{{{label}="{value}"}} {hist.count}')
+    return lines
+
+
+# Singleton
+metrics = Metrics()
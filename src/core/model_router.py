@@ -0,0 +1,270 @@
+import contextlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from src.core.metrics import percentile
+
+# --- Error kinds (see llm_client.classify_error) ---
+RATE_LIMITED = "rate_limited"
+OVERLOADED = "overloaded"
+NOT_FOUND = "not_found"
+FAILED = "failed"
+
+# --- Circuit states ---
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+WINDOW = 50  # samples per model for latency / error rate
+PRIOR_LATENCY = 2.0  # seconds, before we have real samples
+PRIOR_SUCCESS = 0.9
+
+ERROR_RATE_TRIP = 0.5  # open the circuit above this error rate...
+MIN_SAMPLES_TO_TRIP = 4  # ...once we have this many samples
+CONSECUTIVE_TRIP = 3
+
+RATE_LIMIT_COOLDOWN = 30.0  # Google asks ~30s after a 429
+FAILURE_COOLDOWN = 15.0
+MAX_COOLDOWN = 600.0
+NOT_FOUND_COOLDOWN = 24 * 3600.0  # deprecated model - retry once a day
+
+SAVE_INTERVAL = 5.0  # seconds between state file writes
+
+
+class ModelHealth:
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies = deque(maxlen=WINDOW)
+        self.outcomes = deque(maxlen=WINDOW)  # True = success
+        self.consecutive_failures = 0
+        self.last_429 = 0.0
+        self.state = CLOSED
+        self.open_until = 0.0
+        self.cooldown = FAILURE_COOLDOWN
+        self.probe_in_flight = False
+
+    @property
+    def p50(self) -> float:
+        return percentile(list(self.latencies), 0.5)
+
+    @property
+    def p95(self) -> float:
+        return percentile(list(self.latencies), 0.95)
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return 1.0 - sum(self.outcomes) / len(self.outcomes)
+
+    def expected_time(self) -> float:
+        """Expected seconds to a successful answer if we start here."""
+        latency = self.p50 if self.latencies else PRIOR_LATENCY
+        if len(self.outcomes) >= MIN_SAMPLES_TO_TRIP:
+            success = max(0.05, 1.0 - self.error_rate)
+        else:
+            success = PRIOR_SUCCESS
+        return latency / success
+
+    def to_dict(self) -> dict:
+        return {
+            "latencies": list(self.latencies),
+            "outcomes": list(self.outcomes),
+            "consecutive_failures": self.consecutive_failures,
+            "last_429": self.last_429,
+            "state": self.state,
+            "open_until": self.open_until,
+            "cooldown": self.cooldown,
+        }
+
+    def load_dict(self, data: dict) -> None:
+        self.latencies.extend(float(x) for x in data.get("latencies", []))
+        self.outcomes.extend(bool(x) for x in data.get("outcomes", []))
+        self.consecutive_failures = int(data.get("consecutive_failures", 0))
+        self.last_429 = float(data.get("last_429", 0.0))
+        self.state = data.get("state", CLOSED)
+        if self.state == HALF_OPEN:
+            self.state = OPEN  # the probe died with the previous process
+        self.open_until = float(data.get("open_until", 0.0))
+        self.cooldown = float(data.get("cooldown", FAILURE_COOLDOWN))
+
+
+class ModelRouter:
+    """
+    Health-aware replacement for walking MODEL_PRIORITIES top-down.
+    Tracks rolling p50/p95 latency, error rate and the last 429 per model,
+    trips a circuit breaker on unhealthy models (one half-open probe after
+    the cooldown) and orders candidates by expected time-to-success.
+    State is persisted as JSON so a restart remembers deprecated models:
+    save() writes only after a circuit changed state, at most every
+    SAVE_INTERVAL seconds; save(force=True) on shutdown writes the rest.
+    """
+
+    def __init__(self, models: List[str]):
+        self.models = list(models)
+        self.health: Dict[str, ModelHealth] = {
+            m: ModelHealth(m) for m in self.models}
+        self.state_path: Optional[Path] = None
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # one writer at a time
+        self._dirty = False  # a state change not on disk yet
+        self._saved_at = float("-inf")
+
+    # --- Routing ---
+    def order(self) -> List[str]:
+        """Models to try, best first. Never empty."""
+        now = time.time()
+        with self._lock:
+            candidates = []
+            for rank, model in enumerate(self.models):
+                h = self.health[model]
+                if h.state == OPEN and now >= h.open_until:
+                    h.state = HALF_OPEN
+                    h.probe_in_flight = False
+                if h.state == OPEN:
+                    continue
+                if h.state == HALF_OPEN and h.probe_in_flight:
+                    continue
+                # Priority rank breaks ties between unknown models
+                candidates.append((h.expected_time(), rank, model))
+
+            if not candidates:
+                # Everything is open: try whoever recovers first
+                soonest = min(self.models,
+                              key=lambda m: self.health[m].open_until)
+                return [soonest]
+
+            candidates.sort()
+            return [model for _, _, model in candidates]
+
+    def begin(self, model: str) -> None:
+        """Marks a half-open model as probed so parallel callers skip it."""
+        with self._lock:
+            h = self.health[model]
+            if h.state == HALF_OPEN:
+                h.probe_in_flight = True
+
+    def release(self, model: str) -> None:
+        """
+        The call ended with no verdict (cancelled): the probe slot is free
+        again. No-op after record_success / record_failure.
+        """
+        with self._lock:
+            self.health[model].probe_in_flight = False
+
+    # --- Feedback ---
+    def record_success(self, model: str, latency: float) -> None:
+        with self._lock:
+            h = self.health[model]
+            h.latencies.append(latency)
+            h.outcomes.append(True)
+            h.consecutive_failures = 0
+            if h.state != CLOSED:
+                h.state = CLOSED
+                self._dirty = True
+            h.probe_in_flight = False
+            h.cooldown = FAILURE_COOLDOWN
+
+    def record_failure(self, model: str, kind: str,
+                       latency: float = 0.0) -> None:
+        now = time.time()
+        with self._lock:
+            h = self.health[model]
+            h.outcomes.append(False)
+            h.consecutive_failures += 1
+            h.probe_in_flight = False
+
+            if kind == NOT_FOUND:
+                self._trip(h, now, NOT_FOUND_COOLDOWN)
+                return
+            if kind == RATE_LIMITED:
+                h.last_429 = now
+                self._trip(h, now, RATE_LIMIT_COOLDOWN)
+                return
+
+            if latency:
+                h.latencies.append(latency)
+            if h.state == HALF_OPEN:
+                # Probe failed - back off harder
+                self._trip(h, now, max(h.cooldown,
+                                       min(MAX_COOLDOWN, h.cooldown * 2)))
+            elif h.consecutive_failures >= CONSECUTIVE_TRIP or (
+                    len(h.outcomes) >= MIN_SAMPLES_TO_TRIP
+                    and h.error_rate >= ERROR_RATE_TRIP):
+                self._trip(h, now, h.cooldown)
+
+    def _trip(self, h: ModelHealth, now: float, cooldown: float) -> None:
+        h.state = OPEN
+        h.cooldown = cooldown
+        h.open_until = now + cooldown
+        self._dirty = True
+
+    def last_rate_limit(self) -> float:
+        """time.time() of the latest 429 on any model (0 = never)."""
+        with self._lock:
+            return max((h.last_429 for h in self.health.values()),
+                       default=0.0)
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            return {m: {
+                "state": h.state,
+                "p50": h.p50,
+                "p95": h.p95,
+                "error_rate": h.error_rate,
+                "last_429": h.last_429,
+                "open_until": h.open_until,
+            } for m, h in self.health.items()}
+
+    # --- Persistence ---
+    def load(self, path: Union[str, Path]) -> None:
+        self.state_path = Path(path)
+        if not self.state_path.exists():
+            return
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                data = json.load(f).get("models", {})
+        except (OSError, ValueError) as e:
+            print(f"Warning: Router state ignored: {e}")
+            return
+        with self._lock:
+            for model, raw in data.items():
+                if model in self.health:
+                    self.health[model].load_dict(raw)
+
+    def save(self, force: bool = False) -> None:
+        if self.state_path is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not force and (not self._dirty or
+                              now - self._saved_at < SAVE_INTERVAL):
+                return
+            data = {"models": {m: h.to_dict()
+                               for m, h in self.health.items()}}
+            self._dirty = False
+            self._saved_at = now
+        with self._save_lock:
+            tmp = None
+            try:
+                # Unique temp name: the CLI and the GUI may share the file
+                with tempfile.NamedTemporaryFile(
+                        'w', encoding='utf-8', dir=self.state_path.parent,
+                        prefix=self.state_path.name, suffix='.tmp',
+                        delete=False) as f:
+                    tmp = f.name
+                    json.dump(data, f)
+                os.replace(tmp, self.state_path)
+            except OSError as e:
+                print(f"Warning: Could not save router state: {e}")
+                with self._lock:
+                    self._dirty = True
+                if tmp is not None:
+                    with contextlib.suppress(OSError):
+                        os.unlink(tmp)
@@ -0,0 +1,186 @@
+import json
+import os
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+PHRASE_TABLE = 'phrase_table.json'
+
+# (start, end, phrase index); end is exclusive
+Match = Tuple[int, int, int]
+
+
+def _normalize(text: str) -> str:
+    # Must keep the length of the input: match offsets stay valid
+    lowered = text.lower()
+    if len(lowered) != len(text):  # e.g. "İ" lowercases to two chars
+        lowered = "".join(c if len(c.lower()) != 1 else c.lower()
+                          for c in text)
+    return lowered.replace('ё', 'е')
+
+
+def _is_word(ch: str) -> bool:
+    return ch.isalnum() or ch == '_'
+
+
+class PhraseTable:
+    """
+    Aho-Corasick automaton over the phrase table: one pass over the input,
+    no matter how many phrases. "рыж*" matches any word starting with "рыж"
+    (Russian endings), other phrases match whole words only.
+    """
+
+    def __init__(self, phrases: Dict[str, str]):
+        self.phrases: List[str] = []
+        self.tags: List[Tuple[str, ...]] = []
+        self.stems: List[bool] = []
+
+        # Trie as a list of dicts; fail links and outputs per state
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+
+        for phrase, tags in phrases.items():
+            key = _normalize(phrase.strip())
+            stem = key.endswith('*')
+            key = key.rstrip('*').strip()
+            if not key:
+                continue
+            self.phrases.append(key)
+            self.tags.append(tuple(t.strip() for t in str(tags).split(',')
+                                   if t.strip()))
+            self.stems.append(stem)
+            self._add(key, len(self.phrases) - 1)
+        self._link()
+
+    def __len__(self) -> int:
+        return len(self.phrases)
+
+    # --- Build ---
+    def _add(self, key: str, index: int) -> None:
+        state = 0
+        for ch in key:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append(index)
+
+    def _link(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    # --- Search ---
+    def find(self, text: str) -> List[Match]:
+        """Leftmost-longest, non-overlapping matches on word boundaries."""
+        text = _normalize(text)
+        n = len(text)
+        found: List[Match] = []
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for index in self._out[state]:
+                start = i + 1 - len(self.phrases[index])
+                if start > 0 and _is_word(text[start - 1]):
+                    continue
+                end = i + 1
+                if self.stems[index]:
+                    # A stem swallows the rest of its word
+                    while end < n and _is_word(text[end]):
+                        end += 1
+                elif end < n and _is_word(text[end]):
+                    continue
+                found.append((start, end, index))
+
+        # Longest span first; on a tie the more specific (longer) phrase
+        found.sort(key=lambda m: (m[0], m[0] - m[1],
+                                  -len(self.phrases[m[2]])))
+        chosen: List[Match] = []
+        last_end = 0
+        for match in found:
+            if match[0] >= last_end:
+                chosen.append(match)
+                last_end = match[1]
+        return chosen
+
+    def expand(self, text: str) -> str:
+        """Tags for every phrase found in text, deduplicated, in text order."""
+        seen = set()
+        result = []
+        for _, _, index in self.find(text):
+            for tag in self.tags[index]:
+                if tag.lower() not in seen:
+                    seen.add(tag.lower())
+                    result.append(tag)
+        return ", ".join(result)
+
+
+class PhraseExpander:
+    """
+    Offline draft: input -> tags from phrase_table.json (user copy in the
+    config dir). No network, a few ms per request. The table is rebuilt
+    when the file changes. A table that fails to load leaves an empty one
+    and the reason in `error` ("" when loaded fine) for the UI to show.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.error = ""
+        self._stamp: Optional[Tuple[float, int]] = None
+        self._table = PhraseTable({})
+        self._lock = threading.Lock()
+        self._maybe_reload()
+
+    def _maybe_reload(self) -> None:
+        try:
+            st = os.stat(self.path)
+            stamp = (st.st_mtime, st.st_size)
+        except OSError:
+            stamp = None
+        if stamp == self._stamp:
+            return
+
+        with self._lock:
+            if stamp == self._stamp:
+                return
+            self._stamp = stamp
+            self.error = ""
+            if stamp is None:
+                self._table = PhraseTable({})
+                return
+            try:
+                data = json.loads(self.path.read_text('utf-8'))
+                self._table = PhraseTable(data.get("phrases", {}))
+            except (OSError, ValueError, AttributeError) as e:
+                self.error = f"Phrase table not loaded ({self.path}): {e}"
+                self._table = PhraseTable({})
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def expand(self, text: str) -> str:
+        self._maybe_reload()
+        return self._table.expand(text)
+
+    def matches(self, text: str) -> List[Tuple[str, str]]:
+        """(matched text, tags) pairs - for tooltips and debugging."""
+        self._maybe_reload()
+        table = self._table
+        return [(text[start:end], ", ".join(table.tags[index]))
+                for start, end, index in table.find(text)]
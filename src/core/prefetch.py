@@ -0,0 +1,67 @@
+import time
+from typing import Optional, Tuple
+
+from src.core.dispatcher import TokenBucket
+from src.core.model_router import RATE_LIMIT_COOLDOWN, ModelRouter
+from src.core.response_cache import normalize_input
+
+DEBOUNCE_MS = 800  # idle time after the last keystroke
+MIN_CHARS = 6  # shorter input is usually still being typed
+
+
+def speculation_key(user_input: str, style: str) -> Tuple[str, str]:
+    return normalize_input(user_input), style
+
+
+class PrefetchBudget:
+    """
+    Cap on speculative calls so they never eat the quota explicit requests
+    need: a token bucket (per_minute, bursts up to `burst`) and a full stop
+    while any model has had a 429 recently. per_minute <= 0 turns
+    prefetch off.
+    """
+
+    def __init__(self, per_minute: float = 4.0, burst: float = 2.0,
+                 router: Optional[ModelRouter] = None,
+                 quiet_after_429: float = RATE_LIMIT_COOLDOWN * 2):
+        self.enabled = per_minute > 0
+        self.bucket = TokenBucket(per_minute / 60.0, burst) \
+            if self.enabled else None
+        self.router = router
+        self.quiet_after_429 = quiet_after_429
+        self.spent = 0
+        self.denied = 0
+        self.hits = 0  # speculative answers the user actually used
+
+    def try_spend(self) -> bool:
+        if not self.enabled:
+            return False
+        if self.router is not None and \
+                time.time() - self.router.last_rate_limit() < \
+                self.quiet_after_429:
+            self.denied += 1
+            return False
+        if self.bucket.wait_time(1) > 0:
+            self.denied += 1
+            return False
+        self.bucket.consume(1)
+        self.spent += 1
+        return True
+
+    def stats(self) -> dict:
+        return {"spent": self.spent, "denied": self.denied,
+                "hits": self.hits}
+
+
+class Speculation:
+    """One background request for the text currently in the input box."""
+    __slots__ = ("key", "job_id", "tags", "trace", "adopted")
+
+    def __init__(self, key: Tuple[str, str], job_id: int):
+        self.key = key
+        self.job_id = job_id
+        self.tags: Optional[str] = None  # set when the answer arrives
+        self.trace = None
+        # The user clicked Generate while it was in flight: its answer is
+        # the answer to that click
+        self.adopted = False
@@ -0,0 +1,365 @@
+import gzip
+import html
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from src.core.tag_vocab import tag_key
+
+# A1111/Comfy encode the prompt in chunks of 75 CLIP tokens; every extra
+# chunk is another text-encoder pass and longer cross-attention per step
+CHUNK_TOKENS = 75
+# A tag that doesn't fit moves whole to the next chunk if it is this short
+# (A1111's "last comma within 20 tokens" rule), else it is split
+COMMA_BACKTRACK = 20
+BREAK = "BREAK"
+
+# The standard CLIP merges file (openai/CLIP, open_clip) or HF merges.txt,
+# dropped into the config dir like tags.csv
+CLIP_VOCAB_NAMES = ('bpe_simple_vocab_16e6.txt.gz', 'merges.txt')
+_CLIP_MERGES = 49152 - 256 - 2
+
+# CLIP's pre-tokenizer with stdlib re: \p{L}+ | one \p{N} | other symbols
+_PRETOKEN = re.compile(
+    r"<\|startoftext\|>|<\|endoftext\|>|'s|'t|'re|'ve|'m|'ll|'d"
+    r"|[^\W\d_]+|\d|(?:[^\s\w]|_)+", re.IGNORECASE)
+_BRACKETS = re.compile(r"[(\[<\\]")
+_NUMBER = re.compile(r"^\s*-?\d+(?:\.\d*)?\s*$")
+
+
+# --- Parsing ---
+class ParsedTag:
+    """
+    One prompt item. key - what duplicates are compared by ("Orange_Hair",
+    "(orange hair:1.2)" -> "orange hair"), weight - A1111 emphasis,
+    content - the text without emphasis syntax (what CLIP actually sees).
+    """
+    __slots__ = ("text", "key", "weight", "content")
+
+    def __init__(self, text: str, key: str, weight: float, content: str):
+        self.text = text
+        self.key = key
+        self.weight = weight
+        self.content = content
+
+    @property
+    def is_break(self) -> bool:
+        return self.key == BREAK
+
+
+def _closes_at_end(tag: str) -> bool:
+    """Does the bracket at tag[0] close at tag[-1] (not "(a) (b)")?"""
+    depth = 0
+    escaped = False
+    for i, ch in enumerate(tag):
+        if escaped:
+            escaped = False
+        elif ch == '\\':
+            escaped = True
+        elif ch in '([':
+            depth += 1
+        elif ch in ')]':
+            depth -= 1
+            if depth == 0:
+                return i == len(tag) - 1
+    return False
+
+
+@lru_cache(maxsize=65536)
+def parse_tag(text: str) -> ParsedTag:
+    """Cached: the same tags come up in thousands of styles."""
+    tag = text.strip()
+    if tag.startswith('<') and tag.endswith('>'):
+        # <lora:name:0.8> - not tokenized, never merged with anything else
+        return ParsedTag(tag, tag.lower(), 1.0, "")
+    if tag == BREAK:
+        return ParsedTag(tag, BREAK, 1.0, "")
+
+    content, weight = tag, 1.0
+    while len(content) >= 2 and content[0] in '([' and \
+            content[-1] in ')]' and _closes_at_end(content):
+        if content[0] == '(' and content[-1] == ')':
+            inner = content[1:-1].strip()
+            head, sep, number = inner.rpartition(':')
+            if sep and _NUMBER.match(number):
+                weight *= float(number)
+                content = head.strip()
+            else:
+                weight *= 1.1
+                content = inner
+        elif content[0] == '[' and content[-1] == ']':
+            weight /= 1.1
+            content = content[1:-1].strip()
+        else:
+            break
+    plain = content.replace('\\(', '(').replace('\\)', ')')
+    return ParsedTag(tag, tag_key(plain), round(weight, 3), plain)
+
+
+def split_prompt(text: str) -> List[str]:
+    """Comma-separated items; commas inside (...) / [...] / <...> and
+    escaped ones stay, so "(red hair, blue eyes:1.2)" is one item."""
+    if not _BRACKETS.search(text):
+        return text.split(',')
+    items = []
+    depth = 0
+    escaped = False
+    start = 0
+    for i, ch in enumerate(text):
+        if escaped:
+            escaped = False
+        elif ch == '\\':
+            escaped = True
+        elif ch in '([<':
+            depth += 1
+        elif ch in ')]>':
+            depth = max(0, depth - 1)
+        elif ch == ',' and depth == 0:
+            items.append(text[start:i])
+            start = i + 1
+    if depth:
+        # Unbalanced bracket (truncated LLM output): plain split instead of
+        # swallowing the rest of the prompt into one item
+        return text.split(',')
+    items.append(text[start:])
+    return items
+
+
+@lru_cache(maxsize=1024)
+def parse_prompt(text: str) -> Tuple[ParsedTag, ...]:
+    """
+    Single pass over a prompt: items -> ParsedTag, empty ones dropped.
+    Cached - multi-style mode parses the same LLM answer for every style.
+    """
+    tags = []
+    for item in split_prompt(text):
+        item = item.strip()
+        if item:
+            tag = parse_tag(item)
+            if tag.key:
+                tags.append(tag)
+    return tuple(tags)
+
+
+@lru_cache(maxsize=256)
+def merged_tags(text: str) -> Tuple[ParsedTag, ...]:
+    """
+    parse_prompt with duplicates folded into their first occurrence; an
+    explicitly weighted variant beats a plain mention.
+    """
+    tags: List[ParsedTag] = []
+    position: Dict[str, int] = {}
+    for tag in parse_prompt(text):
+        i = position.get(tag.key)
+        if i is None:
+            position[tag.key] = len(tags)
+            tags.append(tag)
+        elif tags[i].weight == 1.0 and tag.weight != 1.0:
+            tags[i] = tag
+    return tuple(tags)
+
+
+# --- Token counting ---
+def _bytes_to_unicode() -> Dict[int, str]:
+    """GPT-2/CLIP byte -> printable unicode char table."""
+    printable = (list(range(ord("!"), ord("~") + 1)) +
+                 list(range(ord("¡"), ord("¬") + 1)) +
+                 list(range(ord("®"), ord("ÿ") + 1)))
+    chars = printable[:]
+    n = 0
+    for b in range(256):
+        if b not in printable:
+            printable.append(b)
+            chars.append(256 + n)
+            n += 1
+    return dict(zip(printable, map(chr, chars)))
+
+
+def _clean(text: str) -> str:
+    return " ".join(html.unescape(html.unescape(text)).split()).lower()
+
+
+class ClipBPE:
+    """Token counts from CLIP's own BPE merges (no ids needed for that)."""
+
+    exact = True
+
+    def __init__(self, merges: Sequence[Tuple[str, str]],
+                 cache_size: int = 16384):
+        self.ranks = {pair: i for i, pair in enumerate(merges)}
+        self._byte_encoder = _bytes_to_unicode()
+        # Per instance: a cache on the method would keep every ClipBPE alive
+        self._word = lru_cache(maxsize=cache_size)(self._merge_word)
+
+    @classmethod
+    def from_file(cls, path: Union[str, Path]) -> "ClipBPE":
+        path = Path(path)
+        opener = gzip.open if path.suffix == '.gz' else open
+        with opener(path, 'rt', encoding='utf-8') as f:
+            lines = f.read().split('\n')
+        if lines and 'version' in lines[0]:
+            lines = lines[1:]
+        merges = [tuple(line.split()) for line in lines[:_CLIP_MERGES]]
+        merges = [m for m in merges if len(m) == 2]
+        if not merges:
+            raise ValueError(f"{path} has no BPE merges")
+        return cls(merges)
+
+    def _merge_word(self, word: str) -> int:
+        parts = list(word[:-1]) + [word[-1] + '</w>']
+        ranks = self.ranks
+        while len(parts) > 1:
+            best, best_rank = -1, None
+            for i in range(len(parts) - 1):
+                rank = ranks.get((parts[i], parts[i + 1]))
+                if rank is not None and (best_rank is None or
+                                         rank < best_rank):
+                    best, best_rank = i, rank
+            if best < 0:
+                break
+            first, second = parts[best], parts[best + 1]
+            # Merge every occurrence of the pair, left to right
+            merged = []
+            i = 0
+            while i < len(parts):
+                if i < len(parts) - 1 and parts[i] == first and \
+                        parts[i + 1] == second:
+                    merged.append(first + second)
+                    i += 2
+                else:
+                    merged.append(parts[i])
+                    i += 1
+            parts = merged
+        return len(parts)
+
+    def count(self, text: str) -> int:
+        encoder = self._byte_encoder
+        return sum(self._word("".join(encoder[b] for b in piece.encode()))
+                   for piece in _PRETOKEN.findall(_clean(text)))
+
+
+class EstimatedTokens:
+    """
+    Without the merges file: common words are one CLIP token, long ones
+    ~6 letters per token, digits and symbols one each. Errs on the high
+    side, so a budget is kept rather than overshot.
+    """
+
+    exact = False
+
+    def count(self, text: str) -> int:
+        total = 0
+        for piece in _PRETOKEN.findall(_clean(text)):
+            if piece[0].isalpha():
+                total += (len(piece) + 5) // 6
+            else:
+                total += len(piece)
+        return total
+
+
+class TokenCounter:
+    """Tag -> token count with an LRU cache in front of the tokenizer."""
+
+    def __init__(self, backend: Union[ClipBPE, EstimatedTokens],
+                 cache_size: int = 65536):
+        self.backend = backend
+        self.exact = backend.exact
+        self.count = lru_cache(maxsize=cache_size)(backend.count)
+
+    def prompt_tokens(self, tags: Sequence[ParsedTag]) -> int:
+        """Tag tokens + the commas between them."""
+        return sum(self.count(t.content) for t in tags) + max(0, len(tags) - 1)
+
+    def chunks(self, tags: Sequence[ParsedTag]) -> int:
+        packer = ChunkPacker()
+        for tag in tags:
+            packer.add(self.count(tag.content), tag.is_break)
+        return packer.chunks
+
+
+def open_token_counter(user_data_dir: Path) -> TokenCounter:
+    """Exact counts with a CLIP merges file in the config dir, else estimates."""
+    for name in CLIP_VOCAB_NAMES:
+        path = user_data_dir / name
+        if path.exists():
+            try:
+                return TokenCounter(ClipBPE.from_file(path))
+            except (OSError, ValueError, UnicodeDecodeError) as e:
+                print(f"Warning: CLIP vocabulary {path} unreadable: {e}")
+    print("CLIP vocabulary not found, token budgets use estimated counts")
+    return TokenCounter(EstimatedTokens())
+
+
+# --- Chunk budget ---
+class ChunkPacker:
+    """How A1111 lays tags out in 75-token chunks, one tag at a time."""
+    __slots__ = ("chunks", "fill", "items")
+
+    def __init__(self, chunks: int = 1, fill: int = 0, items: int = 0):
+        self.chunks = chunks
+        self.fill = fill
+        self.items = items
+
+    def copy(self) -> "ChunkPacker":
+        return ChunkPacker(self.chunks, self.fill, self.items)
+
+    def add(self, tokens: int, is_break: bool = False) -> None:
+        if is_break:
+            if self.fill:
+                self.chunks += 1
+                self.fill = 0
+            return
+        cost = tokens + (1 if self.items else 0)  # the comma before it
+        self.items += 1
+        if self.fill + cost <= CHUNK_TOKENS:
+            self.fill += cost
+        elif tokens <= COMMA_BACKTRACK:
+            # Comma closes the old chunk (padded), the tag starts a new one
+            self.chunks += 1
+            self.fill = tokens
+        else:
+            total = self.fill + cost
+            spill = (total - 1) // CHUNK_TOKENS
+            self.chunks += spill
+            self.fill = total - spill * CHUNK_TOKENS
+
+
+def fit_budget(counter: TokenCounter, fixed: ChunkPacker,
+               tags: Sequence[ParsedTag], max_chunks: int
+               ) -> Tuple[List[ParsedTag], List[ParsedTag]]:
+    """
+    Picks user tags to stay within max_chunks after the fixed (quality +
+    style) ones: emphasized tags first, then in the order the LLM wrote
+    them (most important first). Output keeps the original order.
+    Returns (kept, dropped).
+    """
+    costs = [counter.count(t.content) for t in tags]
+
+    def packed(indices) -> ChunkPacker:
+        packer = fixed.copy()
+        for i in indices:
+            packer.add(costs[i], tags[i].is_break)
+        return packer
+
+    if packed(range(len(tags))).chunks <= max_chunks:
+        return list(tags), []
+
+    rank = sorted(range(len(tags)), key=lambda i: (-tags[i].weight, i))
+    chosen: List[int] = []
+    packer = fixed.copy()
+    for i in rank:
+        trial = packer.copy()
+        trial.add(costs[i], tags[i].is_break)
+        if trial.chunks <= max_chunks:
+            packer = trial
+            chosen.append(i)
+
+    # Chosen in rank order, laid out in prompt order: padding can differ,
+    # so drop the lowest-ranked until the real layout fits too
+    while chosen and packed(sorted(chosen)).chunks > max_chunks:
+        chosen.pop()
+
+    keep = set(chosen)
+    return ([t for i, t in enumerate(tags) if i in keep],
+            [t for i, t in enumerate(tags) if i not in keep])
@@ -0,0 +1,164 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+
+
+def normalize_input(text: str) -> str:
+    return " ".join(text.split()).casefold()
+
+
+class ResponseCache:
+    """
+    Persistent LLM answer cache (SQLite in the user data dir).
+    Key: normalized input + style + model + hash of the system instruction.
+    Bounded by max_entries (LRU on last access) and ttl_seconds.
+    """
+
+    def __init__(self, path: Union[str, Path], max_entries: int = 5000,
+                 ttl_seconds: float = 7 * 24 * 3600):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " accessed REAL NOT NULL)")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_accessed ON responses(accessed)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(user_input: str, style: str, model: str,
+                 system_instruction: str) -> str:
+        sys_hash = hashlib.sha256(
+            system_instruction.encode('utf-8')).hexdigest()
+        raw = "\x1f".join([normalize_input(user_input), style, model, sys_hash])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        return self.get_any([key])
+
+    def get_any(self, keys: List[str]) -> Optional[str]:
+        """First live entry among keys; counts as a single hit or miss."""
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                row = self._conn.execute(
+                    "SELECT value, created FROM responses WHERE key = ?",
+                    (key,)).fetchone()
+                if row is None:
+                    continue
+                value, created = row
+                if now - created > self.ttl_seconds:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?",
+                                       (key,))
+                    self._conn.commit()
+                    continue
+                self._conn.execute(
+                    "UPDATE responses SET accessed = ? WHERE key = ?",
+                    (now, key))
+                self._conn.commit()
+                self.hits += 1
+                return value
+            self.misses += 1
+            return None
+
+    def contains_any(self, keys: List[str]) -> bool:
+        """Live entry among keys? No hit/miss or LRU side effects."""
+        marks = ",".join("?" * len(keys))
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT 1 FROM responses WHERE key IN ({marks})"
+                f" AND created >= ? LIMIT 1",
+                (*keys, time.time() - self.ttl_seconds)).fetchone()
+        return row is not None
+
+    def put(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created, accessed)"
+                " VALUES (?, ?, ?, ?)", (key, value, now, now))
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        self._conn.execute("DELETE FROM responses WHERE created < ?",
+                           (time.time() - self.ttl_seconds,))
+        (count,) = self._conn.execute(
+            "SELECT COUNT(*) FROM responses").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM responses ORDER BY accessed ASC LIMIT ?)",
+                (overflow,))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            (count,) = self._conn.execute(
+                "SELECT COUNT(*) FROM responses").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": count}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class SingleFlight:
+    """Collapses identical concurrent calls into one: followers wait for the
+    leader and get its result (or its exception)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Any, "_Call"] = {}
+
+    def do(self, key: Any, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
@@ -1,12 +1,44 @@
 import base64
+import contextlib
+import os
+import sys
+import tempfile
+import threading
+from pathlib import Path
+from typing import List, Optional
 
-import win32crypt
-from PyQt6.QtCore import QSettings
+APP_NAME = "SD-Transpiler"
+KEY_ENV_VAR = "GEMINI_API_KEY"
+# Force a backend: dpapi / keyring / file / env / memory
+KEYSTORE_ENV_VAR = "SDT_KEYSTORE"
 
 
-class SecurityManager:
+class KeyStore:
+    """Where the API key lives between sessions."""
+    name = "base"
+
+    def load(self) -> str:
+        raise NotImplementedError
+
+    def save(self, key: str) -> bool:
+        """False if this backend can't store keys (e.g. env)."""
+        raise NotImplementedError
+
+
+# --- Windows ---
+class DPAPIKeyStore(KeyStore):
+    """QSettings (registry) + Windows DPAPI, as before."""
+    name = "dpapi"
+
     def __init__(self):
-        self.settings = QSettings("SD-Transpiler", "Auth")
+        self._settings = None
+
+    @property
+    def settings(self):
+        if self._settings is None:
+            from PyQt6.QtCore import QSettings
+            self._settings = QSettings(APP_NAME, "Auth")
+        return self._settings
 
     def encrypt_data(self, plain_text: str) -> str:
         """
@@ -15,6 +47,7 @@ class SecurityManager:
         if not plain_text:
             return ""
         try:
+            import win32crypt  # lazy: keeps pywin32 off the startup path
             encrypted_bytes = win32crypt.CryptProtectData(
                 plain_text.encode('utf-8'), None, None, None, None, 0
             )
@@ -30,6 +63,7 @@ class SecurityManager:
         if not cipher_text:
             return ""
         try:
+            import win32crypt
             encrypted_bytes = base64.b64decode(cipher_text)
             _, plain_text = win32crypt.CryptUnprotectData(
                 encrypted_bytes, None, None, None, 0
@@ -39,16 +73,218 @@ class SecurityManager:
             print(f"CRITICAL: Decryption failed: {e}")
             return ""
 
-    def get_api_key(self) -> str:
+    def load(self) -> str:
         cipher = self.settings.value("encrypted_key", "")
         return self.decrypt_data(str(cipher)) if cipher else ""
 
+    def save(self, key: str) -> bool:
+        cipher = self.encrypt_data(key)
+        if not cipher:
+            return False
+        self.settings.setValue("encrypted_key", cipher)
+        return True
+
+
+# --- Linux / headless ---
+class EnvKeyStore(KeyStore):
+    """Read-only: $GEMINI_API_KEY (CI, render farm boxes)."""
+    name = "env"
+
+    def __init__(self, var: str = KEY_ENV_VAR):
+        self.var = var
+
+    def load(self) -> str:
+        return os.getenv(self.var, "").strip()
+
+    def save(self, key: str) -> bool:
+        return False
+
+
+class KeyringKeyStore(KeyStore):
+    """
+    OS secret service through the optional `keyring` package (GNOME
+    Keyring / KWallet / macOS Keychain). Empty / read-only when the package
+    or a usable backend is missing.
+    """
+    name = "keyring"
+    USERNAME = "gemini_api_key"
+
+    def load(self) -> str:
+        try:
+            import keyring  # lazy + optional
+            return keyring.get_password(APP_NAME, self.USERNAME) or ""
+        except ImportError:
+            return ""
+        except Exception as e:  # keyring.errors.* - no backend, locked...
+            print(f"Warning: Keyring unavailable: {e}")
+            return ""
+
+    def save(self, key: str) -> bool:
+        try:
+            import keyring
+            keyring.set_password(APP_NAME, self.USERNAME, key)
+            return True
+        except ImportError:
+            return False
+        except Exception as e:
+            print(f"Warning: Keyring unavailable: {e}")
+            return False
+
+
+class FileKeyStore(KeyStore):
+    """
+    Plain-text file in the config dir, mode 0600. Not encrypted: other
+    users can't read it, but anything running as this user (and any backup
+    of the home dir) can. Fallback for boxes without a keyring.
+    """
+    name = "file"
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else _user_data_dir() / 'api_key'
+
+    def load(self) -> str:
+        try:
+            return self.path.read_text('utf-8').strip()
+        except FileNotFoundError:
+            return ""
+        except (OSError, ValueError) as e:
+            print(f"CRITICAL: Key file unreadable: {e}")
+            return ""
+
+    def save(self, key: str) -> bool:
+        tmp = None
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # mkstemp creates the file 0600 and with a unique name
+            fd, tmp = tempfile.mkstemp(dir=self.path.parent,
+                                       prefix=self.path.name, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(key)
+            os.replace(tmp, self.path)
+            return True
+        except OSError as e:
+            print(f"CRITICAL: Key file not saved: {e}")
+            if tmp is not None:
+                with contextlib.suppress(OSError):
+                    os.unlink(tmp)
+            return False
+
+
+class ChainKeyStore(KeyStore):
+    """First non-empty key wins; saves go to the first backend that can."""
+    name = "chain"
+
+    def __init__(self, stores: List[KeyStore]):
+        self.stores = stores
+        self.name = "+".join(s.name for s in stores)
+
+    def load(self) -> str:
+        for store in self.stores:
+            key = store.load()
+            if key:
+                return key
+        return ""
+
+    def save(self, key: str) -> bool:
+        return any(store.save(key) for store in self.stores)
+
+
+# --- Tests ---
+class MemoryKeyStore(KeyStore):
+    """Nothing touches disk; `loads` counts backend reads."""
+    name = "memory"
+
+    def __init__(self, key: str = ""):
+        self.key = key
+        self.loads = 0
+
+    def load(self) -> str:
+        self.loads += 1
+        return self.key
+
+    def save(self, key: str) -> bool:
+        self.key = key
+        return True
+
+
+def _user_data_dir() -> Path:
+    # Same place as TranspilerEngine.user_data_dir
+    base = os.getenv('APPDATA') or os.getenv('XDG_CONFIG_HOME')
+    return Path(base or Path.home() / '.config') / APP_NAME
+
+
+def default_keystore() -> KeyStore:
+    forced = os.getenv(KEYSTORE_ENV_VAR, "").strip().lower()
+    backends = {"dpapi": DPAPIKeyStore, "keyring": KeyringKeyStore,
+                "file": FileKeyStore, "env": EnvKeyStore,
+                "memory": MemoryKeyStore}
+    if forced in backends:
+        return backends[forced]()
+    # $GEMINI_API_KEY first everywhere, so batch/CI setups keep working
+    if sys.platform == "win32":
+        return ChainKeyStore([EnvKeyStore(), DPAPIKeyStore()])
+    return ChainKeyStore([EnvKeyStore(), KeyringKeyStore(), FileKeyStore()])
+
+
+class SecurityManager:
+    """
+    API key access for the whole app. The backend is read until it returns
+    a key, after that get_api_key() is a memory read (it sits on the click
+    path). An empty answer is not cached: a key saved by another process
+    (python -m src.core.security) is picked up without a restart.
+    """
+
+    def __init__(self, store: Optional[KeyStore] = None):
+        self._store = store
+        self._cached: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @property
+    def store(self) -> KeyStore:
+        if self._store is None:
+            self._store = default_keystore()
+        return self._store
+
+    def use_store(self, store: KeyStore) -> None:
+        """Swap the backend (tests, CLI flags); drops the cached key."""
+        with self._lock:
+            self._store = store
+            self._cached = None
+
+    def get_api_key(self) -> str:
+        cached = self._cached
+        if cached is not None:
+            return cached
+        with self._lock:
+            if self._cached is None:
+                key = self.store.load()
+                if not key:
+                    return ""
+                self._cached = key
+            return self._cached
+
     def save_api_key(self, key: str):
         if not key or not key.strip():
             return
-        cipher = self.encrypt_data(key.strip())
-        self.settings.setValue("encrypted_key", cipher)
+        key = key.strip()
+        with self._lock:
+            if not self.store.save(key):
+                print(f"Warning: Key store '{self.store.name}' is read-only, "
+                      f"key kept for this session only")
+            self._cached = key
+
+    def forget_cached_key(self) -> None:
+        with self._lock:
+            self._cached = None
 
 
 # Singleton
 security = SecurityManager()
+
+
+if __name__ == "__main__":
+    # Headless boxes: python -m src.core.security  (stores the key)
+    import getpass
+    entered = getpass.getpass("Gemini API Key: ")
+    security.save_api_key(entered)
+    print(f"Saved via '{security.store.name}' key store.")
@@ -0,0 +1,209 @@
+import hashlib
+import random
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from src.core.response_cache import normalize_input
+
+NUM_PERM = 128
+BANDS = 32  # 32 bands x 4 rows: candidates from ~0.4 Jaccard up
+NGRAM = 3
+# "рыжая девушка в лесу" vs "... в лесу, вечер" ~0.77, "... в городе" ~0.54;
+# the estimate itself is +-0.04 at 128 permutations
+DEFAULT_THRESHOLD = 0.7
+
+_PUNCT = re.compile(r"[^\w\s]+")
+
+_PRIME = (1 << 61) - 1
+# Fixed seed: signatures are persisted and must match between sessions
+_rng = random.Random(0x5D7)
+_PERMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME))
+          for _ in range(NUM_PERM)]
+_PARAMS = f"minhash:{NUM_PERM}:{NGRAM}:{0x5D7}"
+
+Signature = Tuple[int, ...]
+
+
+def shingles(text: str, n: int = NGRAM) -> Set[str]:
+    """Character n-grams of the normalized text (padded with spaces)."""
+    padded = f" {normalize_input(_PUNCT.sub(' ', text))} "
+    if len(padded) <= n:
+        return {padded}
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+def signature(text: str) -> Signature:
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode('utf-8'),
+                                             digest_size=8).digest(), 'little')
+              for s in shingles(text)]
+    return tuple(min((a * h + b) % _PRIME for h in hashes)
+                 for a, b in _PERMS)
+
+
+def similarity(a: Signature, b: Signature) -> float:
+    """MinHash estimate of the Jaccard similarity of the two n-gram sets."""
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+class _Entry:
+    __slots__ = ("style", "norm", "tags", "sig")
+
+    def __init__(self, style: str, norm: str, tags: str, sig: Signature):
+        self.style = style
+        self.norm = norm
+        self.tags = tags
+        self.sig = sig
+
+
+class SimilarIndex:
+    """
+    Near-duplicate lookup over previous (input, style) -> tags answers:
+    character n-gram MinHash + LSH banding, no embeddings, no network.
+    Only entries of the same style are compared. Kept in memory (bounded,
+    LRU) and persisted to SQLite next to the response cache.
+    """
+
+    def __init__(self, path: Union[str, Path], max_entries: int = 5000,
+                 threshold: float = DEFAULT_THRESHOLD):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self._buckets: Dict[Tuple[str, int, Signature],
+                            Set[Tuple[str, str]]] = {}
+        self._rows = NUM_PERM // BANDS
+
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS similar ("
+            " style TEXT NOT NULL,"
+            " norm TEXT NOT NULL,"
+            " tags TEXT NOT NULL,"
+            " sig BLOB NOT NULL,"
+            " params TEXT NOT NULL,"
+            " accessed REAL NOT NULL,"
+            " PRIMARY KEY (style, norm))")
+        self._conn.commit()
+        self._load()
+
+    # --- Persistence ---
+    def _load(self) -> None:
+        rows = self._conn.execute(
+            "SELECT style, norm, tags, sig, params FROM similar"
+            " ORDER BY accessed DESC LIMIT ?", (self.max_entries,)).fetchall()
+        # Oldest first, so the OrderedDict ends up in LRU order
+        for style, norm, tags, blob, params in reversed(rows):
+            if params == _PARAMS:
+                sig = tuple(array('Q', blob))
+            else:
+                sig = signature(norm)
+            self._insert(_Entry(style, norm, tags, sig))
+
+    def _save(self, entry: _Entry) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO similar"
+            " (style, norm, tags, sig, params, accessed)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (entry.style, entry.norm, entry.tags,
+             array('Q', entry.sig).tobytes(), _PARAMS, time.time()))
+
+    # --- Index ---
+    def _bands(self, style: str, sig: Signature):
+        rows = self._rows
+        for band in range(BANDS):
+            yield style, band, sig[band * rows:(band + 1) * rows]
+
+    def _insert(self, entry: _Entry) -> None:
+        key = (entry.style, entry.norm)
+        self._remove(key)
+        self._entries[key] = entry
+        for bucket in self._bands(entry.style, entry.sig):
+            self._buckets.setdefault(bucket, set()).add(key)
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for bucket in self._bands(entry.style, entry.sig):
+            members = self._buckets.get(bucket)
+            if members is not None:
+                members.discard(key)
+                if not members:
+                    del self._buckets[bucket]
+
+    # --- API ---
+    def lookup(self, user_input: str, style: str,
+               threshold: Optional[float] = None
+               ) -> Optional[Tuple[str, float]]:
+        """(tags, similarity) of the closest earlier request, or None."""
+        threshold = self.threshold if threshold is None else threshold
+        if threshold <= 0:
+            return None
+        sig = signature(user_input)
+        with self._lock:
+            candidates: Set[Tuple[str, str]] = set()
+            for bucket in self._bands(style, sig):
+                candidates |= self._buckets.get(bucket, set())
+
+            best, best_score = None, 0.0
+            for key in candidates:
+                score = similarity(sig, self._entries[key].sig)
+                if score > best_score:
+                    best, best_score = key, score
+
+            if best is None or best_score < threshold:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(best)
+            self._conn.execute(
+                "UPDATE similar SET accessed = ? WHERE style = ? AND norm = ?",
+                (time.time(), *best))
+            self._conn.commit()
+            return self._entries[best].tags, best_score
+
+    def add(self, user_input: str, style: str, tags: str) -> None:
+        entry = _Entry(style, normalize_input(user_input), tags,
+                       signature(user_input))
+        with self._lock:
+            self._insert(entry)
+            self._save(entry)
+            evicted: List[Tuple[str, str]] = []
+            while len(self._entries) > self.max_entries:
+                key = next(iter(self._entries))
+                self._remove(key)
+                evicted.append(key)
+            if evicted:
+                self._conn.executemany(
+                    "DELETE FROM similar WHERE style = ? AND norm = ?",
+                    evicted)
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self._conn.execute("DELETE FROM similar")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "entries": len(self._entries)}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,126 @@
+import builtins
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import List, Optional, Tuple
+
+
+class StartupProfiler:
+    """
+    --profile-startup backend. Times every first-time import (inclusive,
+    with nesting depth) by wrapping builtins.__import__, plus named init
+    spans and milestones (window shown, first paint, ready).
+    """
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        # (module, seconds, depth, thread)
+        self.imports: List[Tuple[str, float, int, str]] = []
+        self.spans: List[Tuple[str, float, float]] = []  # (label, start, dur)
+        self.marks: List[Tuple[str, float]] = []
+        self._depth = threading.local()
+        self._lock = threading.Lock()
+        self._original_import = None
+
+    # --- Imports ---
+    def install_import_hook(self) -> None:
+        if self._original_import is not None:
+            return
+        original = self._original_import = builtins.__import__
+
+        def timed_import(name, globals=None, locals=None, fromlist=(),
+                         level=0):
+            if level or name in sys.modules:
+                return original(name, globals, locals, fromlist, level)
+            depth = getattr(self._depth, "value", 0)
+            self._depth.value = depth + 1
+            start = time.perf_counter()
+            try:
+                return original(name, globals, locals, fromlist, level)
+            finally:
+                self._depth.value = depth
+                with self._lock:
+                    self.imports.append((name, time.perf_counter() - start,
+                                         depth,
+                                         threading.current_thread().name))
+
+        builtins.__import__ = timed_import
+
+    def uninstall_import_hook(self) -> None:
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    # --- Spans / marks ---
+    @contextmanager
+    def span(self, label: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.spans.append((label, start - self.t0,
+                                   time.perf_counter() - start))
+
+    def mark(self, label: str) -> float:
+        elapsed = time.perf_counter() - self.t0
+        with self._lock:
+            self.marks.append((label, elapsed))
+        return elapsed
+
+    def elapsed(self, label: str) -> Optional[float]:
+        for name, at in self.marks:
+            if name == label:
+                return at
+        return None
+
+    # --- Output ---
+    def to_dict(self) -> dict:
+        return {
+            "marks": {label: at for label, at in self.marks},
+            "spans": [{"label": l, "start": s, "seconds": d}
+                      for l, s, d in self.spans],
+            "imports": [{"module": m, "seconds": d, "depth": depth,
+                         "thread": t}
+                        for m, d, depth, t in self.imports],
+        }
+
+    def report(self, top: int = 15) -> str:
+        lines = ["--- Startup profile ---"]
+        for label, at in self.marks:
+            lines.append(f"{at * 1000:8.1f} ms  {label}")
+
+        lines.append("--- Init spans ---")
+        for label, start, dur in self.spans:
+            lines.append(f"{dur * 1000:8.1f} ms  {label} "
+                         f"(at {start * 1000:.0f} ms)")
+
+        lines.append(f"--- Slowest top-level imports (top {top}) ---")
+        top_level = [i for i in self.imports if i[2] == 0]
+        for name, dur, _, thread in sorted(top_level, key=lambda i: -i[1])[
+                                     :top]:
+            where = "" if thread == "MainThread" else f" [{thread}]"
+            lines.append(f"{dur * 1000:8.1f} ms  {name}{where}")
+        return "\n".join(lines)
+
+    def dump(self, path: str) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+# Set by main.py when --profile-startup is on
+profiler: Optional[StartupProfiler] = None
+
+
+def span(label: str):
+    """No-op unless profiling is enabled."""
+    if profiler is None:
+        return nullcontext()
+    return profiler.span(label)
+
+
+def mark(label: str) -> None:
+    if profiler is not None:
+        profiler.mark(label)
@@ -0,0 +1,80 @@
+import contextlib
+import os
+import pickle
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import pydantic
+
+# Bump when StyleConfig / CompiledStyle change shape
+SNAPSHOT_VERSION = 2
+
+SNAPSHOT_NAME = 'styles.snapshot.pickle'
+
+
+def source_key(*paths: Path) -> Tuple:
+    """Cheap validity key: path + mtime + size of every source file."""
+    key = [SNAPSHOT_VERSION, pydantic.VERSION]
+    for path in paths:
+        try:
+            st = path.stat()
+            key.append((str(path.resolve()), st.st_mtime_ns, st.st_size))
+        except OSError:
+            key.append((str(path), None, None))
+    return tuple(key)
+
+
+def load_snapshot(snapshot_path: Path,
+                  key: Tuple) -> Optional[Dict[str, Any]]:
+    """
+    The already validated library in one read, or None if the snapshot is
+    missing, stale or unreadable. The file lives next to the user config and
+    is only ever written by us, so it is trusted like styles.json itself.
+    """
+    try:
+        with open(snapshot_path, 'rb') as f:
+            data = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Warning: Style snapshot ignored: {e}")
+        return None
+
+    if not isinstance(data, dict) or data.get("key") != key:
+        return None
+    return data
+
+
+def save_snapshot(snapshot_path: Path, key: Tuple,
+                  payload: Dict[str, Any]) -> None:
+    tmp = None
+    try:
+        # Unique temp name: a reload may save while the startup save runs
+        with tempfile.NamedTemporaryFile(
+                'wb', dir=snapshot_path.parent, prefix=snapshot_path.name,
+                suffix='.tmp', delete=False) as f:
+            tmp = f.name
+            pickle.dump({"key": key, **payload}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, snapshot_path)
+    except Exception as e:
+        print(f"Warning: Could not write style snapshot: {e}")
+        if tmp is not None:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp)
+
+
+def save_snapshot_async(snapshot_path: Path, key: Tuple,
+                        payload: Dict[str, Any]) -> threading.Thread:
+    """
+    Pickling thousands of styles is kept off the startup path. Not a daemon:
+    a short-lived process (python -m src.batch) waits for the write at exit
+    instead of killing it halfway and leaving the temp file behind.
+    """
+    thread = threading.Thread(target=save_snapshot,
+                              args=(snapshot_path, key, payload),
+                              name="style-snapshot")
+    thread.start()
+    return thread
@@ -0,0 +1,344 @@
+import csv
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+from functools import lru_cache
+from heapq import nlargest
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+VOCAB_CSV = 'tags.csv'
+VOCAB_INDEX = 'tag_vocab.idx'
+
+MAGIC = b"SDTV"
+VERSION = 1
+# magic, version, byte order, n_tags, n_aliases, blob size, max post count,
+# source mtime_ns, source size
+_HEADER = struct.Struct("<4sHHIIIIQQ")
+_BYTE_ORDER = 1 if sys.byteorder == "little" else 2
+
+# Letters the typo corrector tries for replace/insert edits
+_ALPHABET = "abcdefghijklmnopqrstuvwxyz0123456789 -'"
+# Only plain tags are checked; "(tag:1.2)", <lora:...>, BREAK are left alone
+_PLAIN_TAG = re.compile(r"^[\w\s\-'.!?&/]+$")
+
+# A typo guess is ~80 index lookups per letter: only tag-sized words get
+# one (short ones are too ambiguous, long ones are descriptive phrases
+# rather than misspelled tags), and only a few per answer
+TYPO_MIN_LEN = 5
+TYPO_MAX_LEN = 24
+MAX_TYPO_CHECKS = 4
+
+
+def tag_key(name: str) -> str:
+    """Lookup form: lowercase, "orange_hair" -> "orange hair"."""
+    name = " ".join(name.strip().lower().split())
+    # Emoticon tags (^_^, o_o, >_<) keep their underscores
+    if len(name) > 3 and any(c.isalpha() for c in name):
+        name = " ".join(name.replace("_", " ").split())
+    return name
+
+
+def _aligned(n: int) -> int:
+    return (n + 3) & ~3
+
+
+# --- Build ---
+def build_index(csv_path: Union[str, Path],
+                out_path: Union[str, Path]) -> int:
+    """
+    Danbooru/e621 tag CSV (the a1111-tagcomplete format:
+    name,category,post_count,"alias1,alias2") -> sorted binary index.
+    Returns the number of tags.
+    """
+    csv_path, out_path = Path(csv_path), Path(out_path)
+    tags: Dict[str, Tuple[int, int]] = {}  # key -> (count, category)
+    aliases: Dict[str, str] = {}
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        for row in csv.reader(f):
+            if not row or not row[0].strip() or row[0].startswith('#'):
+                continue
+            key = tag_key(row[0])
+            try:
+                category = int(row[1]) if len(row) > 1 and row[1] else 0
+                count = int(float(row[2])) if len(row) > 2 and row[2] else 0
+            except ValueError:
+                continue  # header line
+            if key not in tags or tags[key][0] < count:
+                tags[key] = (min(count, 0xFFFFFFFF), category & 0xFF)
+            if len(row) > 3 and row[3]:
+                for alias in row[3].split(','):
+                    alias = tag_key(alias)
+                    if alias and alias != key:
+                        aliases.setdefault(alias, key)
+
+    names = sorted(tags, key=lambda k: k.encode('utf-8'))
+    index = {name: i for i, name in enumerate(names)}
+    alias_names = sorted((a for a in aliases if a not in tags),
+                         key=lambda k: k.encode('utf-8'))
+
+    blob = bytearray()
+    tag_off = [0]
+    for name in names:
+        blob += name.encode('utf-8')
+        tag_off.append(len(blob))
+    alias_off = [len(blob)]
+    for alias in alias_names:
+        blob += alias.encode('utf-8')
+        alias_off.append(len(blob))
+
+    from array import array
+    counts = array('I', (tags[n][0] for n in names))
+    categories = bytes(tags[n][1] for n in names)
+    st = csv_path.stat()
+    header = _HEADER.pack(MAGIC, VERSION, _BYTE_ORDER, len(names),
+                          len(alias_names), len(blob), max(counts, default=0),
+                          st.st_mtime_ns, st.st_size)
+
+    tmp = out_path.with_suffix(out_path.suffix + '.tmp')
+    with open(tmp, 'wb') as f:
+        f.write(header)
+        f.write(array('I', tag_off).tobytes())
+        f.write(counts.tobytes())
+        f.write(categories + b"\0" * (_aligned(len(names)) - len(names)))
+        f.write(array('I', alias_off).tobytes())
+        f.write(array('I', (index[aliases[a]] for a in alias_names))
+                .tobytes())
+        f.write(blob)
+    tmp.replace(out_path)
+    return len(names)
+
+
+# --- Lookup ---
+class TagVocab:
+    """
+    Read-only view of a compiled tag index. The file is memory-mapped:
+    opening it costs nothing, pages are read on demand and shared between
+    processes. All searches are binary searches over the sorted names.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._file = open(self.path, 'rb')
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0,
+                                 access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            self._file.close()
+            raise ValueError(f"{self.path} is empty")
+
+        (magic, version, order, self.n_tags, self.n_aliases, blob_size,
+         self.max_count, self.source_mtime_ns,
+         self.source_size) = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION or order != _BYTE_ORDER:
+            self.close()
+            raise ValueError(f"{self.path} is not a v{VERSION} tag index "
+                             f"for this machine")
+
+        view = memoryview(self._mm)
+        pos = _HEADER.size
+
+        def take(n_bytes: int) -> memoryview:
+            nonlocal pos
+            part = view[pos:pos + n_bytes]
+            pos += _aligned(n_bytes)
+            return part
+
+        self._tag_off = take(4 * (self.n_tags + 1)).cast('I')
+        self._counts = take(4 * self.n_tags).cast('I')
+        self._categories = take(self.n_tags)
+        self._alias_off = take(4 * (self.n_aliases + 1)).cast('I')
+        self._alias_target = take(4 * self.n_aliases).cast('I')
+        self._blob = take(blob_size)
+        self._log_max = math.log1p(self.max_count) or 1.0
+        # LLM answers repeat the same unknown tags: guess each one once
+        self._closest = lru_cache(maxsize=4096)(self._closest_uncached)
+
+    def close(self) -> None:
+        for name in ("_tag_off", "_counts", "_categories", "_alias_off",
+                     "_alias_target", "_blob"):
+            view = getattr(self, name, None)
+            if view is not None:
+                view.release()
+        self._mm.close()
+        self._file.close()
+
+    def __len__(self) -> int:
+        return self.n_tags
+
+    # --- Internals ---
+    def _name_bytes(self, offsets: memoryview, i: int) -> bytes:
+        return bytes(self._blob[offsets[i]:offsets[i + 1]])
+
+    def _bisect(self, offsets: memoryview, n: int, key: bytes) -> int:
+        lo, hi = 0, n
+        blob = self._blob
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if bytes(blob[offsets[mid]:offsets[mid + 1]]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _exact(self, offsets: memoryview, n: int, key: bytes) -> int:
+        i = self._bisect(offsets, n, key)
+        if i < n and self._name_bytes(offsets, i) == key:
+            return i
+        return -1
+
+    def _index(self, key: str) -> int:
+        """Tag index for a key, following aliases; -1 if unknown."""
+        raw = key.encode('utf-8')
+        i = self._exact(self._tag_off, self.n_tags, raw)
+        if i >= 0:
+            return i
+        a = self._exact(self._alias_off, self.n_aliases, raw)
+        return self._alias_target[a] if a >= 0 else -1
+
+    def name(self, i: int) -> str:
+        return self._name_bytes(self._tag_off, i).decode('utf-8')
+
+    # --- API ---
+    def __contains__(self, tag: str) -> bool:
+        return self._index(tag_key(tag)) >= 0
+
+    def canonical(self, tag: str) -> Optional[str]:
+        """Known tag or alias -> canonical name, else None."""
+        i = self._index(tag_key(tag))
+        return self.name(i) if i >= 0 else None
+
+    def count(self, tag: str) -> int:
+        i = self._index(tag_key(tag))
+        return self._counts[i] if i >= 0 else 0
+
+    def score(self, tag: str) -> float:
+        """0..1 popularity (log post count), for ranking."""
+        return math.log1p(self.count(tag)) / self._log_max
+
+    def category(self, tag: str) -> int:
+        i = self._index(tag_key(tag))
+        return self._categories[i] if i >= 0 else -1
+
+    def complete(self, prefix: str, limit: int = 10) -> List[Tuple[str, int]]:
+        """Most popular (tag, post count) starting with prefix; aliases too."""
+        raw = tag_key(prefix).encode('utf-8')
+        if not raw:
+            return []
+        # UTF-8 never contains 0xFF: prefix + 0xFF bounds the range
+        lo = self._bisect(self._tag_off, self.n_tags, raw)
+        hi = self._bisect(self._tag_off, self.n_tags, raw + b"\xff")
+        found = set(range(lo, hi))
+        lo = self._bisect(self._alias_off, self.n_aliases, raw)
+        hi = self._bisect(self._alias_off, self.n_aliases, raw + b"\xff")
+        found.update(self._alias_target[a] for a in range(lo, hi))
+        best = nlargest(limit, found, key=self._counts.__getitem__)
+        return [(self.name(i), self._counts[i]) for i in best]
+
+    def correct(self, tag: str, fuzzy: bool = True) -> Optional[str]:
+        """
+        Canonical name for a known tag / alias, or (fuzzy) for the most
+        popular tag one edit away (typo); None if there is nothing close.
+        """
+        key = tag_key(tag)
+        i = self._index(key)
+        if i >= 0:
+            return self.name(i)
+        if not fuzzy or not TYPO_MIN_LEN <= len(key) <= TYPO_MAX_LEN:
+            return None
+        return self._closest(key)
+
+    def _closest_uncached(self, key: str) -> Optional[str]:
+        best, best_count = -1, -1
+        for candidate in set(_edits1(key)):
+            j = self._index(candidate)
+            if j >= 0 and self._counts[j] > best_count:
+                best, best_count = j, self._counts[j]
+        return self.name(best) if best >= 0 else None
+
+    def fix_tags(self, text: str, autocorrect: bool = False,
+                 max_typo_checks: int = MAX_TYPO_CHECKS
+                 ) -> Tuple[str, List[Tuple[str, str]], List[str]]:
+        """
+        Checks comma-separated LLM output: aliases are replaced by
+        canonical tags; with autocorrect, so are one-edit typos of popular
+        tags (at most max_typo_checks guesses per answer - an unknown tag
+        may just be a valid description). Unknown tags are kept as they
+        are (they may still mean something to the model).
+        Returns (text, [(old, new)], [unknown]).
+        """
+        fixed, changes, unknown = [], [], []
+        guesses = max_typo_checks if autocorrect else 0
+        for part in text.split(','):
+            tag = part.strip()
+            if not tag or not _PLAIN_TAG.match(tag):
+                fixed.append(tag)
+                continue
+            known = self.correct(tag, fuzzy=False)
+            if known is None and guesses and \
+                    TYPO_MIN_LEN <= len(tag_key(tag)) <= TYPO_MAX_LEN:
+                guesses -= 1
+                known = self.correct(tag)
+            if known is None:
+                unknown.append(tag)
+                fixed.append(tag)
+            else:
+                if tag_key(tag) != known:
+                    changes.append((tag, known))
+                fixed.append(known)
+        return ", ".join(t for t in fixed if t), changes, unknown
+
+
+def _edits1(word: str):
+    """Norvig's single edits: deletes, transposes, replaces, inserts."""
+    splits = [(word[:i], word[i:]) for i in range(len(word) + 1)]
+    for left, right in splits:
+        if right:
+            yield left + right[1:]
+        if len(right) > 1:
+            yield left + right[1] + right[0] + right[2:]
+        for c in _ALPHABET:
+            if right and c != right[0]:
+                yield left + c + right[1:]
+            yield left + c + right
+
+
+def open_vocab(user_data_dir: Path) -> Optional[TagVocab]:
+    """
+    tag_vocab.idx from the config dir; (re)built first if tags.csv is
+    there and newer. None when there is no vocabulary at all.
+    """
+    source = user_data_dir / VOCAB_CSV
+    index = user_data_dir / VOCAB_INDEX
+    vocab = None
+    if index.exists():
+        try:
+            vocab = TagVocab(index)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Tag index unreadable, rebuilding: {e}")
+
+    if source.exists():
+        st = source.stat()
+        if vocab is None or (vocab.source_mtime_ns, vocab.source_size) != \
+                (st.st_mtime_ns, st.st_size):
+            if vocab is not None:
+                vocab.close()
+            print(f"Compiling tag vocabulary from {source}...")
+            build_index(source, index)
+            vocab = TagVocab(index)
+    return vocab
+
+
+if __name__ == "__main__":
+    # python -m src.core.tag_vocab danbooru.csv [tag_vocab.idx]
+    import time
+    src = Path(sys.argv[1])
+    dst = Path(sys.argv[2]) if len(sys.argv) > 2 else src.with_name(
+        VOCAB_INDEX)
+    started = time.perf_counter()
+    n = build_index(src, dst)
+    print(f"{n} tags -> {dst} ({dst.stat().st_size // 1024} KB, "
+          f"{time.perf_counter() - started:.1f}s)")
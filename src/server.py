@@ -0,0 +1,390 @@
+"""
+Headless HTTP/JSON service on localhost.
+
+    python -m src.server --port 8765 --concurrency 8
+
+    GET  /health     -> {"status": "ok", "inflight": 0, ...}
+    GET  /styles     -> {"styles": [...]}
+    GET  /metrics    -> Prometheus text (see src/core/metrics.py)
+    POST /compile    {"input": "tags", "style": "...", "nsfw": false}
+    POST /generate   {"input": "описание", "style": "...", "nsfw": false,
+                      "use_cache": true}
+
+/compile only runs engine.process, /generate asks Gemini first (shared
+client + AsyncDispatcher, same quotas/backoff as the batch runner). At most
+--max-pending LLM requests are admitted; beyond that the server answers
+429 with Retry-After instead of queueing without bound.
+"""
+import argparse
+import asyncio
+import json
+import sys
+from http import HTTPStatus
+from typing import Dict, Optional, Tuple
+
+from src.core.config_watcher import ConfigPoller
+from src.core.dispatcher import AsyncDispatcher
+from src.core.generator import TranspilerEngine
+from src.core.llm_client import (MODEL_PRIORITIES, LLMError, create_client,
+                                 router)
+from src.core.metrics import metrics
+from src.core.response_cache import ResponseCache
+from src.core.security import security
+
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+IDLE_TIMEOUT = 30.0  # seconds a keep-alive connection may sit idle
+
+
+class HTTPError(Exception):
+    def __init__(self, status: HTTPStatus, message: str,
+                 headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class TranspilerServer:
+    """
+    Minimal HTTP/1.1 (keep-alive, Content-Length bodies) on asyncio streams.
+    engine.process is fast and runs on the loop; LLM calls go through one
+    AsyncDispatcher, so every client shares its concurrency and quotas.
+    """
+
+    def __init__(self, engine: TranspilerEngine, client=None,
+                 concurrency: int = 4, max_pending: Optional[int] = None,
+                 timeout: float = 90.0,
+                 cache: Optional[ResponseCache] = None,
+                 quotas: Optional[Dict[str, Tuple[int, int]]] = None,
+                 batch_size: int = 1):
+        self.engine = engine
+        self.client = client
+        self.concurrency = max(1, concurrency)
+        self.max_pending = max_pending or self.concurrency * 4
+        self.timeout = timeout
+        self.cache = cache
+        self.quotas = quotas
+        self.batch_size = batch_size
+        self.inflight = 0
+        self.rejected = 0
+        self.dispatcher: Optional[AsyncDispatcher] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    # --- Lifecycle ---
+    async def start(self, host: str = "127.0.0.1",
+                    port: int = 8765) -> asyncio.AbstractServer:
+        if self.client is not None:
+            self.dispatcher = AsyncDispatcher(
+                self.client, concurrency=self.concurrency, cache=self.cache,
+                quotas=self.quotas, trace_kind="server",
+                batch_size=self.batch_size)
+            self.dispatcher.start()
+        self._server = await asyncio.start_server(
+            self._handle_connection, host, port, limit=MAX_HEADER_BYTES)
+        return self._server
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self.dispatcher is not None:
+            await self.dispatcher.close()
+            self.dispatcher = None
+
+    # --- HTTP ---
+    async def _handle_connection(self, reader: asyncio.StreamReader,
+                                 writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(
+                        reader.readuntil(b"\r\n\r\n"), IDLE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError,
+                        ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    await self._respond(writer, HTTPStatus(431),
+                                        {"error": "Headers too large"},
+                                        keep_alive=False)
+                    return
+
+                keep_alive = False
+                try:
+                    method, path, headers, keep_alive = _parse_head(head)
+                    body = await self._read_body(reader, headers)
+                    status, payload, extra = await self._route(method, path,
+                                                               body)
+                except HTTPError as e:
+                    status, payload, extra = e.status, {"error": str(e)}, \
+                        e.headers
+                    keep_alive = keep_alive if e.status < 500 else False
+                except ConnectionError:
+                    raise
+                except Exception as e:
+                    # A bug in a handler must not drop the connection
+                    # without an answer
+                    print(f"Server error: {type(e).__name__}: {e}",
+                          file=sys.stderr)
+                    status, payload, extra = (
+                        HTTPStatus.INTERNAL_SERVER_ERROR,
+                        {"error": "Internal server error"}, {})
+                    keep_alive = False
+
+                await self._respond(writer, status, payload, keep_alive,
+                                    extra)
+                if not keep_alive:
+                    return
+        except ConnectionError:
+            return
+        finally:
+            writer.close()
+
+    async def _read_body(self, reader: asyncio.StreamReader,
+                         headers: Dict[str, str]) -> bytes:
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise HTTPError(HTTPStatus.LENGTH_REQUIRED,
+                            "Chunked bodies are not supported")
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Bad Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                            "Body too large")
+        if length <= 0:
+            return b""
+        try:
+            return await reader.readexactly(length)
+        except asyncio.IncompleteReadError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST,
+                            "Body shorter than Content-Length")
+
+    async def _respond(self, writer: asyncio.StreamWriter,
+                       status: HTTPStatus, payload,
+                       keep_alive: bool = True,
+                       headers: Optional[Dict[str, str]] = None) -> None:
+        if isinstance(payload, str):
+            body = payload.encode('utf-8')
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            content_type = "application/json; charset=utf-8"
+
+        lines = [f"HTTP/1.1 {status.value} {status.phrase}",
+                 f"Content-Type: {content_type}",
+                 f"Content-Length: {len(body)}",
+                 f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        lines += [f"{k}: {v}" for k, v in (headers or {}).items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1')
+                     + body)
+        await writer.drain()
+
+    # --- Routes ---
+    async def _route(self, method: str, path: str,
+                     body: bytes) -> Tuple[HTTPStatus, object, dict]:
+        path = path.split("?", 1)[0].rstrip("/") or "/"
+        routes = {
+            ("GET", "/health"): self._health,
+            ("GET", "/styles"): self._styles,
+            ("GET", "/metrics"): self._metrics,
+            ("POST", "/compile"): self._compile,
+            ("POST", "/generate"): self._generate,
+        }
+        handler = routes.get((method, path))
+        if handler is None:
+            if any(p == path for _, p in routes):
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED,
+                                f"{method} not allowed on {path}")
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"No route {path}")
+        payload = await handler(body)
+        return HTTPStatus.OK, payload, {}
+
+    async def _health(self, body: bytes) -> dict:
+        return {"status": "ok", "llm": self.dispatcher is not None,
+                "inflight": self.inflight, "max_pending": self.max_pending,
+                "rejected": self.rejected,
+                "styles": len(self.engine.styles)}
+
+    async def _styles(self, body: bytes) -> dict:
+        return {"styles": self.engine.get_style_names()}
+
+    async def _metrics(self, body: bytes) -> str:
+        return metrics.to_prometheus()
+
+    async def _compile(self, body: bytes) -> dict:
+        text, style, nsfw, _ = self._parse_request(body)
+        return self.engine.process(text, style, nsfw).model_dump()
+
+    async def _generate(self, body: bytes) -> dict:
+        text, style, nsfw, use_cache = self._parse_request(body)
+        if self.dispatcher is None:
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE,
+                            "LLM disabled (no API key); use /compile")
+
+        # Backpressure: refuse early instead of growing an unbounded queue
+        if self.inflight >= self.max_pending:
+            self.rejected += 1
+            raise HTTPError(HTTPStatus.TOO_MANY_REQUESTS,
+                            "Server busy, retry later",
+                            {"Retry-After": "1"})
+
+        self.inflight += 1
+        try:
+            tags = await asyncio.wait_for(
+                self.dispatcher.generate(text, style, use_cache=use_cache),
+                self.timeout)
+        except asyncio.TimeoutError:
+            raise HTTPError(HTTPStatus.GATEWAY_TIMEOUT,
+                            f"No answer from Gemini in {self.timeout:.0f}s")
+        except LLMError as e:
+            raise HTTPError(HTTPStatus.BAD_GATEWAY, str(e))
+        finally:
+            self.inflight -= 1
+
+        result = self.engine.process(tags, style, nsfw).model_dump()
+        result["tags"] = tags
+        return result
+
+    def _parse_request(self, body: bytes) -> Tuple[str, str, bool, bool]:
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError as e:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Invalid JSON: {e}")
+        if not isinstance(data, dict):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Expected a JSON object")
+
+        text = data.get("input")
+        if not isinstance(text, str) or not text.strip():
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "'input' is required")
+        style = data.get("style") or next(
+            iter(self.engine.get_style_names()), "")
+        if not isinstance(style, str):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "'style' must be a string")
+        return (text.strip(), style, _flag(data, "nsfw", False),
+                _flag(data, "use_cache", True))
+
+
+def _flag(data: dict, name: str, default: bool) -> bool:
+    # bool("false") is True: only real JSON booleans are accepted
+    value = data.get(name, default)
+    if not isinstance(value, bool):
+        raise HTTPError(HTTPStatus.BAD_REQUEST,
+                        f"'{name}' must be true or false")
+    return value
+
+
+def _parse_head(head: bytes) -> Tuple[str, str, Dict[str, str], bool]:
+    try:
+        lines = head.decode('latin-1').split("\r\n")
+        method, path, version = lines[0].split(" ", 2)
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+
+    headers = {}
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, sep, value = line.partition(":")
+        if not sep:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed header")
+        headers[name.strip().lower()] = value.strip()
+
+    connection = headers.get("connection", "").lower()
+    if version == "HTTP/1.0":
+        keep_alive = connection == "keep-alive"
+    else:
+        keep_alive = connection != "close"
+    return method.upper(), path, headers, keep_alive
+
+
+async def serve(args, engine: TranspilerEngine, client,
+                quotas: Optional[Dict[str, Tuple[int, int]]] = None) -> None:
+    cache = None
+    if client is not None and not args.no_cache:
+        cache = ResponseCache(engine.user_data_dir / 'response_cache.sqlite3')
+
+    server = TranspilerServer(engine, client, concurrency=args.concurrency,
+                              max_pending=args.max_pending,
+                              timeout=args.timeout, cache=cache,
+                              quotas=quotas, batch_size=args.batch_size)
+    await server.start(args.host, args.port)
+    mode = "LLM + compile" if client is not None else "compile only"
+    print(f"Serving on http://{args.host}:{args.port} ({mode}, "
+          f"concurrency {server.concurrency}, "
+          f"max pending {server.max_pending})", file=sys.stderr)
+    try:
+        await asyncio.Event().wait()  # until Ctrl+C
+    finally:
+        await server.close()
+        if cache is not None:
+            cache.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.server",
+        description="SD-Transpiler as a local HTTP/JSON service.")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="Bind address (default: localhost only)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("-j", "--concurrency", type=int, default=4,
+                        help="Gemini requests in flight")
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help="LLM requests admitted before answering 429 "
+                             "(default: 4x concurrency)")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="Pack up to N concurrent /generate requests "
+                             "into one Gemini call")
+    parser.add_argument("--timeout", type=float, default=90.0,
+                        help="Per-request LLM timeout, seconds")
+    parser.add_argument("--api-key", default="",
+                        help="Defaults to $GEMINI_API_KEY, then the stored "
+                             "key; without a key only /compile works")
+    parser.add_argument("--fake-llm", type=float, default=None,
+                        metavar="LATENCY",
+                        help="Dev/testing: answer with the offline fake "
+                             "client (llm_transport.FakeClient)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Do not use the persistent response cache")
+    parser.add_argument("--watch-config", action="store_true",
+                        help="Pick up styles.json edits while serving")
+    args = parser.parse_args(argv)
+
+    if args.host not in ("127.0.0.1", "localhost", "::1"):
+        print(f"Warning: listening on {args.host} - there is no auth, "
+              f"anyone who can reach this port spends your Gemini quota",
+              file=sys.stderr)
+
+    engine = TranspilerEngine()
+    router.load(engine.user_data_dir / 'router_state.json')
+
+    client, quotas = None, None
+    if args.fake_llm is not None:
+        from src.core.llm_transport import FakeClient, ModelBehavior
+        client = FakeClient(default=ModelBehavior(latency=args.fake_llm))
+        # Free-tier quotas would make any load test measure the throttle
+        quotas = {m: (10 ** 6, 10 ** 9) for m in MODEL_PRIORITIES}
+    elif args.api_key or security.get_api_key():
+        try:
+            client = create_client(args.api_key or security.get_api_key())
+        except LLMError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 2
+
+    poller = ConfigPoller(engine) if args.watch_config else None
+    if poller:
+        poller.start()
+    try:
+        asyncio.run(serve(args, engine, client, quotas))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if poller:
+            poller.stop()
+        router.save(force=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+import time
+
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QLineEdit, QListWidget,
+                             QListWidgetItem)
+
+from src.core.history import GenerationHistory
+
+
+class HistoryPanel(QWidget):
+    """
+    Searchable list of past results (FTS over input + tags). Double click
+    or Enter emits `restore` with the HistoryEntry - no Gemini call.
+    """
+    restore = pyqtSignal(object)
+
+    LIMIT = 100
+
+    def __init__(self, history: GenerationHistory, parent=None):
+        super().__init__(parent)
+        self.history = history
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(4, 4, 4, 4)
+
+        self.search = QLineEdit()
+        self.search.setPlaceholderText("Search history (e.g. рыжая forest)")
+        self.search.setClearButtonEnabled(True)
+        layout.addWidget(self.search)
+
+        self.list = QListWidget()
+        self.list.itemActivated.connect(self._on_activated)
+        layout.addWidget(self.list)
+
+        # One query per pause in typing, not per keystroke
+        self._debounce = QTimer(self)
+        self._debounce.setSingleShot(True)
+        self._debounce.setInterval(150)
+        self._debounce.timeout.connect(self.refresh)
+        self.search.textChanged.connect(self._debounce.start)
+        self.search.returnPressed.connect(self._restore_first)
+
+    def refresh(self):
+        self.list.clear()
+        for entry in self.history.search(self.search.text(), self.LIMIT):
+            stamp = time.strftime("%d.%m %H:%M", time.localtime(entry.created))
+            text = " ".join(entry.user_input.split())
+            if len(text) > 60:
+                text = text[:57] + "..."
+            item = QListWidgetItem(
+                f"{stamp}  [{entry.result.style_used}]  {text}")
+            item.setToolTip(entry.result.positive_prompt)
+            item.setData(Qt.ItemDataRole.UserRole, entry)
+            self.list.addItem(item)
+
+    def _on_activated(self, item: QListWidgetItem):
+        self.restore.emit(item.data(Qt.ItemDataRole.UserRole))
+
+    def _restore_first(self):
+        self._debounce.stop()
+        self.refresh()
+        if self.list.count():
+            self._on_activated(self.list.item(0))
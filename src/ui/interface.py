@@ -1,15 +1,102 @@
-import pyperclip
-from PyQt6.QtCore import Qt, QTimer
+import time
+
+from PyQt6.QtCore import (Qt, QTimer, QFileSystemWatcher, QThread,
+                          pyqtSignal)
 from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                              QTextEdit, QPushButton, QComboBox, QCheckBox,
-                             QLabel, QInputDialog, QLineEdit, QMessageBox)
+                             QLabel, QInputDialog, QLineEdit, QMessageBox,
+                             QDockWidget)
 
 from src.core.config_loader import config_manager
-from src.core.generator import engine
-from src.core.llm_worker import GeminiWorker
+from src.core.metrics import CANCELLED, DRAFT, OK, metrics
+from src.core.startup_profiler import span
+
+
+class _BackgroundLoader(QThread):
+    """
+    Everything the window does not need to paint: style library, GenAI SDK
+    import, caches and the API key. Runs right after the window is shown.
+    """
+    loaded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def run(self):
+        try:
+            self.loaded.emit(self._load())
+        except Exception as e:
+            self.failed.emit(f"{type(e).__name__}: {e}")
+
+    def _load(self) -> dict:
+        from src.core.generator import get_engine
+
+        with span("engine (styles.json)"):
+            engine = get_engine()
+        with span("google.genai + worker"):
+            from src.core.llm_client import router
+            from src.core.llm_worker import GeminiWorker  # noqa: F401
+            import src.core.prefetch  # noqa: F401
+        with span("response cache"):
+            cache = _open_response_cache(engine.user_data_dir)
+        with span("similar cache"):
+            similar = _open_similar_index(engine.user_data_dir)
+        with span("phrase table"):
+            from src.core.phrase_expander import PHRASE_TABLE, PhraseExpander
+            expander = PhraseExpander(engine.data_file(PHRASE_TABLE))
+        with span("tag vocabulary"):
+            vocab = _open_tag_vocab(engine.user_data_dir)
+        with span("history"):
+            history = _open_history(engine.user_data_dir)
+        with span("router state"):
+            router.load(engine.user_data_dir / 'router_state.json')
+        with span("api key"):
+            api_key = config_manager.get_api_key()
+
+        return {"engine": engine, "cache": cache, "similar": similar,
+                "expander": expander, "vocab": vocab,
+                "history": history, "api_key": api_key}
+
+
+def _open_response_cache(user_data_dir):
+    from src.core.response_cache import ResponseCache
+    try:
+        return ResponseCache(user_data_dir / 'response_cache.sqlite3')
+    except Exception as e:
+        print(f"Warning: Response cache disabled: {e}")
+        return None
+
+
+def _open_history(user_data_dir):
+    from src.core.history import HISTORY_NAME, GenerationHistory
+    try:
+        return GenerationHistory(user_data_dir / HISTORY_NAME)
+    except Exception as e:
+        print(f"Warning: History disabled: {e}")
+        return None
+
+
+def _open_tag_vocab(user_data_dir):
+    from src.core.tag_vocab import open_vocab
+    try:
+        return open_vocab(user_data_dir)
+    except Exception as e:
+        print(f"Warning: Tag vocabulary disabled: {e}")
+        return None
+
+
+def _open_similar_index(user_data_dir):
+    from src.core.similar_cache import SimilarIndex
+    try:
+        return SimilarIndex(user_data_dir / 'similar_cache.sqlite3',
+                            threshold=config_manager.get_similarity_threshold())
+    except Exception as e:
+        print(f"Warning: Near-duplicate cache disabled: {e}")
+        return None
 
 
 class TranspilerUI(QMainWindow):
+    # Background init finished, the app is fully usable
+    ready = pyqtSignal()
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("SD-Transpiler v2.1")
@@ -17,14 +104,70 @@ class TranspilerUI(QMainWindow):
         self.setMinimumSize(500, 480)
 
         self.copy_btns = []
-        self._ensure_api_key()
-        self._init_ui()
+        self.engine = None
+        self.worker = None
+        self.response_cache = None
+        self.similar_index = None
+        self.expander = None
+        self.vocab = None
+        self.completer = None
+        self.history = None
+        self.history_dock = None
+        self.prefetcher = None
+        self.prefetch_budget = None
+        self.multi_dialog = None
+        self.multi_worker = None
+        self._spec = None  # Speculation for the current input, if any
+        self.current_job = None
+        self.stream_preview = None
 
-    def _ensure_api_key(self):
-        key = config_manager.get_api_key()
-        if not key:
+        self._init_ui()
+        self.set_ready(False)
+
+        # Window paints first, heavy stuff loads behind it
+        self._loader = _BackgroundLoader()
+        self._loader.loaded.connect(self._on_loaded)
+        self._loader.failed.connect(self._on_load_failed)
+        QTimer.singleShot(0, self._loader.start)
+
+    def _on_loaded(self, payload):
+        self.engine = payload["engine"]
+        self.response_cache = payload["cache"]
+        self.similar_index = payload["similar"]
+        self.expander = payload["expander"]
+        self.vocab = payload["vocab"]
+        self.history = payload["history"]
+        self._init_history()
+        if self.vocab is not None:
+            from src.ui.tag_completer import TagCompleter
+            self.completer = TagCompleter(self.input_text, self.vocab)
+        self.draft_check.setToolTip(
+            f"Offline draft from the phrase table, no Gemini call\n"
+            f"{len(self.expander)} phrases: {self.expander.path}"
+            + (f"\n⚠ {self.expander.error}" if self.expander.error else ""))
+
+        self.refresh_styles()
+        self.cache_check.setEnabled(self.response_cache is not None)
+        self.fuzzy_check.setEnabled(self.similar_index is not None)
+        self._update_cache_tooltip()
+
+        self._init_worker(payload["api_key"])
+        self._init_config_watcher()
+        self.set_ready(True)
+        self.ready.emit()
+
+        if not payload["api_key"]:
             self.prompt_api_key()
 
+    def _on_load_failed(self, err_msg):
+        self.btn_convert.setText("⚠ STARTUP FAILED")
+        QMessageBox.critical(self, "Startup Error", err_msg)
+
+    def set_ready(self, ready: bool):
+        self.btn_convert.setEnabled(ready)
+        self.btn_convert.setText(
+            "✨ GENERATE PROMPTS" if ready else "⏳ LOADING...")
+
     def prompt_api_key(self):
         key, ok = QInputDialog.getText(
             self, "API Setup",
@@ -33,9 +176,177 @@ class TranspilerUI(QMainWindow):
         )
         if ok and key.strip():
             config_manager.save_api_key(key.strip())
+            if self.worker is not None:
+                self.worker.warm_up(key.strip())
         elif ok and not key.strip():
             QMessageBox.warning(self, "Warning", "API Key is required.")
 
+    def _init_worker(self, api_key: str):
+        from src.core.llm_worker import GeminiWorker
+
+        # One thread + one pooled client for the whole session
+        autocorrect = config_manager.get_vocab_autocorrect()
+        self.worker = GeminiWorker(cache=self.response_cache,
+                                   similar=self.similar_index,
+                                   expander=self.expander,
+                                   vocab=self.vocab,
+                                   autocorrect=autocorrect)
+        self.worker.job_chunk.connect(self.on_chunk)
+        self.worker.job_finished.connect(self.on_success)
+        self.worker.job_failed.connect(self.on_error)
+        self.worker.job_draft.connect(self.on_draft)
+        self.worker.start()
+        self.worker.warm_up(api_key)
+
+        # Speculative requests get their own thread: an in-flight prefetch
+        # never holds up an explicit click
+        from src.core.llm_client import router
+        from src.core.prefetch import DEBOUNCE_MS, PrefetchBudget
+        self._prefetch_timer.setInterval(DEBOUNCE_MS)
+        self.prefetcher = GeminiWorker(cache=self.response_cache,
+                                       vocab=self.vocab,
+                                       trace_kind="prefetch",
+                                       autocorrect=autocorrect)
+        self.prefetcher.job_finished.connect(self._on_prefetched)
+        self.prefetcher.job_failed.connect(self._on_prefetch_failed)
+        self.prefetcher.start()
+        self.prefetch_budget = PrefetchBudget(
+            config_manager.get_prefetch_per_minute(), router=router)
+        self.prefetch_check.setEnabled(self.prefetch_budget.enabled)
+        self._update_prefetch_tooltip()
+        self.multi_btn.setEnabled(True)
+
+    def _init_history(self):
+        if self.history is None:
+            self.history_btn.setToolTip("History unavailable")
+            return
+        from src.ui.history_panel import HistoryPanel
+
+        panel = HistoryPanel(self.history)
+        panel.restore.connect(self.restore_entry)
+        self.history_dock = QDockWidget("History", self)
+        self.history_dock.setWidget(panel)
+        self.history_dock.setAllowedAreas(
+            Qt.DockWidgetArea.LeftDockWidgetArea |
+            Qt.DockWidgetArea.RightDockWidgetArea)
+        self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea,
+                           self.history_dock)
+        self.history_dock.hide()
+        self.history_btn.setEnabled(True)
+
+    def open_multi_style(self):
+        if self.multi_dialog is None:
+            from src.core.llm_worker import GeminiWorker
+            from src.ui.multi_style import MultiStyleDialog
+
+            # Own thread, so the dialog never races the main window for
+            # job ids and traces
+            self.multi_worker = GeminiWorker(
+                cache=self.response_cache, similar=self.similar_index,
+                expander=self.expander, vocab=self.vocab, trace_kind="multi",
+                autocorrect=config_manager.get_vocab_autocorrect())
+            self.multi_worker.start()
+            self.multi_dialog = MultiStyleDialog(self, self.engine,
+                                                 self.multi_worker)
+            # Start with the style picked in the main window
+            current = self.style_selector.currentText()
+            for item in self.multi_dialog.style_list.findItems(
+                    current, Qt.MatchFlag.MatchExactly):
+                item.setCheckState(Qt.CheckState.Checked)
+        self.multi_dialog.show()
+        self.multi_dialog.raise_()
+
+    def toggle_history(self):
+        if self.history_dock.isVisible():
+            self.history_dock.hide()
+            return
+        self.history.flush(timeout=1.0)  # include the result just shown
+        self.history_dock.widget().refresh()
+        self.history_dock.show()
+        self.history_dock.widget().search.setFocus()
+
+    def restore_entry(self, entry):
+        """Past result back on screen, no API call."""
+        if self.current_job is not None:
+            return
+        key = entry.style_key
+        if key not in self.engine.styles:
+            # Older rows only have the display name
+            key = next((k for k, style in self.engine.styles.items()
+                        if style.name == entry.result.style_used), None)
+        # Restoring is not typing: no speculative request for this text
+        self._prefetch_timer.stop()
+        self._drop_speculation()
+        self.input_text.blockSignals(True)
+        self.style_selector.blockSignals(True)
+        self.input_text.setPlainText(entry.user_input)
+        if key is not None and self.style_selector.findText(key) >= 0:
+            self.style_selector.setCurrentText(key)
+        self.style_selector.blockSignals(False)
+        self.input_text.blockSignals(False)
+        self.nsfw_check.setChecked(entry.nsfw)
+        self.out_pos.setPlainText(entry.result.positive_prompt)
+        self.out_neg.setPlainText(entry.result.negative_prompt)
+        self.latency_label.setText(
+            "Restored from history: " +
+            time.strftime("%d.%m.%Y %H:%M", time.localtime(entry.created)))
+
+    def _init_config_watcher(self):
+        # Editors often replace the file, so paths are re-added on each change
+        self.config_watcher = QFileSystemWatcher(self)
+        self._watch_config_files()
+        self._reload_timer = QTimer(self)
+        self._reload_timer.setSingleShot(True)
+        self._reload_timer.setInterval(300)  # debounce partial saves
+        self._reload_timer.timeout.connect(self.reload_config)
+        self.config_watcher.fileChanged.connect(self._reload_timer.start)
+        self.config_watcher.directoryChanged.connect(self._reload_timer.start)
+
+    def _watch_config_files(self):
+        paths = [str(p) for p in self.engine.config_paths() if p.exists()]
+        paths.append(str(self.engine.user_data_dir))
+        current = set(self.config_watcher.files()) | set(
+            self.config_watcher.directories())
+        missing = [p for p in paths if p not in current]
+        if missing:
+            self.config_watcher.addPaths(missing)
+
+    def reload_config(self):
+        self._watch_config_files()
+        if self.engine.reload():
+            self.refresh_styles()
+
+    def refresh_styles(self):
+        current = self.style_selector.currentText()
+        self.style_selector.blockSignals(True)
+        self.style_selector.clear()
+        self.style_selector.addItems(self.engine.get_style_names())
+        if current in self.engine.styles:
+            self.style_selector.setCurrentText(current)
+        self.style_selector.blockSignals(False)
+        if self.multi_dialog is not None:
+            self.multi_dialog.refresh_styles()
+
+    def closeEvent(self, event):
+        if self.worker is not None:
+            self.worker.stop()
+            from src.core.llm_client import router
+            router.save(force=True)
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
+        if self.multi_worker is not None:
+            self.multi_worker.stop()
+        if self.history is not None:
+            self.history.close()  # flushes queued writes
+        if self.engine is not None and metrics.recent_traces:
+            # Session metrics for offline analysis / a Prometheus textfile
+            try:
+                metrics.dump(self.engine.user_data_dir / 'metrics.json')
+                metrics.dump(self.engine.user_data_dir / 'metrics.prom')
+            except OSError as e:
+                print(f"Warning: Could not write metrics: {e}")
+        super().closeEvent(event)
+
     def _init_ui(self):
         central = QWidget()
         self.setCentralWidget(central)
@@ -48,8 +359,7 @@ class TranspilerUI(QMainWindow):
         top_row = QHBoxLayout()
 
         top_row.addWidget(QLabel("Style:"))
-        self.style_selector = QComboBox()
-        self.style_selector.addItems(engine.get_style_names())
+        self.style_selector = QComboBox()  # filled once styles are loaded
         self.style_selector.setMinimumWidth(200)
         self.style_selector.setSizeAdjustPolicy(
             QComboBox.SizeAdjustPolicy.AdjustToContents)
@@ -61,6 +371,48 @@ class TranspilerUI(QMainWindow):
         self.nsfw_check = QCheckBox("NSFW Mode")
         top_row.addWidget(self.nsfw_check)
 
+        # Unchecked = always ask Gemini (fresh answer still goes to cache)
+        self.cache_check = QCheckBox("Cache")
+        self.cache_check.setChecked(True)
+        top_row.addWidget(self.cache_check)
+
+        # Reuse the answer to an almost identical request (re-asked quietly)
+        self.fuzzy_check = QCheckBox("Fuzzy")
+        self.fuzzy_check.setChecked(True)
+        top_row.addWidget(self.fuzzy_check)
+
+        # Show tags while Gemini is still typing
+        self.stream_check = QCheckBox("Stream")
+        self.stream_check.setChecked(True)
+        top_row.addWidget(self.stream_check)
+
+        # Instant local tags (phrase table) - also the fallback on 429
+        self.draft_check = QCheckBox("Draft")
+        top_row.addWidget(self.draft_check)
+
+        # Ask Gemini in the background once typing pauses
+        self.prefetch_check = QCheckBox("Prefetch")
+        self.prefetch_check.setChecked(config_manager.get_prefetch_enabled())
+        self.prefetch_check.setEnabled(False)  # until the worker is up
+        self.prefetch_check.toggled.connect(self._on_prefetch_toggled)
+        top_row.addWidget(self.prefetch_check)
+
+        self.history_btn = QPushButton("🕘")
+        self.history_btn.setFixedSize(42, 32)
+        self.history_btn.setStyleSheet("font-size: 16px; padding-bottom: 2px;")
+        self.history_btn.setToolTip("History (restores without calling Gemini)")
+        self.history_btn.setEnabled(False)
+        self.history_btn.clicked.connect(self.toggle_history)
+        top_row.addWidget(self.history_btn)
+
+        self.multi_btn = QPushButton("🎨")
+        self.multi_btn.setFixedSize(42, 32)
+        self.multi_btn.setStyleSheet("font-size: 16px; padding-bottom: 2px;")
+        self.multi_btn.setToolTip("Multi-style: one Gemini call, many styles")
+        self.multi_btn.setEnabled(False)
+        self.multi_btn.clicked.connect(self.open_multi_style)
+        top_row.addWidget(self.multi_btn)
+
         settings_btn = QPushButton("⚙")
         settings_btn.setFixedSize(42, 32)
         settings_btn.setStyleSheet("font-size: 16px; padding-bottom: 2px;")
@@ -76,6 +428,14 @@ class TranspilerUI(QMainWindow):
         self.input_text.setMinimumHeight(80)
         layout.addWidget(self.input_text)
 
+        # Interval is set in _init_worker: src.core.prefetch pulls in the
+        # dispatcher and google.genai, which must stay off the first paint
+        self._prefetch_timer = QTimer(self)
+        self._prefetch_timer.setSingleShot(True)
+        self._prefetch_timer.timeout.connect(self._speculate)
+        self.input_text.textChanged.connect(self._on_input_edited)
+        self.style_selector.currentTextChanged.connect(self._on_input_edited)
+
         # --- 3. Action Button ---
         self.btn_convert = QPushButton("✨ GENERATE PROMPTS")
         self.btn_convert.setFixedHeight(45)
@@ -94,6 +454,12 @@ class TranspilerUI(QMainWindow):
         self.out_neg = self._build_output_block(layout, "Negative Prompt:", 60,
                                                 is_negative=True)
 
+        # --- 5. Status ---
+        self.latency_label = QLabel("Last: —   p95: —")
+        self.latency_label.setStyleSheet("color: #94a3b8; font-size: 11px;")
+        self.latency_label.setAlignment(Qt.AlignmentFlag.AlignRight)
+        layout.addWidget(self.latency_label)
+
     def _build_output_block(self, parent_layout, label_text, height,
                             is_negative=False):
         container = QVBoxLayout()
@@ -138,6 +504,7 @@ class TranspilerUI(QMainWindow):
 
     def handle_copy(self, text, btn):
         if not text: return
+        import pyperclip
         pyperclip.copy(text)
         orig = btn.text()
         btn.setText("OK")
@@ -146,38 +513,285 @@ class TranspilerUI(QMainWindow):
                           lambda: [btn.setText(orig), btn.setEnabled(True)])
 
     def start_conversion(self):
+        if self.current_job is not None:
+            # Second click while working = cancel
+            if self.current_job < 0:  # adopted speculation
+                self.prefetcher.cancel(-self.current_job)
+                self._spec = None
+            else:
+                self.worker.cancel(self.current_job)
+            self.current_job = None
+            self.set_loading(False)
+            return
+
         user_text = self.input_text.toPlainText().strip()
         if not user_text:
             self.input_text.setFocus()
             return
 
+        if self.draft_check.isChecked():
+            self._run_draft(user_text)
+            return
+
         api_key = config_manager.get_api_key()
         if not api_key:
             self.prompt_api_key()
             return
 
+        if self._use_speculation(user_text):
+            return
+
         self.set_loading(True)
-        self.worker = GeminiWorker(api_key, user_text,
-                                   self.style_selector.currentText())
-        self.worker.finished.connect(self.on_success)
-        self.worker.error.connect(self.on_error)
-        self.worker.start()
+        stream = self.stream_check.isChecked()
+        self.stream_preview = self.engine.stream(
+            self.style_selector.currentText(),
+            self.nsfw_check.isChecked()) if stream else None
+        self.current_job = self.worker.submit(
+            api_key, user_text, self.style_selector.currentText(),
+            use_cache=self.cache_check.isChecked(), stream=stream,
+            use_similar=self.fuzzy_check.isChecked())
+
+    # --- Speculative prefetch ---
+    def _on_prefetch_toggled(self, enabled: bool):
+        config_manager.set_prefetch_enabled(enabled)
+        if not enabled:
+            self._prefetch_timer.stop()
+            self._drop_speculation()
+
+    def _on_input_edited(self):
+        if self.prefetcher is None or not self.prefetch_budget.enabled \
+                or not self.prefetch_check.isChecked() \
+                or self.current_job is not None:
+            return
+        self._drop_speculation()  # stale as soon as the text changes
+        self._prefetch_timer.start()
+
+    def _drop_speculation(self):
+        spec = self._spec
+        if spec is None or spec.adopted:
+            return
+        if spec.tags is None:
+            self.prefetcher.cancel(spec.job_id)
+        self._spec = None
+
+    def _speculate(self):
+        from src.core.llm_client import is_cached
+        from src.core.prefetch import MIN_CHARS, Speculation, speculation_key
+
+        user_text = self.input_text.toPlainText().strip()
+        style = self.style_selector.currentText()
+        if len(user_text) < MIN_CHARS or self.current_job is not None \
+                or self.draft_check.isChecked() \
+                or not self.prefetch_budget.enabled:
+            return
+        key = speculation_key(user_text, style)
+        if self._spec is not None and self._spec.key == key:
+            return
+        api_key = config_manager.get_api_key()
+        # A cached answer is already instant - nothing to spend on
+        if not api_key or is_cached(self.response_cache, user_text, style):
+            return
+        if self.prefetch_budget.try_spend():
+            # Streamed, so a cancel stops reading at the next chunk
+            job_id = self.prefetcher.submit(api_key, user_text, style,
+                                            stream=True, use_similar=False)
+            self._spec = Speculation(key, job_id)
+        self._update_prefetch_tooltip()
+
+    def _use_speculation(self, user_text: str) -> bool:
+        """Click on text that was prefetched: ready answer or adopt it."""
+        from src.core.prefetch import speculation_key
+
+        spec = self._spec
+        key = speculation_key(user_text, self.style_selector.currentText())
+        if spec is None or spec.key != key:
+            self._drop_speculation()
+            return False
+
+        self.prefetch_budget.hits += 1
+        self._update_prefetch_tooltip()
+        trace = metrics.trace()
+        if spec.tags is not None:
+            self._spec = None
+            trace.add_span("prefetch", 0.0, "hit")
+            self._show_result(spec.tags, trace, source="gemini")
+            self._update_latency()
+            return True
+
+        # Still in flight: its answer becomes the answer to this click
+        spec.adopted = True
+        spec.trace = trace
+        self.current_job = -spec.job_id
+        self.stream_preview = None
+        self.set_loading(True)
+        return True
+
+    def _on_prefetched(self, job_id, tags):
+        prefetch_trace = self.prefetcher.pop_trace(job_id)
+        spec = self._spec
+        if spec is None or spec.job_id != job_id:
+            if prefetch_trace is not None:
+                prefetch_trace.finish(CANCELLED)
+            return
+        if prefetch_trace is not None:
+            prefetch_trace.finish()
+        if not spec.adopted:
+            spec.tags = tags
+            return
+
+        self._spec = None
+        self.current_job = None
+        spec.trace.add_span("prefetch",
+                            time.perf_counter() - spec.trace.started,
+                            "adopted", 0.0)
+        self._show_result(tags, spec.trace, source="gemini")
+        self._update_cache_tooltip()
+        self._update_latency()
+        self.set_loading(False)
+
+    def _on_prefetch_failed(self, job_id, err_msg):
+        spec = self._spec
+        if spec is None or spec.job_id != job_id:
+            return
+        self._spec = None
+        print(f"Prefetch failed: {err_msg}")
+        if spec.adopted:
+            # Let the explicit path retry (router, fallback draft, errors)
+            self.current_job = None
+            self.set_loading(False)
+            self.start_conversion()
+
+    def _update_prefetch_tooltip(self):
+        if self.prefetch_budget is None:
+            return
+        if not self.prefetch_budget.enabled:
+            self.prefetch_check.setToolTip(
+                "Prefetch is off: prefetch_per_minute is 0")
+            return
+        stats = self.prefetch_budget.stats()
+        self.prefetch_check.setToolTip(
+            f"Send the request in the background once typing pauses\n"
+            f"Budget: {config_manager.get_prefetch_per_minute():g}/min, "
+            f"paused after a 429\n"
+            f"Spent: {stats['spent']}  Denied: {stats['denied']}  "
+            f"Used: {stats['hits']}")
 
     def set_loading(self, loading: bool):
-        self.btn_convert.setEnabled(not loading)
         self.btn_convert.setText(
-            "⏳ WORKING..." if loading else "✨ GENERATE PROMPTS")
+            "⏳ WORKING... (click to cancel)" if loading
+            else "✨ GENERATE PROMPTS")
         self.input_text.setReadOnly(loading)
 
-    def on_success(self, ai_tags):
-        result = engine.process(ai_tags, self.style_selector.currentText(),
-                                self.nsfw_check.isChecked())
-        self.out_pos.setPlainText(result.positive_prompt)
-        self.out_neg.setPlainText(result.negative_prompt)
+    def on_chunk(self, job_id, text):
+        if job_id != self.current_job or self.stream_preview is None:
+            return
+        preview = self.stream_preview
+        first = not preview.text()
+        if preview.feed(text) or first:
+            self.out_pos.setPlainText(preview.positive_prompt)
+        if first:
+            self.out_neg.setPlainText(preview.negative_prompt)
+
+    def on_success(self, job_id, ai_tags):
+        trace = self.worker.pop_trace(job_id)
+        if job_id != self.current_job:
+            if trace is not None:
+                trace.finish(CANCELLED)
+            return  # cancelled or superseded
+        self.current_job = None
+        self.stream_preview = None
+        self._show_result(ai_tags, trace or metrics.trace(), source="gemini")
+        self._update_cache_tooltip()
+        self._update_latency()
         self.set_loading(False)
 
-    def on_error(self, err_msg):
+    def on_draft(self, job_id, tags, err_msg):
+        """All models failed: the worker answered from the phrase table."""
+        trace = self.worker.pop_trace(job_id)
+        if job_id != self.current_job:
+            if trace is not None:
+                trace.finish(CANCELLED)
+            return
+        self.current_job = None
+        self.stream_preview = None
+        self._show_result(tags, trace or metrics.trace(), DRAFT,
+                          source="offline")
+        self._update_latency()
+        self.latency_label.setText(f"⚠ Offline draft — {err_msg}")
+        self.set_loading(False)
+        if "API Key" in err_msg:
+            self.prompt_api_key()
+
+    def _run_draft(self, user_text: str):
+        trace = metrics.trace("draft")
+        with trace.span("phrase_table"):
+            tags = self.expander.expand(user_text)
+        self._show_result(tags, trace, source="draft")
+        self.latency_label.setText(
+            f"Draft: {trace.total * 1000:.1f} ms (phrase table, offline)"
+            + (" ⚠ table not loaded" if self.expander.error else ""))
+        self.latency_label.setToolTip(self.expander.error or "\n".join(
+            f"{text} → {tags}" for text, tags in
+            self.expander.matches(user_text)) or "No known phrases")
+
+    def _show_result(self, tags: str, trace, outcome: str = OK,
+                     source: str = "gemini"):
+        nsfw = self.nsfw_check.isChecked()
+        style_key = self.style_selector.currentText()
+        with trace.span("engine.process"):
+            result = self.engine.process(tags, style_key, nsfw)
+        trace.finish(outcome)
+        self.out_pos.setPlainText(result.positive_prompt)
+        self.out_neg.setPlainText(result.negative_prompt)
+        # Style's max_chunks cut some user tags: say which
+        self.out_pos.setToolTip(
+            f"Over the CLIP chunk budget, left out:\n"
+            f"{', '.join(result.trimmed)}" if result.trimmed else "")
+        if self.history is not None:
+            self.history.add(self.input_text.toPlainText().strip(), nsfw,
+                             result, source, style_key)
+
+    def _update_latency(self):
+        last, p95 = metrics.latency()
+        if last is None:
+            return
+        self.latency_label.setText(f"Last: {last:.1f}s   p95: {p95:.1f}s")
+        trace = metrics.last.get("interactive")
+        lines = [trace.summary().replace(" | ", "\n  ")] if trace else []
+        for model, stats in metrics.to_dict()["models"].items():
+            outcomes = ", ".join(f"{k} {v}"
+                                 for k, v in stats["outcomes"].items())
+            lines.append(f"{model}: p50 {stats['p50']:.1f}s  "
+                         f"p95 {stats['p95']:.1f}s  ({outcomes})")
+        self.latency_label.setToolTip("\n".join(lines))
+
+    def _update_cache_tooltip(self):
+        if self.response_cache is None:
+            self.cache_check.setToolTip("Response cache unavailable")
+        else:
+            stats = self.response_cache.stats()
+            self.cache_check.setToolTip(
+                f"Reuse previous Gemini answers\n"
+                f"Hits: {stats['hits']}  Misses: {stats['misses']}  "
+                f"Entries: {stats['entries']}")
+
+        if self.similar_index is None:
+            self.fuzzy_check.setToolTip("Near-duplicate cache unavailable")
+            return
+        stats = self.similar_index.stats()
+        self.fuzzy_check.setToolTip(
+            f"Answer near-identical requests from earlier ones "
+            f"(similarity >= {self.similar_index.threshold:.2f})\n"
+            f"Hits: {stats['hits']}  Misses: {stats['misses']}  "
+            f"Entries: {stats['entries']}")
+
+    def on_error(self, job_id, err_msg):
+        if job_id != self.current_job:
+            return
+        self.current_job = None
+        self.stream_preview = None
         self.set_loading(False)
+        self._update_latency()
         QMessageBox.critical(self, "Error", err_msg)
         if "API Key" in err_msg:
             self.prompt_api_key()
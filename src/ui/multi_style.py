@@ -0,0 +1,317 @@
+import csv
+import json
+import time
+from pathlib import Path
+from typing import List
+
+from PyQt6.QtCore import (Qt, QThread, QAbstractTableModel, QModelIndex,
+                          pyqtSignal)
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QListWidget,
+                             QListWidgetItem, QLineEdit, QPushButton, QLabel,
+                             QTableView, QHeaderView, QFileDialog,
+                             QMessageBox, QSplitter, QWidget, QAbstractItemView)
+
+from src.core.generator import GenerationResult, TranspilerEngine
+from src.core.metrics import DRAFT, OK
+
+
+class _FanOut(QThread):
+    """engine.process_styles off the UI thread (20k styles take seconds)."""
+    done = pyqtSignal(object, float)
+    failed = pyqtSignal(str)
+
+    def __init__(self, engine: TranspilerEngine, tags: str,
+                 names: List[str], nsfw: bool):
+        super().__init__()
+        self.engine = engine
+        self.tags = tags
+        self.names = names
+        self.nsfw = nsfw
+
+    def run(self):
+        started = time.perf_counter()
+        try:
+            results = self.engine.process_styles(self.tags, self.names,
+                                                 self.nsfw)
+        except Exception as e:
+            # e.g. a worker process died or a style broke after a reload
+            self.failed.emit(f"{type(e).__name__}: {e}")
+            return
+        self.done.emit(results, time.perf_counter() - started)
+
+
+class _ResultsModel(QAbstractTableModel):
+    """Table over a plain list - cheap even for the whole style library."""
+    HEADERS = ("Style", "Positive", "Negative")
+
+    def __init__(self):
+        super().__init__()
+        self.results: List[GenerationResult] = []
+
+    def set_results(self, results: List[GenerationResult]):
+        self.beginResetModel()
+        self.results = results
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.results)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if role not in (Qt.ItemDataRole.DisplayRole,
+                        Qt.ItemDataRole.ToolTipRole):
+            return None
+        r = self.results[index.row()]
+        return (r.style_used, r.positive_prompt,
+                r.negative_prompt)[index.column()]
+
+    def headerData(self, section, orientation,
+                   role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and \
+                orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+
+def export_results(path: Path, user_input: str,
+                   results: List[GenerationResult]) -> None:
+    """*.csv -> one row per style, anything else -> JSON list."""
+    rows = [{"input": user_input, **r.model_dump()} for r in results]
+    if path.suffix.lower() == ".csv":
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows
+                                    else ["input"])
+            writer.writeheader()
+            for row in rows:
+                writer.writerow({k: json.dumps(v, ensure_ascii=False)
+                                 if isinstance(v, (list, dict)) else v
+                                 for k, v in row.items()})
+    else:
+        path.write_text(json.dumps(rows, ensure_ascii=False, indent=2),
+                        encoding='utf-8')
+
+
+class MultiStyleDialog(QDialog):
+    """
+    Same idea for many styles: one style-neutral Gemini call, then every
+    checked style is applied locally (TranspilerEngine.process_styles).
+    """
+
+    def __init__(self, parent, engine: TranspilerEngine, worker):
+        super().__init__(parent)
+        self.setWindowTitle("Multi-style")
+        self.resize(900, 560)
+        self.engine = engine
+        self.worker = worker
+        self.job_id = None
+        self.user_input = ""
+        self._fanout = None
+        self._note = ""
+
+        worker.job_finished.connect(self._on_tags)
+        worker.job_draft.connect(
+            lambda job_id, tags, err: self._on_tags(job_id, tags, err))
+        worker.job_failed.connect(self._on_failed)
+
+        layout = QVBoxLayout(self)
+        splitter = QSplitter(Qt.Orientation.Horizontal)
+        layout.addWidget(splitter)
+
+        # --- Style picker ---
+        left = QWidget()
+        left_layout = QVBoxLayout(left)
+        left_layout.setContentsMargins(0, 0, 0, 0)
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText("Filter styles...")
+        self.filter_edit.textChanged.connect(self._apply_filter)
+        left_layout.addWidget(self.filter_edit)
+        self.style_list = QListWidget()
+        self.style_list.itemChanged.connect(self._update_count)
+        left_layout.addWidget(self.style_list)
+        row = QHBoxLayout()
+        for text, checked in (("All", True), ("None", False)):
+            btn = QPushButton(text)
+            btn.clicked.connect(lambda _, c=checked: self._check_visible(c))
+            row.addWidget(btn)
+        left_layout.addLayout(row)
+        splitter.addWidget(left)
+
+        # --- Results ---
+        right = QWidget()
+        right_layout = QVBoxLayout(right)
+        right_layout.setContentsMargins(0, 0, 0, 0)
+        self.btn_generate = QPushButton()
+        self.btn_generate.setFixedHeight(36)
+        self.btn_generate.clicked.connect(self.generate)
+        right_layout.addWidget(self.btn_generate)
+
+        self.model = _ResultsModel()
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setSelectionBehavior(
+            QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setWordWrap(False)
+        header = self.table.horizontalHeader()
+        header.setSectionResizeMode(0, QHeaderView.ResizeMode.ResizeToContents)
+        header.setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        header.setSectionResizeMode(2, QHeaderView.ResizeMode.Interactive)
+        self.table.doubleClicked.connect(self._copy_cell)
+        right_layout.addWidget(self.table)
+
+        bottom = QHBoxLayout()
+        self.status = QLabel("")
+        self.status.setStyleSheet("color: #94a3b8; font-size: 11px;")
+        bottom.addWidget(self.status)
+        bottom.addStretch()
+        for text, slot in (("Copy positive", lambda: self._copy_selected(1)),
+                           ("Copy negative", lambda: self._copy_selected(2)),
+                           ("Export...", self.export)):
+            btn = QPushButton(text)
+            btn.clicked.connect(slot)
+            bottom.addWidget(btn)
+        right_layout.addLayout(bottom)
+        splitter.addWidget(right)
+        splitter.setSizes([260, 640])
+
+        self.refresh_styles()
+
+    # --- Styles ---
+    def refresh_styles(self):
+        checked = set(self.checked_styles())
+        self.style_list.blockSignals(True)
+        self.style_list.clear()
+        for name in self.engine.get_style_names():
+            item = QListWidgetItem(name)
+            item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+            item.setCheckState(Qt.CheckState.Checked if name in checked
+                               else Qt.CheckState.Unchecked)
+            self.style_list.addItem(item)
+        self.style_list.blockSignals(False)
+        self._apply_filter(self.filter_edit.text())
+        self._update_count()
+
+    def checked_styles(self) -> List[str]:
+        return [self.style_list.item(i).text()
+                for i in range(self.style_list.count())
+                if self.style_list.item(i).checkState()
+                == Qt.CheckState.Checked]
+
+    def _apply_filter(self, text: str):
+        text = text.strip().lower()
+        for i in range(self.style_list.count()):
+            item = self.style_list.item(i)
+            item.setHidden(bool(text) and text not in item.text().lower())
+
+    def _check_visible(self, checked: bool):
+        state = Qt.CheckState.Checked if checked else Qt.CheckState.Unchecked
+        self.style_list.blockSignals(True)
+        for i in range(self.style_list.count()):
+            item = self.style_list.item(i)
+            if not item.isHidden():
+                item.setCheckState(state)
+        self.style_list.blockSignals(False)
+        self._update_count()
+
+    def _update_count(self, *_):
+        busy = self.job_id is not None or self._fanout is not None
+        if not busy:
+            self.btn_generate.setText(
+                f"✨ GENERATE FOR {len(self.checked_styles())} STYLES")
+
+    # --- Run ---
+    def generate(self):
+        from src.core.config_loader import config_manager
+
+        parent = self.parent()
+        self.user_input = parent.input_text.toPlainText().strip()
+        names = self.checked_styles()
+        if not self.user_input or not names or self.job_id is not None:
+            return
+        api_key = config_manager.get_api_key()
+        if not api_key:
+            parent.prompt_api_key()
+            return
+        self.btn_generate.setText("⏳ ONE GEMINI CALL...")
+        self.btn_generate.setEnabled(False)
+        # style="" - one neutral expansion for all of them
+        self.job_id = self.worker.submit(
+            api_key, self.user_input, "",
+            use_cache=parent.cache_check.isChecked(),
+            use_similar=parent.fuzzy_check.isChecked())
+
+    def _on_tags(self, job_id, tags, note=""):
+        if job_id != self.job_id:
+            return
+        trace = self.worker.pop_trace(job_id)
+        if trace is not None:
+            trace.finish(DRAFT if note else OK)
+        self.job_id = None
+        names = self.checked_styles()
+        self.btn_generate.setText(f"⏳ APPLYING {len(names)} STYLES...")
+        self._note = f"offline draft ({note})" if note else ""
+        self._fanout = _FanOut(self.engine, tags, names,
+                               self.parent().nsfw_check.isChecked())
+        self._fanout.done.connect(self._on_results)
+        self._fanout.failed.connect(self._on_fanout_failed)
+        self._fanout.start()
+
+    def _on_failed(self, job_id, err_msg):
+        if job_id != self.job_id:
+            return
+        self.job_id = None
+        self.btn_generate.setEnabled(True)
+        self._update_count()
+        QMessageBox.critical(self, "Error", err_msg)
+
+    def _on_fanout_failed(self, err_msg):
+        self._fanout.wait()
+        self._fanout = None
+        self.btn_generate.setEnabled(True)
+        self._update_count()
+        QMessageBox.critical(self, "Error",
+                             f"Could not apply the styles: {err_msg}")
+
+    def _on_results(self, results, seconds):
+        self._fanout.wait()
+        self._fanout = None
+        self.model.set_results(results)
+        self.status.setText(
+            f"{len(results)} styles from 1 call, applied in "
+            f"{seconds * 1000:.0f} ms" +
+            (f" — {self._note}" if self._note else ""))
+        self.btn_generate.setEnabled(True)
+        self._update_count()
+
+    # --- Copy / export ---
+    def _copy_cell(self, index):
+        import pyperclip
+        pyperclip.copy(str(self.model.data(index)))
+        self.status.setText(f"Copied {self.model.HEADERS[index.column()]} "
+                            f"of {self.model.results[index.row()].style_used}")
+
+    def _copy_selected(self, column: int):
+        rows = self.table.selectionModel().selectedRows()
+        if not rows:
+            return
+        import pyperclip
+        pyperclip.copy("\n".join(
+            str(self.model.data(self.model.index(r.row(), column)))
+            for r in rows))
+        self.status.setText(f"Copied {len(rows)} row(s)")
+
+    def export(self):
+        if not self.model.results:
+            return
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export results", "multi_style.json",
+            "JSON (*.json);;CSV (*.csv)")
+        if not path:
+            return
+        try:
+            export_results(Path(path), self.user_input, self.model.results)
+            self.status.setText(f"Exported {len(self.model.results)} styles "
+                                f"to {path}")
+        except OSError as e:
+            QMessageBox.critical(self, "Export failed", str(e))
@@ -0,0 +1,84 @@
+from PyQt6.QtCore import QEvent, QStringListModel, Qt
+from PyQt6.QtWidgets import QCompleter, QTextEdit
+
+from src.core.tag_vocab import TagVocab
+
+
+class TagCompleter(QCompleter):
+    """
+    Danbooru tag autocomplete for a QTextEdit: completes the fragment after
+    the last comma, most popular tags first. Cyrillic text is left alone -
+    that's a description for Gemini, not tags.
+    """
+    MIN_PREFIX = 2
+    LIMIT = 8
+
+    def __init__(self, editor: QTextEdit, vocab: TagVocab):
+        super().__init__(editor)
+        self.editor = editor
+        self.vocab = vocab
+        self._fragment = ""
+        self._inserting = False
+
+        self._model = QStringListModel(self)
+        self.setModel(self._model)
+        self.setWidget(editor)
+        self.setCompletionMode(
+            QCompleter.CompletionMode.UnfilteredPopupCompletion)
+        self.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        self.activated[str].connect(self._insert)
+        editor.textChanged.connect(self._update)
+
+    def eventFilter(self, obj, event):
+        # QCompleter hands Enter to the editor first, which would insert a
+        # newline; a QTextEdit always accepts it, so take it here
+        if (obj is self.popup() and event.type() == QEvent.Type.KeyPress
+                and event.key() in (Qt.Key.Key_Return, Qt.Key.Key_Enter,
+                                    Qt.Key.Key_Tab)):
+            index = self.popup().currentIndex()
+            self.popup().hide()
+            if index.isValid():
+                self._insert(index.data())
+            return True
+        return super().eventFilter(obj, event)
+
+    def _current_fragment(self) -> str:
+        cursor = self.editor.textCursor()
+        before = self.editor.toPlainText()[:cursor.position()]
+        cut = max(before.rfind(','), before.rfind('\n'))
+        return before[cut + 1:].lstrip()
+
+    def _update(self):
+        if self._inserting or not self.editor.hasFocus():
+            return
+        fragment = self._current_fragment()
+        if len(fragment) < self.MIN_PREFIX or not fragment.isascii():
+            self.popup().hide()
+            return
+
+        found = [name for name, _ in self.vocab.complete(fragment,
+                                                         self.LIMIT)]
+        if not found or found == [fragment.lower()]:
+            self.popup().hide()
+            return
+
+        self._fragment = fragment
+        self._model.setStringList(found)
+        popup = self.popup()
+        rect = self.editor.cursorRect()
+        rect.setWidth(popup.sizeHintForColumn(0) +
+                      popup.verticalScrollBar().sizeHint().width())
+        self.complete(rect)
+        # Enter takes the top suggestion
+        popup.setCurrentIndex(self.completionModel().index(0, 0))
+
+    def _insert(self, tag: str):
+        cursor = self.editor.textCursor()
+        cursor.movePosition(cursor.MoveOperation.Left,
+                            cursor.MoveMode.KeepAnchor, len(self._fragment))
+        self._inserting = True
+        try:
+            cursor.insertText(f"{tag}, ")
+        finally:
+            self._inserting = False
+        self.editor.setTextCursor(cursor)
@@ -0,0 +1,16 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import pytest
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    """TranspilerEngine on a throwaway copy of the bundled configs."""
+    from src.core.generator import TranspilerEngine
+    monkeypatch.delenv("APPDATA", raising=False)
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path / "config"))
+    return TranspilerEngine()
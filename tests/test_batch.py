@@ -0,0 +1,115 @@
+import json
+
+from benchmarks.fake_genai import FakeClient, ModelBehavior
+from src import batch
+from src.batch import BatchRunner, iter_rows, load_done_rows
+from src.core import dispatcher
+from src.core.llm_client import MODEL_PRIORITIES
+from src.core.model_router import ModelRouter
+
+
+def write_input(path, texts):
+    with open(path, "w", encoding="utf-8") as f:
+        for text in texts:
+            f.write(json.dumps({"input": text}) + "\n")
+
+
+def records(path):
+    result = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result.append(json.loads(line))
+            except ValueError:
+                continue  # torn line
+    return result
+
+
+def run(engine, path, out_path, client=None):
+    runner = BatchRunner(engine, use_llm=False, report_every=60)
+    if client is not None:
+        runner.use_llm = True
+        runner.client = client
+    style = next(iter(engine.get_style_names()))
+    with batch._open_output(out_path) as out:
+        runner.run(iter_rows(path, "jsonl", style, False), out,
+                   skip=load_done_rows(out_path))
+    return runner
+
+
+def test_load_done_rows_skips_errors_and_torn_lines(tmp_path):
+    out = tmp_path / "out.jsonl"
+    out.write_text('{"row": 0, "positive_prompt": "a"}\n'
+                   '{"row": 1, "error": "429"}\n'
+                   '{"row": 2, "positive_prompt": "c"}\n'
+                   '{"row": 3, "posi', encoding="utf-8")
+    assert load_done_rows(out) == {0, 2}
+
+
+def test_resume_skips_finished_rows(engine, tmp_path):
+    src, out = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    write_input(src, ["1girl", "cat", "", "city at night"])
+    out.write_text('{"row": 1, "positive_prompt": "done before"}\n'
+                   '{"row": 3, "posi', encoding="utf-8")
+
+    runner = run(engine, src, out)
+    assert runner.processed == 2
+    rows = [r["row"] for r in records(out)[1:]]
+    assert sorted(rows) == [0, 3]
+    # Torn tail got its own line, not glued onto the next record
+    assert out.read_text(encoding="utf-8").count("\n") == 4
+
+
+def test_failed_rows_are_retried(engine, tmp_path, monkeypatch):
+    monkeypatch.setattr(dispatcher, "router", ModelRouter(MODEL_PRIORITIES))
+    src, out = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    write_input(src, ["1girl", "cat"])
+
+    down = FakeClient(default=ModelBehavior(missing=True,
+                                            error_latency=0.001))
+    runner = run(engine, src, out, down)
+    assert runner.failed == 2
+    assert load_done_rows(out) == set()
+
+    monkeypatch.setattr(dispatcher, "router", ModelRouter(MODEL_PRIORITIES))
+    up = FakeClient(default=ModelBehavior(latency=0.001))
+    runner = run(engine, src, out, up)
+    assert runner.failed == 0
+    assert load_done_rows(out) == {0, 1}
+    latest = {r["row"]: r for r in records(out)}
+    assert all("error" not in r for r in latest.values())
+
+
+def test_compile_only_output(engine, tmp_path):
+    src, out = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    write_input(src, ["1girl, red hair"])
+    run(engine, src, out)
+    [record] = records(out)
+    assert "red hair" in record["positive_prompt"]
+    assert record["nsfw"] is False
+
+
+
+def test_missing_nsfw_falls_back_to_default(tmp_path):
+    src = tmp_path / "in.csv"
+    src.write_text("input,nsfw\na,\nb,false\nc,yes\nd\n", encoding="utf-8")
+    assert [row["nsfw"] for _, row in iter_rows(src, "csv", "S", True)] == [
+        True, False, True, True]
+
+    src = tmp_path / "in.jsonl"
+    src.write_text('{"input": "a", "nsfw": null}\n{"input": "b"}\n'
+                   '{"input": "c", "nsfw": false}\n', encoding="utf-8")
+    assert [row["nsfw"] for _, row in iter_rows(src, "jsonl", "S", True)] == [
+        True, True, False]
+
+
+def test_no_llm_run_does_not_read_the_api_key(engine, tmp_path, monkeypatch):
+    def unexpected():
+        raise AssertionError("key store read for a --no-llm run")
+
+    monkeypatch.setattr(batch.security, "get_api_key", unexpected)
+    src, out = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    write_input(src, ["1girl"])
+    assert batch.main([str(src), "-o", str(out), "--no-llm",
+                       "--report-every", "60"]) == 0
+    assert len(records(out)) == 1
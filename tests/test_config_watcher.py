@@ -0,0 +1,72 @@
+import json
+import os
+
+from src.core.config_watcher import ConfigPoller
+from src.core.style_snapshot import source_key
+
+
+def edit_styles(path, change):
+    data = json.loads(path.read_text(encoding="utf-8"))
+    change(data["styles"])
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    # Same-second writes must still look like a change
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+
+def test_edit_recompiles_only_the_changed_style(engine):
+    styles_path, _ = engine.config_paths()
+    assert styles_path.parent == engine.user_data_dir
+    poller = ConfigPoller(engine)
+    changed, kept = engine.get_style_names()[:2]
+    for name in (changed, kept):
+        engine.process("1girl", name, False)
+    old_entry = engine._compiled[(changed, False)]
+    kept_entry = engine._compiled[(kept, False)]
+    kept_style = engine.styles[kept]
+
+    def change(styles):
+        styles[changed]["prompt_payload"] = "hot reloaded tag"
+    edit_styles(styles_path, change)
+
+    assert poller.check()
+    assert engine._compiled.get((kept, False)) is kept_entry
+    assert engine.styles[kept] is kept_style
+    assert engine._compiled.get((changed, False)) is not old_entry
+    assert "hot reloaded tag" in \
+        engine.process("1girl", changed, False).positive_prompt
+    assert not poller.check()  # nothing changed since
+
+
+def test_broken_file_keeps_previous_styles(engine):
+    styles_path, _ = engine.config_paths()
+    poller = ConfigPoller(engine)
+    names = engine.get_style_names()
+    before = engine.process("1girl", names[0], False)
+
+    styles_path.write_text('{"styles": {', encoding="utf-8")
+    assert not poller.check()
+    assert engine.get_style_names() == names
+    assert engine.process("1girl", names[0], False) == before
+
+
+def test_edit_during_reload_leaves_the_snapshot_stale(engine, monkeypatch):
+    styles_path, quality_path = engine.config_paths()
+    name = engine.get_style_names()[0]
+    read_styles = engine._read_styles
+    saved = []
+
+    def racing_read(*args):
+        result = read_styles(*args)
+        # The user saves again after we parsed the file
+        edit_styles(styles_path, lambda styles: styles[name].update(
+            prompt_payload="second save"))
+        return result
+
+    monkeypatch.setattr(engine, "_read_styles", racing_read)
+    monkeypatch.setattr(engine, "_save_snapshot", saved.append)
+    edit_styles(styles_path, lambda styles: styles[name].update(
+        prompt_payload="first save"))
+
+    assert engine.reload()
+    assert saved and saved[0] != source_key(styles_path, quality_path)
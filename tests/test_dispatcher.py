@@ -0,0 +1,128 @@
+import asyncio
+import time
+
+from benchmarks.fake_genai import FakeClient, ModelBehavior
+from src.core.dispatcher import AsyncDispatcher
+from src.core.llm_client import MODEL_PRIORITIES, LLMError
+from src.core.model_router import ModelRouter
+
+FAST = ModelBehavior(latency=0.001, error_latency=0.001)
+
+
+def run(client, inputs, **kwargs):
+    """generate() for every input; exceptions are returned, not raised."""
+    kwargs.setdefault("model_router", ModelRouter(MODEL_PRIORITIES))
+    kwargs.setdefault("base_backoff", 0.01)
+    kwargs.setdefault("max_backoff", 0.02)
+
+    async def main():
+        async with AsyncDispatcher(client, **kwargs) as d:
+            return await asyncio.gather(
+                *(d.generate(text, "Anime", use_cache=False)
+                  for text in inputs), return_exceptions=True)
+
+    return asyncio.run(main())
+
+
+def test_success_on_first_model():
+    client = FakeClient(default=FAST)
+    assert run(client, ["a"]) == [client.reply]
+    assert sum(client.stats.calls.values()) == 1
+
+
+def test_not_found_falls_back_to_next_model():
+    missing = ModelBehavior(missing=True, error_latency=0.001)
+    client = FakeClient({MODEL_PRIORITIES[0]: missing}, default=FAST)
+    assert run(client, ["a"]) == [client.reply]
+    assert client.stats.calls[MODEL_PRIORITIES[0]] == 1
+
+
+def test_all_models_not_found_fails_once_each():
+    client = FakeClient(default=ModelBehavior(missing=True,
+                                              error_latency=0.001))
+    started = time.monotonic()
+    [result] = run(client, ["a"])
+    assert isinstance(result, LLMError)
+    assert "404" in str(result)
+    assert time.monotonic() - started < 2
+    assert client.stats.calls == {m: 1 for m in MODEL_PRIORITIES}
+
+
+def test_rate_limit_exhausts_attempts():
+    client = FakeClient(default=ModelBehavior(rate_limit=1.0,
+                                              error_latency=0.001))
+    [result] = run(client, ["a"], max_attempts=3)
+    assert isinstance(result, LLMError)
+    assert "429" in str(result)
+    assert sum(client.stats.calls.values()) == 3
+
+
+def test_overload_retries_with_backoff():
+    # First model always 503, the router trips it and the job moves on
+    client = FakeClient({MODEL_PRIORITIES[0]: ModelBehavior(
+        overload=1.0, error_latency=0.001)}, default=FAST)
+    results = run(client, [f"q{i}" for i in range(5)], concurrency=2)
+    assert results == [client.reply] * 5
+    assert client.stats.errors[MODEL_PRIORITIES[0]] >= 1
+
+
+def test_backoff_does_not_hold_workers():
+    # One worker: a job waiting out its backoff must not block the others
+    overloaded = ModelBehavior(overload=1.0, error_latency=0.001)
+    client = FakeClient({m: overloaded for m in MODEL_PRIORITIES[:-1]},
+                        default=FAST)
+    results = run(client, [f"q{i}" for i in range(4)], concurrency=1,
+                  base_backoff=0.2, max_backoff=0.2)
+    assert results == [client.reply] * 4
+
+
+def test_batch_items_missing_from_reply_go_solo():
+    client = FakeClient(default=ModelBehavior(latency=0.001,
+                                              batch_drop=0.5), seed=3)
+    results = run(client, [f"q{i}" for i in range(6)], batch_size=6)
+    assert results == [client.reply] * 6
+
+
+def test_cancelled_caller_is_skipped():
+    client = FakeClient(default=ModelBehavior(latency=0.05))
+
+    async def main():
+        async with AsyncDispatcher(
+                client, concurrency=1,
+                model_router=ModelRouter(MODEL_PRIORITIES)) as d:
+            first = asyncio.ensure_future(d.generate("a", "Anime", False))
+            second = asyncio.ensure_future(d.generate("b", "Anime", False))
+            await asyncio.sleep(0)
+            second.cancel()
+            return await first
+
+    assert asyncio.run(main()) == client.reply
+    assert sum(client.stats.calls.values()) == 1
+
+
+def test_unexpected_error_fails_the_job_not_the_worker():
+    class BrokenCache:
+        def get_any(self, keys):
+            return None
+
+        def put(self, key, value):
+            raise OSError("disk full")
+
+    client = FakeClient(default=FAST)
+
+    async def main():
+        async with AsyncDispatcher(
+                client, concurrency=1, cache=BrokenCache(),
+                model_router=ModelRouter(MODEL_PRIORITIES)) as d:
+            results = []
+            for text in ("a", "b"):  # the same worker takes both
+                try:
+                    results.append(await asyncio.wait_for(
+                        d.generate(text, "Anime"), 5))
+                except LLMError as e:
+                    results.append(e)
+            return results
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, LLMError) for r in results)
+    assert "disk full" in str(results[0])
@@ -0,0 +1,85 @@
+import pytest
+
+from src.core import generator
+
+INPUTS = [
+    "",
+    "1girl, red hair, forest",
+    "  1girl,   red  hair ,, forest , ",
+    "masterpiece, 1girl, masterpiece",
+    "orange_hair, Orange hair, (orange hair:1.3)",
+    "(smile:1.2), smile, looking at viewer",
+    "rating_explicit, solo",
+    "score_9, 1boy, night sky",
+    "cat ears, BREAK, city street",
+    "рыжая девушка, forest",
+]
+
+
+def reference(engine, text, style_name, nsfw):
+    """process() as it was before the per-style precompilation."""
+    style = engine._resolve_style(style_name)
+    q_tags = engine._resolve_quality(style)
+    return (
+        engine._compile_prompt(engine._positive_segments(
+            style, q_tags, text, nsfw)),
+        engine._compile_prompt(engine._negative_segments(
+            style, q_tags, nsfw)),
+        style.name)
+
+
+@pytest.mark.parametrize("nsfw", [False, True])
+def test_process_matches_reference_for_every_style(engine, nsfw):
+    assert engine.get_style_names()
+    for name in engine.get_style_names():
+        for text in INPUTS:
+            result = engine.process(text, name, nsfw)
+            assert (result.positive_prompt, result.negative_prompt,
+                    result.style_used) == reference(engine, text, name,
+                                                    nsfw), (name, text)
+
+
+def test_unknown_style_falls_back_like_reference(engine):
+    result = engine.process("1girl", "No such style", False)
+    assert (result.positive_prompt, result.negative_prompt,
+            result.style_used) == reference(engine, "1girl",
+                                            "No such style", False)
+
+
+def test_process_many_equals_mapping_process(engine):
+    names = engine.get_style_names()
+    items = [(text, name, nsfw) for text in INPUTS[:4] for name in names
+             for nsfw in (False, True)]
+    assert [r.model_dump() for r in engine.process_many(items)] == \
+        [engine.process(*item).model_dump() for item in items]
+
+
+def test_process_styles_same_in_process_and_in_pool(engine, monkeypatch):
+    names = engine.get_style_names() * 2
+    text = "1girl, red hair, (smile:1.2)"
+    local = engine.process_styles(text, names, True, workers=1)
+    assert [r.model_dump() for r in local] == \
+        [engine.process(text, name, True).model_dump() for name in names]
+
+    monkeypatch.setattr(generator, "PARALLEL_MIN_STYLES", 1)
+    pooled = engine.process_styles(text, names, True, workers=2)
+    assert [r.model_dump() for r in pooled] == \
+        [r.model_dump() for r in local]
+
+
+def test_stream_finish_equals_process(engine):
+    name = engine.get_style_names()[0]
+    chunks = ["1girl, red h", "air, (smi", "le:1.", "2), for", "est, ",
+              "looking at viewer"]
+    stream = engine.stream(name, False)
+    final = engine.process("".join(chunks), name, False)
+    final_tags = set(final.positive_prompt.split(", "))
+
+    for chunk in chunks:
+        stream.feed(chunk)
+        # The preview only ever shows whole tags
+        assert set(stream.positive_prompt.split(", ")) <= final_tags
+    assert "red hair" in stream.positive_prompt
+    assert "(smile:1.2)" in stream.positive_prompt
+
+    assert stream.finish().model_dump() == final.model_dump()
@@ -0,0 +1,47 @@
+import sqlite3
+
+from src.core.generator import GenerationResult
+from src.core.history import GenerationHistory
+
+RESULT = GenerationResult(positive_prompt="1girl, red hair",
+                          negative_prompt="lowres", style_used="Quantum",
+                          loras=[], settings={"steps": 30})
+
+
+def test_add_search_and_style_key(tmp_path):
+    history = GenerationHistory(tmp_path / "history.sqlite3")
+    try:
+        history.add("рыжая девушка", True, RESULT, "gemini",
+                    "Quantum (Experimental)")
+        history.add("cyberpunk samurai", False, RESULT, "draft")
+        assert history.flush(5)
+        assert history.count() == 2
+
+        [entry] = history.search("рыж")
+        assert entry.user_input == "рыжая девушка"
+        assert entry.nsfw
+        assert entry.style_key == "Quantum (Experimental)"
+        assert entry.result.style_used == "Quantum"
+        assert history.get(entry.id).result.settings == {"steps": 30}
+    finally:
+        history.close()
+
+
+def test_old_database_gets_the_style_key_column(tmp_path):
+    path = tmp_path / "history.sqlite3"
+    conn = sqlite3.connect(str(path))
+    conn.execute(
+        "CREATE TABLE history (id INTEGER PRIMARY KEY, created REAL NOT NULL,"
+        " user_input TEXT NOT NULL, style TEXT NOT NULL, nsfw INTEGER NOT NULL,"
+        " source TEXT NOT NULL, positive TEXT NOT NULL, negative TEXT NOT NULL,"
+        " loras TEXT NOT NULL, settings TEXT NOT NULL)")
+    conn.execute("INSERT INTO history VALUES (1, 0, 'old', 'Quantum', 0,"
+                 " 'gemini', 'p', 'n', '[]', '{}')")
+    conn.commit()
+    conn.close()
+
+    history = GenerationHistory(path)
+    try:
+        assert history.get(1).style_key == ""
+    finally:
+        history.close()
@@ -0,0 +1,123 @@
+import json
+
+import pytest
+from google.genai import errors, types
+
+from benchmarks.fake_genai import FakeClient, ModelBehavior
+from src.core import llm_transport
+from src.core.llm_transport import (CassetteWriter, FailureScript,
+                                    RecordTransport, RecordingClient,
+                                    ReplayClient, ReplayTransport,
+                                    load_cassette, transport_from_env)
+
+
+def record(path):
+    inner = FakeClient({"missing": ModelBehavior(missing=True)},
+                       default=ModelBehavior(latency=0.0),
+                       reply="1girl, forest")
+    client = RecordingClient(inner, CassetteWriter(path))
+    client.models.generate_content(model="m", contents="рыжая девушка")
+    "".join(c.text for c in client.models.generate_content_stream(
+        model="m", contents="кот"))
+    with pytest.raises(errors.ClientError):
+        client.models.generate_content(model="missing", contents="x")
+    return client
+
+
+def test_cassette_round_trip(tmp_path):
+    path = tmp_path / "gemini.jsonl"
+    assert record(path).cassette.count == 3
+    entries = load_cassette(path)
+    assert [(e["call"], e["model"]) for e in entries] == [
+        ("generate", "m"), ("stream", "m"), ("generate", "missing")]
+    assert "рыжая" not in path.read_text(encoding="utf-8")  # hashes only
+
+    replay = ReplayClient.from_file(path, scale=0)
+    assert replay.models.generate_content(
+        model="m", contents="рыжая девушка").text == "1girl, forest"
+    chunks = [c.text for c in replay.models.generate_content_stream(
+        model="m", contents="кот")]
+    assert "".join(chunks) == entries[1]["text"]
+    assert len(chunks) == len(entries[1]["chunks"])
+    with pytest.raises(errors.ClientError) as e:
+        replay.models.generate_content(model="missing", contents="x")
+    assert e.value.code == 404
+    assert dict(replay.stats.outcomes["missing"]) == {"404": 1}
+
+
+def test_json_replies_are_rebatched_to_the_asked_ids(tmp_path):
+    path = tmp_path / "gemini.jsonl"
+    path.write_text(json.dumps({
+        "v": 1, "call": "async", "model": "m", "prompt": "x",
+        "latency": 0.0, "text": '[{"id": 1, "tags": "a"}]'}) + "\n",
+        encoding="utf-8")
+    replay = ReplayClient.from_file(path, scale=0)
+    config = types.GenerateContentConfig(
+        response_mime_type="application/json")
+    reply = replay.models.generate_content(
+        model="m", contents="Item 7: x\nItem 9: y", config=config)
+    assert json.loads(reply.text) == [{"id": 7, "tags": "a"},
+                                      {"id": 9, "tags": "a"}]
+
+
+def test_unusable_cassettes_fail_clearly(tmp_path):
+    with pytest.raises(ValueError, match="empty"):
+        ReplayClient([])
+    with pytest.raises(ValueError, match="no successful calls"):
+        ReplayClient([{"model": "m", "prompt": "x",
+                       "error": {"code": 429}}])
+    broken = tmp_path / "broken.jsonl"
+    broken.write_text("not json\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="empty"):
+        ReplayClient.from_file(broken)
+    with pytest.raises(FileNotFoundError):
+        ReplayClient.from_file(tmp_path / "missing.jsonl")
+
+
+def test_failure_script_parse_and_cycle():
+    script = FailureScript.parse(" a=429x2,ok ; *=rec,503 ")
+    assert script.steps == {"a": ["429", "429", "ok"], "*": ["rec", "503"]}
+    assert [script.next("a") for _ in range(4)] == ["429", "429", "ok",
+                                                    "429"]
+    assert [script.next("b") for _ in range(3)] == ["rec", "503", "rec"]
+    assert FailureScript.parse("a=ok").next("b") == "rec"
+
+    for bad in ("a", "=ok", "a=boom", "a=,"):
+        with pytest.raises(ValueError):
+            FailureScript.parse(bad)
+
+
+def test_failure_script_overrides_the_cassette(tmp_path):
+    path = tmp_path / "gemini.jsonl"
+    record(path)
+    replay = ReplayClient.from_file(path, scale=0,
+                                    script=FailureScript.parse("m=503,ok"))
+    with pytest.raises(errors.ServerError):
+        replay.models.generate_content(model="m", contents="y")
+    assert replay.models.generate_content(
+        model="m", contents="y").text == "1girl, forest"
+
+
+def test_transport_from_env(tmp_path, monkeypatch):
+    env = llm_transport.TRANSPORT_ENV_VAR
+    monkeypatch.delenv(env, raising=False)
+    assert transport_from_env() is None
+
+    path = tmp_path / "gemini.jsonl"
+    monkeypatch.setenv(env, f"record:{path}")
+    assert isinstance(transport_from_env(), RecordTransport)
+
+    record(path)
+    monkeypatch.setenv(env, f"replay:{path}")
+    monkeypatch.setenv(llm_transport.SCALE_ENV_VAR, "0")
+    monkeypatch.setenv(llm_transport.SCRIPT_ENV_VAR, "m=429")
+    transport = transport_from_env()
+    assert isinstance(transport, ReplayTransport)
+    assert transport.replay.scale == 0
+    assert transport.client(lambda: None) is transport.replay
+    with pytest.raises(errors.ClientError):
+        transport.replay.models.generate_content(model="m", contents="y")
+
+    for spec in ("replay", "replay:", f"teleport:{path}"):
+        monkeypatch.setenv(env, spec)
+        assert transport_from_env() is None
@@ -0,0 +1,105 @@
+import threading
+
+import pytest
+from PyQt6.QtCore import QCoreApplication, Qt
+
+from benchmarks.fake_genai import FakeClient, ModelBehavior
+from src.core import llm_client, llm_worker
+from src.core.llm_client import LLMError
+from src.core.llm_worker import GeminiWorker
+from src.core.model_router import ModelRouter
+
+
+@pytest.fixture(autouse=True)
+def fresh_router(monkeypatch):
+    monkeypatch.setattr(llm_client, "router",
+                        ModelRouter(llm_client.MODEL_PRIORITIES))
+
+
+def run_jobs(worker, submit, expected):
+    """Submits jobs before the thread starts; returns job_id -> outcome."""
+    app = QCoreApplication.instance() or QCoreApplication([])  # noqa: F841
+    results = {}
+    done = threading.Event()
+
+    def record(kind, job_id, text):
+        results[job_id] = (kind, text)
+        if len(results) == expected:
+            done.set()
+
+    direct = Qt.ConnectionType.DirectConnection
+    worker.job_finished.connect(
+        lambda job_id, text: record("ok", job_id, text), direct)
+    worker.job_failed.connect(
+        lambda job_id, err: record("failed", job_id, err), direct)
+    ids = submit(worker)
+    worker.start()
+    try:
+        assert done.wait(10)
+    finally:
+        worker.stop()
+    return ids, results
+
+
+def failing_first(monkeypatch, error):
+    """get_client raises `error` once, then hands out a fake client."""
+    client = FakeClient(default=ModelBehavior(latency=0.001))
+    calls = []
+
+    def get_client(api_key):
+        calls.append(api_key)
+        if len(calls) == 1:
+            raise error
+        return client
+
+    monkeypatch.setattr(llm_worker, "get_client", get_client)
+    return client
+
+
+def submit_ab(worker):
+    return [worker.submit("k", text, "Anime", use_cache=False)
+            for text in "ab"]
+
+
+def test_get_client_is_pooled_per_key(monkeypatch):
+    monkeypatch.setattr(llm_client, "_clients", {})
+    monkeypatch.setattr(llm_client, "create_client", lambda key: object())
+    assert llm_client.get_client("a") is llm_client.get_client("a")
+    assert llm_client.get_client("a") is not llm_client.get_client("b")
+
+
+def test_one_thread_serves_jobs_and_drops_cancelled(monkeypatch):
+    client = FakeClient(default=ModelBehavior(latency=0.001))
+    threads = set()
+
+    def get_client(api_key):
+        threads.add(threading.get_ident())
+        return client
+
+    monkeypatch.setattr(llm_worker, "get_client", get_client)
+
+    def submit(worker):
+        ids = [worker.submit("k", text, "Anime", use_cache=False)
+               for text in "abc"]
+        worker.cancel(ids[1])
+        return ids
+
+    (first, second, third), results = run_jobs(GeminiWorker(), submit, 2)
+    assert results == {first: ("ok", client.reply),
+                       third: ("ok", client.reply)}
+    assert len(threads) == 1
+
+
+def test_llm_error_fails_only_that_job(monkeypatch):
+    client = failing_first(monkeypatch, LLMError("API Key is missing"))
+    (first, second), results = run_jobs(GeminiWorker(), submit_ab, 2)
+    assert results[first] == ("failed", "API Key is missing")
+    assert results[second] == ("ok", client.reply)
+
+
+def test_unexpected_error_fails_the_job_and_keeps_the_thread(monkeypatch):
+    client = failing_first(monkeypatch, RuntimeError("boom"))
+    (first, second), results = run_jobs(GeminiWorker(trace_kind="test"),
+                                        submit_ab, 2)
+    assert results[first] == ("failed", "RuntimeError: boom")
+    assert results[second] == ("ok", client.reply)
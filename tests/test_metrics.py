@@ -0,0 +1,83 @@
+import json
+
+from src.core.metrics import (BUCKETS, CANCELLED, ERROR, OK, Histogram,
+                              Metrics, percentile)
+
+
+def test_histogram_buckets_and_totals():
+    hist = Histogram()
+    for seconds in (0.05, 0.1, 0.3, 100.0):
+        hist.observe(seconds)
+    assert hist.counts[0] == 2  # le=0.1 includes the bound itself
+    assert hist.counts[BUCKETS.index(0.5)] == 1
+    assert hist.counts[-1] == 1  # +Inf
+    assert sum(hist.counts) == hist.count == 4
+    assert hist.to_dict()["sum"] == 100.45
+
+
+def test_percentile_is_nearest_rank():
+    values = [float(v) for v in range(1, 101)]
+    assert percentile([], 0.5) == 0.0
+    assert percentile(values, 0.0) == 1.0
+    assert percentile(values, 0.07) == 7.0  # not 8: 0.07 * 100 > 7 in floats
+    assert percentile(values, 0.5) == 50.0
+    assert percentile(values, 0.95) == 95.0
+    assert percentile(values, 1.0) == 100.0
+    assert percentile([3.0, 1.0], 0.5) == 1.0
+    assert percentile([1.0, 2.0, 3.0, 4.0, 5.0], 0.9) == 5.0
+
+
+def sample_metrics():
+    m = Metrics()
+    m.observe_attempt("gemini-2.5-flash", "rate_limited", 0.05)
+    m.observe_attempt("gemini-2.0-flash", OK, 1.5)
+    for outcome in (OK, ERROR, CANCELLED):
+        trace = m.trace(log=False)
+        trace.attempt("gemini-2.0-flash", OK, 0.2)
+        trace.finish(outcome)
+    return m
+
+
+def test_dump_json(tmp_path):
+    path = tmp_path / "metrics.json"
+    sample_metrics().dump(path)
+    data = json.loads(path.read_text(encoding="utf-8"))
+    model = data["models"]["gemini-2.0-flash"]
+    assert model["count"] == 4
+    assert model["outcomes"] == {OK: 4}
+    assert data["models"]["gemini-2.5-flash"]["outcomes"] == {
+        "rate_limited": 1}
+    requests = data["requests"]["interactive"]
+    assert requests["count"] == 2  # cancelled requests have no latency
+    assert requests["outcomes"] == {OK: 1, ERROR: 1, CANCELLED: 1}
+    assert len(data["recent"]) == 3
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_dump_prometheus(tmp_path):
+    path = tmp_path / "metrics.prom"
+    sample_metrics().dump(path)
+    lines = path.read_text(encoding="utf-8").splitlines()
+
+    assert lines[0] == "# TYPE sdt_model_attempts_total counter"
+    assert 'sdt_model_attempts_total{model="gemini-2.0-flash",' \
+           'outcome="ok"} 4' in lines
+    assert 'sdt_requests_total{kind="interactive",outcome="cancelled"} 1' \
+        in lines
+    assert "# TYPE sdt_model_latency_seconds histogram" in lines
+
+    series = 'sdt_model_latency_seconds_bucket{model="gemini-2.0-flash",'
+    buckets = [line for line in lines if line.startswith(series)]
+    assert len(buckets) == len(BUCKETS) + 1
+    counts = [int(line.rsplit(" ", 1)[1]) for line in buckets]
+    assert counts == sorted(counts)  # cumulative
+    assert buckets[-1] == series + 'le="+Inf"} 4'
+    assert 'sdt_model_latency_seconds_count{model="gemini-2.0-flash"} 4' \
+        in lines
+
+    # Every sample line is `name{labels} value`
+    for line in lines:
+        if not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            float(value)
+            assert name.endswith("}") and "{" in name
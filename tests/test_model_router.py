@@ -0,0 +1,121 @@
+from benchmarks.fake_genai import FakeClient, ModelBehavior
+from src.core import llm_client
+from src.core.model_router import (CLOSED, FAILED, HALF_OPEN, NOT_FOUND,
+                                   NOT_FOUND_COOLDOWN, OPEN, RATE_LIMITED,
+                                   RATE_LIMIT_COOLDOWN, ModelRouter)
+
+MODELS = ["a", "b", "c"]
+
+
+def expire(router, model):
+    """Skip the cooldown: the next order() moves the model to half-open."""
+    router.health[model].open_until = 0.0
+
+
+def test_consecutive_failures_open_the_circuit():
+    router = ModelRouter(MODELS)
+    for _ in range(2):
+        router.record_failure("a", FAILED, 0.1)
+    assert router.health["a"].state == CLOSED
+    router.record_failure("a", FAILED, 0.1)
+    assert router.health["a"].state == OPEN
+    assert "a" not in router.order()
+
+
+def test_rate_limit_and_not_found_cooldowns():
+    router = ModelRouter(MODELS)
+    router.record_failure("a", RATE_LIMITED)
+    router.record_failure("b", NOT_FOUND)
+    assert router.health["a"].cooldown == RATE_LIMIT_COOLDOWN
+    assert router.health["b"].cooldown == NOT_FOUND_COOLDOWN
+    assert router.order() == ["c"]
+    assert router.last_rate_limit() > 0
+
+
+def test_all_open_returns_the_soonest():
+    router = ModelRouter(MODELS)
+    router.record_failure("a", NOT_FOUND)
+    router.record_failure("b", RATE_LIMITED)
+    router.record_failure("c", NOT_FOUND)
+    assert router.order() == ["b"]
+
+
+def test_half_open_probe_success_closes():
+    router = ModelRouter(MODELS)
+    router.record_failure("a", RATE_LIMITED)
+    expire(router, "a")
+    assert "a" in router.order()
+    assert router.health["a"].state == HALF_OPEN
+
+    router.begin("a")
+    assert "a" not in router.order()  # one probe at a time
+    router.record_success("a", 0.1)
+    assert router.health["a"].state == CLOSED
+    assert "a" in router.order()
+
+
+def test_half_open_probe_failure_backs_off_harder():
+    router = ModelRouter(MODELS)
+    for _ in range(3):
+        router.record_failure("a", FAILED, 0.1)
+    first = router.health["a"].cooldown
+    expire(router, "a")
+    router.order()
+    router.begin("a")
+    router.record_failure("a", FAILED, 0.1)
+    assert router.health["a"].state == OPEN
+    assert router.health["a"].cooldown == first * 2
+
+
+def test_release_frees_the_probe_slot():
+    router = ModelRouter(MODELS)
+    router.record_failure("a", RATE_LIMITED)
+    expire(router, "a")
+    router.order()
+    router.begin("a")
+    router.release("a")
+    assert router.health["a"].state == HALF_OPEN
+    assert "a" in router.order()
+
+
+def test_cancelled_stream_releases_the_probe(monkeypatch):
+    router = ModelRouter(llm_client.MODEL_PRIORITIES)
+    monkeypatch.setattr(llm_client, "router", router)
+    first = llm_client.MODEL_PRIORITIES[0]
+    router.record_failure(first, RATE_LIMITED)
+    expire(router, first)
+    assert router.order()[0] == first
+
+    client = FakeClient(default=ModelBehavior(latency=0.001))
+    text = llm_client.stream_tags(client, "a", "Anime", on_chunk=print,
+                                  use_cache=False,
+                                  is_cancelled=lambda: True)
+    assert text == ""
+    assert router.health[first].state == HALF_OPEN
+    assert first in router.order()
+
+
+def test_save_only_after_state_changes(tmp_path):
+    path = tmp_path / "router_state.json"
+    router = ModelRouter(MODELS)
+    router.load(path)
+    router.record_success("a", 0.1)
+    router.save()
+    assert not path.exists()  # samples alone are not worth a write
+
+    router.record_failure("a", RATE_LIMITED)
+    router.save()
+    assert path.exists()
+    written = path.stat().st_mtime_ns
+
+    router.record_failure("b", NOT_FOUND)
+    router.save()  # debounced
+    assert path.stat().st_mtime_ns == written
+    router.save(force=True)
+    assert list(tmp_path.iterdir()) == [path]
+
+    restored = ModelRouter(MODELS)
+    restored.load(path)
+    assert restored.health["a"].state == OPEN
+    assert restored.health["b"].cooldown == NOT_FOUND_COOLDOWN
+    assert restored.order() == ["c"]
@@ -0,0 +1,48 @@
+import csv
+import json
+
+import pytest
+
+pytest.importorskip("PyQt6.QtWidgets")
+
+from src.ui.multi_style import export_results
+
+
+@pytest.fixture
+def results(engine):
+    names = engine.get_style_names()[:3]
+    # The last name was renamed away: process() answers with the fallback
+    return [engine.process('1girl, "quoted", red hair', name, False)
+            for name in names + ["Removed style"]]
+
+
+def test_export_csv(tmp_path, results):
+    path = tmp_path / "out.CSV"
+    export_results(path, "рыжая девушка", results)
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+
+    assert len(rows) == len(results)
+    assert list(rows[0])[:4] == ["input", "positive_prompt",
+                                 "negative_prompt", "style_used"]
+    for row, result in zip(rows, results):
+        assert row["input"] == "рыжая девушка"
+        assert row["positive_prompt"] == result.positive_prompt
+        assert row["style_used"] == result.style_used
+        assert json.loads(row["loras"]) == result.loras
+        assert json.loads(row["settings"]) == result.settings
+        assert json.loads(row["trimmed"]) == []
+
+
+def test_export_json(tmp_path, results):
+    path = tmp_path / "out.json"
+    export_results(path, "рыжая девушка", results)
+    rows = json.loads(path.read_text(encoding="utf-8"))
+    assert rows == [{"input": "рыжая девушка", **r.model_dump()}
+                    for r in results]
+
+
+def test_export_nothing(tmp_path):
+    path = tmp_path / "out.csv"
+    export_results(path, "x", [])
+    assert path.read_text(encoding="utf-8").splitlines() == ["input"]
@@ -0,0 +1,70 @@
+
+import json
+import os
+
+import pytest
+
+from src.core.phrase_expander import PhraseExpander, PhraseTable, _normalize
+
+PHRASES = {
+    "рыж*": "orange hair",
+    "девушка": "1girl",
+    "кот": "cat",
+    "черный кот": "black cat, cat",
+    "ёлка": "christmas tree",
+    "в лесу": "forest, outdoors",
+}
+
+
+@pytest.fixture
+def table():
+    return PhraseTable(PHRASES)
+
+
+def found(table, text):
+    return [(text[start:end], table.phrases[index])
+            for start, end, index in table.find(text)]
+
+
+def test_whole_words_only(table):
+    assert found(table, "котлета и кот") == [("кот", "кот")]
+    assert found(table, "скот") == []
+
+
+def test_stem_takes_the_rest_of_the_word(table):
+    assert found(table, "Рыжая девушка") == [("Рыжая", "рыж"),
+                                             ("девушка", "девушка")]
+    assert found(table, "рыжеволосая_девушка") == [
+        ("рыжеволосая_девушка", "рыж")]
+
+
+def test_leftmost_longest_wins(table):
+    assert found(table, "черный кот в лесу") == [
+        ("черный кот", "черный кот"), ("в лесу", "в лесу")]
+    assert table.expand("черный кот, кот") == "black cat, cat"
+
+
+def test_yo_matches_ye(table):
+    assert found(table, "Елка") == [("Елка", "елка")]
+    assert found(table, "Ёлка") == [("Ёлка", "елка")]
+
+
+def test_normalize_keeps_offsets():
+    text = "İstanbul кот"
+    assert len(_normalize(text)) == len(text)
+    assert found(PhraseTable(PHRASES), text) == [("кот", "кот")]
+
+
+def test_broken_file_is_reported_not_printed(tmp_path, capsys):
+    path = tmp_path / "phrase_table.json"
+    path.write_text("{broken", encoding="utf-8")
+    expander = PhraseExpander(path)
+    assert "Phrase table not loaded" in expander.error
+    assert expander.expand("кот") == ""
+    assert capsys.readouterr().out == ""
+
+    path.write_text(json.dumps({"phrases": PHRASES}), encoding="utf-8")
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert expander.expand("кот") == "cat"
+    assert expander.error == ""
@@ -0,0 +1,86 @@
+import time
+
+import pytest
+
+from src.core import dispatcher
+from src.core.dispatcher import TokenBucket
+from src.core.model_router import ModelRouter
+from src.core.prefetch import PrefetchBudget, speculation_key
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def budget(monkeypatch, per_minute=4.0, burst=2.0, router=None):
+    clock = Clock()
+    monkeypatch.setattr(dispatcher.time, "monotonic", clock)
+    return PrefetchBudget(per_minute, burst, router=router), clock
+
+
+def test_burst_then_denied(monkeypatch):
+    b, _ = budget(monkeypatch)
+    assert [b.try_spend() for _ in range(3)] == [True, True, False]
+    assert b.stats() == {"spent": 2, "denied": 1, "hits": 0}
+
+
+@pytest.mark.parametrize("per_minute", [0, -2.0])
+def test_zero_budget_disables_prefetch(monkeypatch, per_minute):
+    b, clock = budget(monkeypatch, per_minute=per_minute)
+    assert not b.enabled
+    clock.now += 3600
+    assert [b.try_spend() for _ in range(3)] == [False] * 3
+    assert b.stats() == {"spent": 0, "denied": 0, "hits": 0}
+
+
+def test_empty_bucket_without_refill_waits_forever():
+    bucket = TokenBucket(0.0, 1.0)
+    assert bucket.wait_time(1) == 0.0
+    bucket.consume(1)
+    assert bucket.wait_time(1) == float("inf")
+
+
+def test_config_clamps_per_minute():
+    pytest.importorskip("PyQt6.QtCore")
+    from src.core.config_loader import ConfigManager
+
+    class Settings:
+        def __init__(self, raw):
+            self.raw = raw
+
+        def value(self, key, default=None):
+            return self.raw
+
+    manager = ConfigManager()
+    for raw, expected in (("6", 6.0), ("0", 0.0), ("-3", 0.0),
+                          ("nan", 0.0), ("junk", 4.0)):
+        manager.settings = Settings(raw)
+        assert manager.get_prefetch_per_minute() == expected, raw
+
+
+def test_refills_at_the_per_minute_rate(monkeypatch):
+    b, clock = budget(monkeypatch, per_minute=6.0)
+    b.try_spend(), b.try_spend()
+    clock.now += 5.0
+    assert not b.try_spend()
+    clock.now += 5.0  # 10 s at 6/min = one call
+    assert b.try_spend()
+    assert not b.try_spend()
+
+
+def test_quiet_after_a_429(monkeypatch):
+    router = ModelRouter(["m"])
+    b, _ = budget(monkeypatch, router=router)
+    router.record_failure("m", "rate_limited")
+    assert not b.try_spend()
+    router.health["m"].last_429 = time.time() - b.quiet_after_429 - 1
+    assert b.try_spend()
+
+
+def test_speculation_key_normalizes_input():
+    assert speculation_key("  Рыжая   девушка ", "Anime") == \
+        speculation_key("рыжая девушка", "Anime")
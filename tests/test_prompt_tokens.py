@@ -0,0 +1,115 @@
+import gc
+import weakref
+
+from src.core.prompt_tokens import (CHUNK_TOKENS, ChunkPacker, ClipBPE,
+                                    EstimatedTokens, TokenCounter,
+                                    fit_budget, merged_tags, parse_prompt,
+                                    parse_tag, split_prompt)
+
+
+class FixedTokens:
+    """Every tag costs what its text says: "t5" -> 5 tokens."""
+    exact = True
+
+    def count(self, text: str) -> int:
+        return int(text.rsplit("t", 1)[1])
+
+
+def tags(text):
+    return list(parse_prompt(text))
+
+
+def test_parse_tag_weights():
+    tag = parse_tag("(Orange_Hair:1.2)")
+    assert (tag.key, tag.weight, tag.content) == \
+        ("orange hair", 1.2, "Orange_Hair")
+    assert parse_tag("((masterpiece))").weight == 1.21
+    assert parse_tag("[blurry]").weight == round(1 / 1.1, 3)
+    assert parse_tag("(a) (b)").weight == 1.0  # two groups, not one
+    assert parse_tag("artist \\(style\\)").content == "artist (style)"
+    assert parse_tag("<lora:x:0.8>").content == ""
+    assert parse_tag("BREAK").is_break
+
+
+def test_split_keeps_bracketed_commas():
+    assert split_prompt("a, (b, c:1.2), <lora:x:1,2>, d") == \
+        ["a", " (b, c:1.2)", " <lora:x:1,2>", " d"]
+    # Unbalanced (cut off) output falls back to a plain split
+    assert split_prompt("(a, b") == ["(a", " b"]
+
+
+def test_merged_tags_keeps_first_position_and_explicit_weight():
+    merged = merged_tags("orange hair, 1girl, (Orange_Hair:1.3), 1girl")
+    assert [t.text for t in merged] == ["(Orange_Hair:1.3)", "1girl"]
+
+
+def test_chunk_packer_moves_short_tags_whole():
+    packer = ChunkPacker()
+    packer.add(70)
+    packer.add(10)  # 70 + comma + 10 > 75: starts chunk 2
+    assert (packer.chunks, packer.fill) == (2, 10)
+    packer.add(0, is_break=True)
+    assert (packer.chunks, packer.fill) == (3, 0)
+
+
+def test_chunk_packer_splits_long_tags():
+    packer = ChunkPacker()
+    packer.add(CHUNK_TOKENS * 2 + 5)
+    assert packer.chunks == 3
+
+
+def test_fit_budget_prefers_weighted_then_early_tags():
+    counter = TokenCounter(FixedTokens())
+    fixed = ChunkPacker()
+    fixed.add(40)
+    user = tags("a t30, b t30, (c t30:1.3), d t30")
+    assert counter.chunks(user) == 2
+    kept, dropped = fit_budget(counter, fixed, user, max_chunks=2)
+    assert [t.text for t in kept] == ["a t30", "b t30", "(c t30:1.3)"]
+    assert [t.text for t in dropped] == ["d t30"]
+
+    kept, dropped = fit_budget(counter, fixed, user, max_chunks=1)
+    assert [t.text for t in kept] == ["(c t30:1.3)"]
+    assert counter.chunks(kept) <= 1
+
+    kept, dropped = fit_budget(counter, fixed, user, max_chunks=9)
+    assert dropped == []
+
+
+def test_clip_bpe_counts_and_per_instance_cache():
+    bpe = ClipBPE([("h", "e"), ("he", "l"), ("l", "o</w>")])
+    assert bpe.count("hello") == 2  # "hel" + "lo</w>"
+    assert bpe.count("Hello, hello") == 5
+    assert bpe._word.cache_info().hits >= 1
+    other = ClipBPE([])
+    assert other.count("hello") == 5
+    assert other._word.cache_info().currsize == 1
+
+    ref = weakref.ref(bpe)
+    del bpe
+    gc.collect()
+    assert ref() is None
+
+
+def test_estimated_tokens_err_high():
+    est = EstimatedTokens()
+    assert est.count("masterpiece") == 2
+    assert est.count("1girl") == 2
+    assert est.count("score_9") == 3  # score, _, 9
+
+
+def test_engine_trims_user_tags_to_the_style_budget(engine):
+    key = next(iter(engine.get_style_names()))
+    style = engine.styles[key]
+    base = engine.process("", key, False)
+    budget = engine.token_counter.chunks(tags(base.positive_prompt))
+
+    engine.styles[key] = style.model_copy(update={"max_chunks": budget})
+    engine._compiled.clear()
+    user = ", ".join(f"extra detail number {i}" for i in range(40))
+    result = engine.process(f"(red hair:1.4), {user}", key, False)
+
+    assert result.trimmed
+    assert "(red hair:1.4)" in result.positive_prompt
+    assert engine.token_counter.chunks(
+        tags(result.positive_prompt)) <= budget
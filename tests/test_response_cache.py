@@ -0,0 +1,139 @@
+import threading
+import time
+
+import pytest
+
+from benchmarks.fake_genai import FakeClient, ModelBehavior
+from src.core import llm_client, response_cache
+from src.core.model_router import ModelRouter
+from src.core.response_cache import ResponseCache, SingleFlight
+
+
+@pytest.fixture
+def cache(tmp_path):
+    c = ResponseCache(tmp_path / "cache.sqlite3", max_entries=3)
+    yield c
+    c.close()
+
+
+def key(text, style="Anime", model="m"):
+    return ResponseCache.make_key(text, style, model, "system")
+
+
+def test_key_normalizes_input_only():
+    assert key("  Рыжая   девушка ") == key("рыжая девушка")
+    assert key("a", style="Anime") != key("a", style="Pony")
+    assert key("a", model="m1") != key("a", model="m2")
+    assert ResponseCache.make_key("a", "s", "m", "v1") != \
+        ResponseCache.make_key("a", "s", "m", "v2")
+
+
+def test_get_put_and_stats(cache):
+    assert cache.get(key("a")) is None
+    cache.put(key("a"), "tags")
+    assert cache.get_any([key("x"), key("a")]) == "tags"
+    assert cache.contains_any([key("a")])
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1}
+
+
+def test_lru_eviction(cache):
+    for text in "abc":
+        cache.put(key(text), text)
+        time.sleep(0.01)
+    cache.get(key("a"))  # a is fresh again, b is the oldest
+    cache.put(key("d"), "d")
+    assert cache.get(key("b")) is None
+    assert [cache.get(key(t)) for t in "acd"] == ["a", "c", "d"]
+
+
+def test_ttl(tmp_path, monkeypatch):
+    cache = ResponseCache(tmp_path / "cache.sqlite3", ttl_seconds=60)
+    try:
+        cache.put(key("a"), "tags")
+        later = time.time() + 61
+        monkeypatch.setattr(response_cache.time, "time", lambda: later)
+        assert not cache.contains_any([key("a")])
+        assert cache.get(key("a")) is None
+        assert cache.stats()["entries"] == 0
+    finally:
+        cache.close()
+
+
+def test_survives_reopen(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    first = ResponseCache(path)
+    first.put(key("a"), "tags")
+    first.close()
+    second = ResponseCache(path)
+    try:
+        assert second.get(key("a")) == "tags"
+    finally:
+        second.close()
+
+
+def test_single_flight_collapses_concurrent_calls():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "answer"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(
+        flight.do("k", slow)))
+    leader.start()
+    assert started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(
+        flight.do("k", slow))) for _ in range(4)]
+    for t in followers:
+        t.start()
+    time.sleep(0.2)  # followers are parked on the leader's call
+    release.set()
+    for t in [leader, *followers]:
+        t.join(5)
+
+    assert results == ["answer"] * 5
+    assert len(calls) == 1
+    assert flight.do("k", lambda: "next") == "next"  # key was released
+
+
+def test_single_flight_shares_the_error():
+    flight = SingleFlight()
+    gate = threading.Event()
+    errors = []
+
+    def failing():
+        gate.wait(5)
+        raise ValueError("boom")
+
+    def call():
+        try:
+            flight.do("k", failing)
+        except ValueError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)
+    gate.set()
+    for t in threads:
+        t.join(5)
+    assert errors == ["boom"] * 3
+
+
+def test_generate_tags_answers_repeats_from_cache(cache, monkeypatch):
+    monkeypatch.setattr(llm_client, "router",
+                        ModelRouter(llm_client.MODEL_PRIORITIES))
+    client = FakeClient(default=ModelBehavior(latency=0.001))
+    first = llm_client.generate_tags(client, "рыжая девушка", "Anime",
+                                     cache=cache)
+    again = llm_client.generate_tags(client, " Рыжая  девушка", "Anime",
+                                     cache=cache)
+    assert first == again == client.reply
+    assert sum(client.stats.calls.values()) == 1
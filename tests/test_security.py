@@ -0,0 +1,37 @@
+import os
+import stat
+import sys
+
+import pytest
+
+from src.core.security import (ChainKeyStore, EnvKeyStore, FileKeyStore,
+                               MemoryKeyStore, SecurityManager)
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="POSIX permissions")
+def test_file_store_is_private_plain_text(tmp_path):
+    store = FileKeyStore(tmp_path / "api_key")
+    assert store.load() == ""
+    assert store.save("AIza-test")
+    assert store.load() == "AIza-test"
+    assert stat.S_IMODE(os.stat(store.path).st_mode) == 0o600
+    assert list(tmp_path.iterdir()) == [store.path]
+
+
+def test_chain_prefers_env(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "from-env")
+    memory = MemoryKeyStore("stored")
+    chain = ChainKeyStore([EnvKeyStore(), memory])
+    assert chain.load() == "from-env"
+    assert chain.save("new")  # env is read-only, memory takes it
+    assert memory.key == "new"
+
+
+def test_empty_key_is_not_cached():
+    store = MemoryKeyStore("")
+    manager = SecurityManager(store)
+    assert manager.get_api_key() == ""
+    store.key = "saved-elsewhere"
+    assert manager.get_api_key() == "saved-elsewhere"
+    manager.get_api_key()
+    assert store.loads == 2  # cached once found
@@ -0,0 +1,120 @@
+import asyncio
+import json
+
+from benchmarks.fake_genai import FakeClient, ModelBehavior
+from src.core import dispatcher
+from src.core.llm_client import MODEL_PRIORITIES
+from src.core.model_router import ModelRouter
+from src.server import TranspilerServer
+
+
+def request(method, path, body=None, headers=None, raw_body=None):
+    data = raw_body if raw_body is not None else (
+        json.dumps(body).encode() if body is not None else b"")
+    lines = [f"{method} {path} HTTP/1.1", "Host: test", "Connection: close"]
+    if "Content-Length" not in (headers or {}):
+        lines.append(f"Content-Length: {len(data)}")
+    lines += [f"{k}: {v}" for k, v in (headers or {}).items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode() + data
+
+
+def exchange(server, *raw_requests, eof=False):
+    """Sends raw bytes to a freshly started server, returns
+    [(status, payload)] for every response on the connection."""
+
+    async def main():
+        listener = await server.start("127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            for raw in raw_requests:
+                writer.write(raw)
+            if eof:
+                writer.write_eof()
+            data = await asyncio.wait_for(reader.read(), 10)
+            writer.close()
+            return data
+        finally:
+            await server.close()
+
+    data = asyncio.run(main())
+    responses = []
+    while data:
+        head, _, rest = data.partition(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        headers = dict(line.split(": ", 1) for line in lines[1:])
+        length = int(headers["Content-Length"])
+        body, data = rest[:length], rest[length:]
+        payload = json.loads(body) if headers["Content-Type"].startswith(
+            "application/json") else body.decode()
+        responses.append((int(lines[0].split()[1]), payload))
+    return responses
+
+
+def style_of(engine):
+    return next(iter(engine.get_style_names()))
+
+
+def test_health_and_compile(engine):
+    server = TranspilerServer(engine)
+    keep = request("GET", "/health").replace(b"Connection: close",
+                                             b"Connection: keep-alive")
+    (s1, health), (s2, result) = exchange(server, keep, request(
+        "POST", "/compile", {"input": "1girl, red hair",
+                             "style": style_of(engine), "nsfw": False}))
+    assert (s1, health["status"], health["llm"]) == (200, "ok", False)
+    assert s2 == 200
+    assert "red hair" in result["positive_prompt"]
+
+
+def test_bad_requests(engine):
+    cases = [
+        (request("POST", "/compile", raw_body=b"{not json"), 400),
+        (request("POST", "/compile", [1, 2]), 400),
+        (request("POST", "/compile", {"style": "x"}), 400),
+        (request("POST", "/compile", {"input": "a", "nsfw": "false"}), 400),
+        (request("POST", "/compile", {"input": "a", "nsfw": 0}), 400),
+        (request("POST", "/compile", {"input": "a", "style": 5}), 400),
+        (request("POST", "/compile", headers={"Content-Length": "x"}), 400),
+        (request("GET", "/compile"), 405),
+        (request("GET", "/nope"), 404),
+        (b"garbage\r\n\r\n", 400),
+    ]
+    for raw, expected in cases:
+        [(status, payload)] = exchange(TranspilerServer(engine), raw)
+        assert status == expected, (raw, payload)
+        assert "error" in payload
+
+
+def test_truncated_body_is_400(engine):
+    raw = request("POST", "/compile", headers={"Content-Length": "100"},
+                  raw_body=b'{"input": "a"}')
+    [(status, payload)] = exchange(TranspilerServer(engine), raw, eof=True)
+    assert status == 400
+    assert "Content-Length" in payload["error"]
+
+
+def test_unexpected_error_is_500(engine, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(engine, "process", broken)
+    [(status, payload)] = exchange(TranspilerServer(engine), request(
+        "POST", "/compile", {"input": "a"}))
+    assert status == 500
+    assert "boom" not in payload["error"]
+
+
+def test_generate(engine, monkeypatch):
+    [(status, _)] = exchange(TranspilerServer(engine), request(
+        "POST", "/generate", {"input": "a"}))
+    assert status == 503  # no API key: compile only
+
+    monkeypatch.setattr(dispatcher, "router", ModelRouter(MODEL_PRIORITIES))
+    client = FakeClient(default=ModelBehavior(latency=0.001))
+    server = TranspilerServer(engine, client)
+    [(status, result)] = exchange(server, request(
+        "POST", "/generate", {"input": "рыжая девушка", "use_cache": False}))
+    assert status == 200
+    assert result["tags"] == client.reply
+    assert "orange hair" in result["positive_prompt"]
@@ -0,0 +1,62 @@
+import pytest
+
+from src.core.similar_cache import DEFAULT_THRESHOLD, SimilarIndex
+
+TEXT = "рыжая девушка в лесу"
+
+
+@pytest.fixture
+def index(tmp_path):
+    idx = SimilarIndex(tmp_path / "similar.sqlite3")
+    yield idx
+    idx.close()
+
+
+def test_near_duplicate_hits(index):
+    index.add(TEXT, "Anime", "1girl, orange hair, forest")
+    found = index.lookup("Рыжая девушка в лесу, вечер", "Anime")
+    assert found is not None
+    tags, score = found
+    assert tags == "1girl, orange hair, forest"
+    assert DEFAULT_THRESHOLD <= score < 1.0
+    assert index.stats() == {"hits": 1, "misses": 0, "entries": 1}
+
+
+def test_below_threshold_or_other_style_misses(index):
+    index.add(TEXT, "Anime", "forest")
+    assert index.lookup("рыжая девушка в городе", "Anime") is None
+    assert index.lookup(TEXT, "Pony") is None
+    assert index.lookup(TEXT, "Anime", threshold=0) is None  # disabled
+    assert index.stats()["misses"] == 2
+
+
+def test_entries_survive_a_restart(tmp_path):
+    path = tmp_path / "similar.sqlite3"
+    first = SimilarIndex(path)
+    first.add(TEXT, "Anime", "forest")
+    first.close()
+
+    second = SimilarIndex(path)
+    try:
+        assert second.lookup(TEXT + ", вечер", "Anime")[0] == "forest"
+    finally:
+        second.close()
+
+
+def test_lru_bound_evicts_oldest_in_memory_and_on_disk(tmp_path):
+    path = tmp_path / "similar.sqlite3"
+    idx = SimilarIndex(path, max_entries=2)
+    idx.add("рыжая девушка в лесу", "Anime", "a")
+    idx.add("кот на крыше ночью", "Anime", "b")
+    assert idx.lookup("рыжая девушка в лесу", "Anime")[0] == "a"  # fresh
+    idx.add("замок в горах зимой", "Anime", "c")
+    assert idx.stats()["entries"] == 2
+    assert idx.lookup("кот на крыше ночью", "Anime") is None
+    idx.close()
+
+    reopened = SimilarIndex(path, max_entries=10)
+    try:
+        assert reopened.stats()["entries"] == 2
+        assert reopened.lookup("замок в горах зимой", "Anime")[0] == "c"
+    finally:
+        reopened.close()
@@ -0,0 +1,38 @@
+import threading
+
+from src.core.style_snapshot import (load_snapshot, save_snapshot_async,
+                                     source_key)
+
+
+def test_round_trip_leaves_no_temp_files(tmp_path):
+    source = tmp_path / "styles.json"
+    source.write_text("{}", encoding="utf-8")
+    snapshot = tmp_path / "styles.snapshot.pickle"
+    key = source_key(source)
+
+    save_snapshot_async(snapshot, key, {"styles": [("a", {"x": 1})]}).join()
+    assert sorted(p.name for p in tmp_path.iterdir()) == \
+        ["styles.json", "styles.snapshot.pickle"]
+    assert load_snapshot(snapshot, key)["styles"] == [("a", {"x": 1})]
+
+
+def test_stale_or_broken_snapshot_is_ignored(tmp_path):
+    source = tmp_path / "styles.json"
+    source.write_text("{}", encoding="utf-8")
+    snapshot = tmp_path / "styles.snapshot.pickle"
+    save_snapshot_async(snapshot, source_key(source), {}).join()
+
+    source.write_text('{"changed": 1}', encoding="utf-8")
+    assert load_snapshot(snapshot, source_key(source)) is None
+
+    snapshot.write_bytes(b"not a pickle")
+    assert load_snapshot(snapshot, source_key(source)) is None
+
+
+def test_engine_startup_writes_a_snapshot(engine):
+    for thread in threading.enumerate():
+        if thread.name == "style-snapshot":
+            thread.join()
+    names = {p.name for p in engine.user_data_dir.iterdir()}
+    assert "styles.snapshot.pickle" in names
+    assert not any(name.endswith(".tmp") for name in names)
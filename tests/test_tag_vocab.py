@@ -0,0 +1,62 @@
+import pytest
+
+from src.core.tag_vocab import TagVocab, build_index, tag_key
+
+CSV = """\
+name,category,post_count,aliases
+long_hair,0,5000,"lengthy_hair"
+orange_hair,0,3000,"ginger_hair,red_orange_hair"
+short_hair,0,4000,
+1girl,0,9000,
+^_^,5,100,
+"""
+
+
+@pytest.fixture
+def vocab(tmp_path):
+    csv_path = tmp_path / "tags.csv"
+    csv_path.write_text(CSV, encoding="utf-8")
+    build_index(csv_path, tmp_path / "tag_vocab.idx")
+    v = TagVocab(tmp_path / "tag_vocab.idx")
+    yield v
+    v.close()
+
+
+def test_tag_key():
+    assert tag_key(" Orange_Hair ") == "orange hair"
+    assert tag_key("^_^") == "^_^"
+
+
+def test_lookup_and_complete(vocab):
+    assert len(vocab) == 5
+    assert "Long_Hair" in vocab
+    assert vocab.canonical("ginger hair") == "orange hair"
+    assert vocab.count("lengthy hair") == 5000
+    assert vocab.complete("o") == [("orange hair", 3000)]
+    assert [t for t, _ in vocab.complete("hair")] == []
+
+
+def test_fix_tags_aliases_only_by_default(vocab):
+    text, changes, unknown = vocab.fix_tags(
+        "1girl, ginger hair, lnog hair, (orange hair:1.2), glowing runes")
+    assert text == ("1girl, orange hair, lnog hair, (orange hair:1.2), "
+                    "glowing runes")
+    assert changes == [("ginger hair", "orange hair")]
+    assert unknown == ["lnog hair", "glowing runes"]
+
+
+def test_autocorrect_is_capped(vocab):
+    text, changes, _ = vocab.fix_tags("lnog hair, shrot hair",
+                                      autocorrect=True)
+    assert text == "long hair, short hair"
+    assert len(changes) == 2
+
+    text, changes, unknown = vocab.fix_tags(
+        "lnog hair, shrot hair", autocorrect=True, max_typo_checks=1)
+    assert text == "long hair, shrot hair"
+    assert unknown == ["shrot hair"]
+
+
+def test_short_tags_are_not_guessed(vocab):
+    assert vocab.correct("girl") is None  # "1girl" is one edit away
+    assert vocab.correct("1gril") == "1girl"